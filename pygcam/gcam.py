@@ -8,13 +8,15 @@ from __future__ import print_function
 import os
 import re
 import subprocess
+import sys
+import time
 from semver import VersionInfo
 
-from .config import getParam, getParamAsBoolean, parse_version_info, pathjoin, unixPath
+from .config import getParam, getParamAsBoolean, getParamAsInt, parse_version_info, pathjoin, unixPath
 from .error import ProgramExecutionError, GcamError, GcamSolverError, PygcamException, ConfigFileError
 from .log import getLogger
 from .scenarioSetup import createSandbox
-from .utils import writeXmldbDriverProperties, getExeDir, pushd
+from .utils import writeXmldbDriverProperties, getExeDir, pushd, mkdirs
 from .windows import IsWindows
 
 _logger = getLogger(__name__)
@@ -109,7 +111,171 @@ def setJavaPath(exeDir):
     os.environ['CLASSPATH'] = classpath = envClasspath + ';' + javaBinServer + ';' + miClasspath
     _logger.debug('CLASSPATH=%s', classpath)
 
+# Resource use of the last GCAM process run by _gcamWrapper(). See getGcamUsage().
+_gcamUsage = None
+
+def getGcamUsage():
+    """
+    Return and forget the resource use of the last GCAM process run with the
+    wrapper, as a dict with keys 'wallSecs', 'cpuSecs' (user + system),
+    'maxRssMB' (peak resident set size) and 'bytesWritten', any of which
+    may be None if not available on this platform. Returns None if GCAM
+    has not been run since the last call.
+    """
+    global _gcamUsage
+
+    usage, _gcamUsage = _gcamUsage, None
+    return usage
+
+def _bytesWritten(pid):
+    """
+    Return the number of bytes process `pid` has caused to be written to
+    storage, read from /proc (Linux only), or None if not available.
+    """
+    try:
+        with open('/proc/%d/io' % pid) as f:
+            for line in f:
+                if line.startswith('write_bytes:'):
+                    return int(line.split()[1])
+    except (IOError, OSError, ValueError):
+        pass
+
+    return None
+
+def _waitForGcam(gcamProc, startTime):
+    """
+    Wait for the GCAM process to exit, save its resource use for getGcamUsage(),
+    and return its exit status.
+    """
+    global _gcamUsage
+
+    if not hasattr(os, 'wait4'):
+        status = gcamProc.wait()
+        _gcamUsage = dict(wallSecs=time.time() - startTime, cpuSecs=None, maxRssMB=None, bytesWritten=None)
+        return status
+
+    # Wait for the process to exit without reaping it, so /proc can still be read
+    bytesWritten = None
+    if hasattr(os, 'waitid'):
+        os.waitid(os.P_PID, gcamProc.pid, os.WEXITED | os.WNOWAIT)
+        bytesWritten = _bytesWritten(gcamProc.pid)
+
+    _pid, waitStatus, usage = os.wait4(gcamProc.pid, 0)
+    status = -os.WTERMSIG(waitStatus) if os.WIFSIGNALED(waitStatus) else os.WEXITSTATUS(waitStatus)
+    gcamProc.returncode = status
+
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere; ru_oublock counts 512-byte blocks
+    rssDivisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    _gcamUsage = dict(wallSecs=time.time() - startTime, cpuSecs=usage.ru_utime + usage.ru_stime,
+                      maxRssMB=usage.ru_maxrss / rssDivisor,
+                      bytesWritten=bytesWritten if bytesWritten is not None else usage.ru_oublock * 512)
+    return status
+
+class SolverProgress(object):
+    """
+    Parses GCAM's console output to record the progress of the solver: when
+    each model period starts and how many iterations it takes to solve. Lines
+    matching config variable GCAM.SolverPeriodPattern start a new period; this
+    must define the named groups "period" and (optionally) "year". Lines matching
+    GCAM.SolverIterationPattern report solver iterations: if this defines a named
+    group "iterations", its value is the period's iteration count, otherwise each
+    matching line counts as one iteration. A period's elapsed time runs until the
+    next period starts, or until the output ends.
+    """
+    def __init__(self):
+        self.periodPattern = re.compile(getParam('GCAM.SolverPeriodPattern'))
+        self.iterationPattern = re.compile(getParam('GCAM.SolverIterationPattern'))
+        self.periods = []       # list of dicts with keys period, year, iterations, seconds, solved
+        self.current = None
+        self.startTime = None
+
+    PERIOD_START = 'period'
+    ITERATIONS = 'iterations'
+
+    def parse(self, line, now=None):
+        """
+        Parse a line of GCAM output, returning SolverProgress.PERIOD_START if it
+        started a period, SolverProgress.ITERATIONS if it reported iterations,
+        or else None.
+        """
+        match = self.periodPattern.search(line)
+        if match:
+            now = time.time() if now is None else now
+            self.endPeriod(now)
+            groups = match.groupdict()
+            year = groups.get('year')
+            self.current = dict(period=int(groups['period']), year=int(year) if year else None,
+                                iterations=0, seconds=None, solved=True)
+            self.startTime = now
+            self.periods.append(self.current)
+            return self.PERIOD_START
+
+        if self.current is None:
+            return None
+
+        match = self.iterationPattern.search(line)
+        if match:
+            iterations = match.groupdict().get('iterations')
+            self.current['iterations'] = int(iterations) if iterations else self.current['iterations'] + 1
+            return self.ITERATIONS
+
+        return None
+
+    def endPeriod(self, now=None, solved=True):
+        """
+        Record the elapsed time of the current period, if any, and whether it solved.
+        """
+        if self.current is not None:
+            now = time.time() if now is None else now
+            self.current['seconds'] = now - self.startTime
+            self.current['solved'] = solved
+            self.current = None
+
+    def writeJson(self, path):
+        """
+        Write the list of periods to the JSON file `path`.
+        """
+        import json
+
+        with open(path, 'w') as f:
+            json.dump(self.periods, f, indent=1)
+
+# The SolverProgress of the last GCAM process run by _gcamWrapper(). See getSolverProgress().
+_solverProgress = None
+
+def getSolverProgress():
+    """
+    Return and forget the list of periods (dicts with keys 'period', 'year',
+    'iterations', 'seconds' and 'solved') parsed from the output of the last
+    GCAM process run with the wrapper, or None if GCAM has not been run since
+    the last call. See SolverProgress.
+    """
+    global _solverProgress
+
+    progress, _solverProgress = _solverProgress, None
+    return progress.periods if progress else None
+
+def _writeSolverProgress(workspace):
+    """
+    Write the solver progress of the last GCAM run to the JSON file named by
+    GCAM.SolverProgressFile, if set. A relative path is taken to be relative
+    to the `workspace` in which GCAM ran.
+    """
+    filename = getParam('GCAM.SolverProgressFile')
+    if not (filename and _solverProgress):
+        return
+
+    path = pathjoin(workspace, filename) if not os.path.isabs(filename) else filename
+    try:
+        mkdirs(os.path.dirname(path))
+        _solverProgress.writeJson(path)
+    except Exception as e:
+        _logger.warning('Failed to write solver progress to %s: %s', path, e)
+
 def _gcamWrapper(args):
+    global _solverProgress
+
+    startTime = time.time()
     try:
         _logger.debug('Starting gcam with wrapper')
         gcamProc = subprocess.Popen(args, bufsize=0, stdout=subprocess.PIPE,
@@ -122,25 +288,47 @@ def _gcamWrapper(args):
     modelDidNotSolve = 'Model did not solve'
     pattern = re.compile('(.*(BaseXException|%s).*)' % modelDidNotSolve)
 
-    gcamOut = gcamProc.stdout
-    while True:
-        line = gcamOut.readline().decode('utf-8')
-        if line == '':
-            break
+    # GCAM output is logged in blocks of up to GCAM.WrapperLogLines lines, and
+    # whenever a new period starts, rather than with one log call per line.
+    maxLines = max(1, getParamAsInt('GCAM.WrapperLogLines'))
+    buffered = []
 
-        _logger.info(line.rstrip())          # see if this ends up in worker.log
+    def flush():
+        if buffered:
+            _logger.info('\n'.join(buffered))
+            del buffered[:]
 
-        match = re.search(pattern, line)
-        if match:
-            gcamProc.terminate()
-            msg = 'GCAM error: ' + match.group(0)
-            if match.group(1) == modelDidNotSolve:
-                raise GcamSolverError(msg)
-            else:
-                raise GcamError(msg)
+    progress = _solverProgress = SolverProgress()
+
+    gcamOut = gcamProc.stdout
+    try:
+        for line in iter(gcamOut.readline, b''):
+            line = line.decode('utf-8').rstrip()
+
+            if progress.parse(line) == SolverProgress.PERIOD_START:
+                flush()     # so the log shows when each period started
+
+            buffered.append(line)
+            if len(buffered) >= maxLines:
+                flush()
+
+            match = re.search(pattern, line)
+            if match:
+                gcamProc.terminate()
+                _waitForGcam(gcamProc, startTime)
+                solved = match.group(1) != modelDidNotSolve
+                progress.endPeriod(solved=solved)
+                msg = 'GCAM error: ' + match.group(0)
+                if not solved:
+                    raise GcamSolverError(msg)
+                else:
+                    raise GcamError(msg)
+    finally:
+        flush()
 
     _logger.debug('gcamWrapper found EOF. Waiting for GCAM to exit...')
-    status = gcamProc.wait()
+    status = _waitForGcam(gcamProc, startTime)
+    progress.endPeriod(solved=(status == 0))
     _logger.debug('gcamWrapper: GCAM exited with status %s', status)
     return status
 
@@ -186,9 +374,69 @@ def linkToMacJava():
     finally:
         os.chdir(owd)
 
+def getRestartFiles(restartDir):
+    """
+    Return a list of (period, pathname) of the non-empty restart files in
+    `restartDir`, sorted by period. Files are recognized by config variable
+    GCAM.RestartFilePattern, which must define the named group "period".
+    """
+    pattern = re.compile(getParam('GCAM.RestartFilePattern'))
+
+    files = []
+    if os.path.isdir(restartDir):
+        for name in os.listdir(restartDir):
+            match = pattern.search(name)
+            path = pathjoin(restartDir, name)
+            if match and os.path.getsize(path) > 0:
+                files.append((int(match.group('period')), path))
+
+    return sorted(files)
+
+def _restartConfigFile(configFile, exeDir, restartPeriod, restartFile):
+    """
+    Write a copy of `configFile` to {exeDir}/config-restart.xml that restarts
+    GCAM after period `restartPeriod`: the model state is read from `restartFile`
+    rather than from the original input file and scenario components, and the
+    config element "restartPeriod" is set. Returns the pathname of the copy.
+    """
+    from lxml import etree as ET
+
+    if not (restartFile and os.path.isfile(restartFile)):
+        raise PygcamException('Restart file "%s" for period %d was not found' % (restartFile, restartPeriod))
+
+    parser = ET.XMLParser(remove_blank_text=True)
+    tree = ET.parse(configFile, parser)
+    root = tree.getroot()
+
+    def setValue(group, name, value):
+        groupElt = root.find(group)
+        if groupElt is None:
+            groupElt = ET.SubElement(root, group)
+
+        elt = groupElt.find('Value[@name="%s"]' % name)
+        if elt is None:
+            elt = ET.SubElement(groupElt, 'Value', name=name)
+        elt.text = str(value)
+
+    setValue('Files', 'xmlInputFileName', unixPath(restartFile, abspath=True))
+    setValue('Ints', 'restartPeriod', restartPeriod)
+
+    # The restart file holds the complete model state, so components aren't re-read
+    components = root.find('ScenarioComponents')
+    if components is not None:
+        components.clear()
+
+    path = pathjoin(exeDir, 'config-restart.xml')
+    tree.write(path, xml_declaration=True, pretty_print=True)
+    _logger.info('Restarting GCAM after period %d from %s', restartPeriod, restartFile)
+    return path
+
 def runGCAM(scenario, workspace=None, refWorkspace=None, scenariosDir=None, groupDir='',
             configFile=None, forceCreate=False, noRun=False, noWrapper=False):
     """
+    Run GCAM. If config variable GCAM.RestartPeriod is >= 0, GCAM is restarted
+    after that period from GCAM.RestartFile, using a modified copy of the
+    configuration file.
 
     :param scenario: (str) the scenario to run
     :param workspace: (str) path to the workspace to run in, or None, in which
@@ -241,6 +489,10 @@ def runGCAM(scenario, workspace=None, refWorkspace=None, scenariosDir=None, grou
     else:
         configFile = unixPath(configFile or pathjoin(exeDir, 'configuration.xml'), abspath=True)
 
+    restartPeriod = getParamAsInt('GCAM.RestartPeriod')
+    if restartPeriod >= 0 and not noRun:
+        configFile = _restartConfigFile(configFile, exeDir, restartPeriod, getParam('GCAM.RestartFile'))
+
     gcamPath = unixPath(getParam('GCAM.Executable'), abspath=True)
     gcamArgs = [gcamPath, '-C%s' % configFile]  # N.B. GCAM (< 4.2) doesn't allow space between -C and filename
 
@@ -251,7 +503,13 @@ def runGCAM(scenario, workspace=None, refWorkspace=None, scenariosDir=None, grou
         _logger.info('Running: %s', command)
 
         noWrapper = IsWindows or noWrapper     # never use the wrapper on Windows
-        exitCode = subprocess.call(gcamArgs, shell=False) if noWrapper else _gcamWrapper(gcamArgs)
+        if noWrapper:
+            exitCode = subprocess.call(gcamArgs, shell=False)
+        else:
+            try:
+                exitCode = _gcamWrapper(gcamArgs)
+            finally:
+                _writeSolverProgress(workspace)
 
         if exitCode != 0:
             raise ProgramExecutionError(command, exitCode)
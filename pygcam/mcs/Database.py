@@ -10,7 +10,7 @@
 This module includes contributions by Sam Fendell and Ryan Jones.
 '''
 from __future__ import print_function
-from collections import Iterable
+from collections import Iterable, namedtuple
 from contextlib import contextmanager
 from datetime import datetime
 from six import string_types, iteritems, MAXSIZE
@@ -18,19 +18,17 @@ from six.moves import xrange
 import sys
 
 from sqlalchemy import create_engine, Table, Column, String, Float, text, MetaData, event
-from sqlalchemy.engine import Engine
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker, load_only
 from sqlalchemy.orm.exc import NoResultFound
-#from sqlalchemy.pool import QueuePool
 
-from pygcam.config import getSection, getParam, getParamAsBoolean
+from pygcam.config import getSection, getParam, getParamAsBoolean, getParamAsInt
 from pygcam.log import getLogger
 
 from . import util as U
 from .constants import RegionMap
 from .error import PygcamMcsUserError, PygcamMcsSystemError
-from .schema import (ORMBase, Run, Sim, Input, Output, InValue, OutValue, Experiment,
+from .schema import (ORMBase, Run, RunStats, PeriodStats, Sim, Input, Output, InValue, OutValue, Experiment,
                      Program, Code, Region, TimeSeries)
 
 _logger = getLogger(__name__)
@@ -50,14 +48,45 @@ def usingPostgres():
     return url.lower().startswith('postgres')
 
 
-@event.listens_for(Engine, "connect")
-def sqlite_FK_pragma(dbapi_connection, connection_record):
-    '''Turn on foreign key support in sqlite'''
-    if usingSqlite():
+def sqlitePragmas():
+    '''
+    Return the list of PRAGMA statements to execute on each new sqlite connection,
+    based on the config variable MCS.SqliteProfile. The "default" profile just
+    enables foreign keys; the "concurrent" profile also uses write-ahead logging
+    (WAL), which lets readers proceed while another connection writes, and has
+    sqlite wait for locks internally (MCS.SqliteBusyTimeout) rather than failing
+    immediately and relying on commitWithRetry() to sleep and try again.
+    '''
+    pragmas = ["PRAGMA foreign_keys=ON"]
+
+    profile = getParam('MCS.SqliteProfile').lower()
+    if profile == 'default':
+        return pragmas
+
+    if profile != 'concurrent':
+        raise PygcamMcsUserError("Unknown value for MCS.SqliteProfile: '%s'. Must be 'default' or 'concurrent'" % profile)
+
+    pragmas += ["PRAGMA journal_mode=WAL",
+                "PRAGMA synchronous=%s" % getParam('MCS.SqliteSynchronous'),
+                "PRAGMA busy_timeout=%d" % getParamAsInt('MCS.SqliteBusyTimeout'),
+                "PRAGMA mmap_size=%d"    % getParamAsInt('MCS.SqliteMmapSize'),
+                "PRAGMA cache_size=%d"   % getParamAsInt('MCS.SqliteCacheSize')]
+    return pragmas
+
+def _sqlitePragmaListener(pragmas):
+    '''
+    Return a function to run the given pragmas on each new DBAPI connection.
+    The list is computed once when the engine is created, rather than by
+    reading config variables on every connection.
+    '''
+    def setPragmas(dbapi_connection, connection_record):
         cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON")
+        for pragma in pragmas:
+            cursor.execute(pragma)
         cursor.close()
 
+    return setPragmas
+
     # TODO: might be useful:
     # pd.read_sql_table('data', engine, columns=['Col_1', 'Col_2'])
     # pd.read_sql_table('data', engine, index_col='id')
@@ -95,6 +124,24 @@ RUN_FAILURES  = [RUN_FAILED, RUN_KILLED, RUN_ABORTED, RUN_ALARMED, RUN_UNSOLVED,
 RUN_STATUSES  = [RUN_NEW, RUN_QUEUED, RUN_RUNNING, RUN_SUCCEEDED] + RUN_FAILURES
 
 
+class StatusChange(namedtuple('StatusChange', ['status', 'time', 'startTime'])):
+    '''
+    A change of a run's status to `status` at `time`, waiting to be written by
+    setRunStatuses(). For a change to a final status, `startTime` is the time the
+    run started, if the change to "running" was combined with this one rather than
+    written, or None, in which case the run's startTime is read from the database.
+    '''
+    def combine(self, later):
+        '''
+        Return a single change equivalent to this change followed by `later`.
+        '''
+        if later.status in (RUN_NEW, RUN_QUEUED, RUN_RUNNING) or later.startTime:
+            return later
+
+        startTime = self.time if self.status == RUN_RUNNING else self.startTime
+        return later._replace(startTime=startTime)
+
+
 # TBD: maybe drop this and store it from Context instead
 def beforeSavingRun(_mapper, _connection, run):
     '''
@@ -166,6 +213,11 @@ class CoreDatabase(object):
         self.url     = None
         self.engine  = None
         self.appId   = None
+        self.outputIdMaps = {}  # dicts of outputIds keyed by name, keyed by program name
+
+        # Counters reported by logStats()
+        self.stats = {'commits': 0, 'retries': 0, 'failures': 0,
+                      'commitSecs': 0.0, 'lockWaitSecs': 0.0, 'maxCommitSecs': 0.0}
 
     def endSession(self, session):
         '''
@@ -230,12 +282,8 @@ class CoreDatabase(object):
 
         self.createDatabase()
 
-        connect_args = {'connect_timeout': 15} if usingPostgres() else {}
-
-        self.engine = engine = create_engine(url, echo=echo, connect_args=connect_args,
-                                             # poolclass=QueuePool
-                                             #, pool_pre_ping=True
-                                            )
+        engine = self.createEngine(url, echo=echo)
+        self.engine = engine
         self.Session.configure(bind=engine)
 
         self.url = url
@@ -248,7 +296,82 @@ class CoreDatabase(object):
             meta = MetaData(bind=engine, reflect=True)
             if 'run' not in meta.tables:
                 self.initDb()
+            else:
+                self.upgradeSchema()
+
+    def upgradeSchema(self):
+        '''
+        Upgrade an existing database in place by creating any tables, columns, and
+        indexes defined in the schema that are missing from the database, e.g.,
+        because the database was created by an earlier version of pygcam.
+
+        :return: (list of str) the names of the tables, columns (as "table.column"),
+            and indexes created
+        '''
+        from sqlalchemy import inspect
 
+        inspector = inspect(self.engine)
+        tableNames = inspector.get_table_names()
+        created = []
+
+        for table in ORMBase.metadata.sorted_tables:
+            if table.name not in tableNames:
+                _logger.info('Creating table %s', table.name)
+                table.create(bind=self.engine)      # creates its indexes, too
+                created.append(table.name)
+                continue
+
+            existing = set(col['name'] for col in inspector.get_columns(table.name))
+            for column in table.columns:
+                if column.name not in existing:
+                    _logger.info('Adding column %s to table %s', column.name, table.name)
+                    columnType = column.type.compile(self.engine.dialect)
+                    self.engine.execute('ALTER TABLE %s ADD COLUMN "%s" %s' % (table.name, column.name, columnType))
+                    created.append('%s.%s' % (table.name, column.name))
+
+            existing = set(idx['name'] for idx in inspector.get_indexes(table.name))
+            for index in table.indexes:
+                if index.name not in existing:
+                    _logger.info('Creating index %s on table %s', index.name, table.name)
+                    index.create(bind=self.engine)
+                    created.append(index.name)
+
+        if created and usingSqlite():
+            self.engine.execute('ANALYZE')  # update statistics used by the query planner
+
+        return created
+
+
+    def createEngine(self, url, echo=False):
+        '''
+        Create an engine with a connection pool sized by MCS.DbPoolSize. For sqlite,
+        the pool holds open connections (sqlalchemy otherwise opens a new connection,
+        and runs the pragmas, for each session), and connections may be used by
+        threads other than the one that created them, since sessions are
+        thread-scoped but pooled connections are not.
+        '''
+        from sqlalchemy.pool import QueuePool, StaticPool
+
+        poolSize = getParamAsInt('MCS.DbPoolSize')
+        kwargs = dict(echo=echo)
+
+        if url.lower().startswith('sqlite'):
+            kwargs['connect_args'] = {'check_same_thread': False}
+            if url.lower() in ('sqlite://', 'sqlite:///:memory:'):
+                kwargs['poolclass'] = StaticPool    # in-memory db exists only in one connection
+            else:
+                kwargs.update(poolclass=QueuePool, pool_size=poolSize, max_overflow=poolSize)
+
+            engine = create_engine(url, **kwargs)
+            event.listen(engine, 'connect', _sqlitePragmaListener(sqlitePragmas()))
+        else:
+            if url.lower().startswith('postgres'):
+                kwargs['connect_args'] = {'connect_timeout': 15}
+
+            engine = create_engine(url, pool_size=poolSize, max_overflow=poolSize,
+                                   pool_pre_ping=True, **kwargs)
+
+        return engine
 
     def initDb(self, args=None):
         '''
@@ -355,11 +478,15 @@ class CoreDatabase(object):
     def commitWithRetry(self, session, maxTries=10, maxSleep=2.0):
         # N.B. With master/worker architecture, this should no longer be necessary, but
         # there are still occasional failures due to inability to acquire file lock.
-        # import sqlite3
+        # With the "concurrent" sqlite profile, sqlite itself waits up to the busy
+        # timeout, so retries here should be rare; see logStats().
+        from sqlalchemy.exc import OperationalError
         import random
         import time
 
+        stats = self.stats
         tries = 0
+        start = time.time()
 
         done = False
         while not done:
@@ -367,21 +494,112 @@ class CoreDatabase(object):
                 session.commit()
                 done = True
 
-            except Exception as e:
-            # except sqlite3.OperationalError as e:
+            except OperationalError as e:
                 _logger.debug('sqlite3 operational error: %s', e)
 
                 if tries >= maxTries:
+                    stats['failures'] += 1
                     raise PygcamMcsSystemError("Failed to acquire database lock")
 
                 delay = random.random() * maxSleep    # sleep for a random number of seconds up to maxSleep
                 _logger.warn("Database locked (retry %d); sleeping %.1f sec" % (tries, delay))
                 time.sleep(delay)
                 tries += 1
+                stats['retries'] += 1
+
+        elapsed = time.time() - start
+        stats['commits'] += 1
+        stats['commitSecs'] += elapsed
+        stats['maxCommitSecs'] = max(stats['maxCommitSecs'], elapsed)
+        if tries:
+            stats['lockWaitSecs'] += elapsed
+
+    def logStats(self):
+        '''
+        Log the commit and lock-contention counters accumulated by commitWithRetry().
+        '''
+        stats = self.stats
+        commits = stats['commits']
+        _logger.info("Database: %d commits (%.3f sec avg, %.3f sec max), %d lock retries, %.1f sec waiting on locks, %d failures",
+                     commits, stats['commitSecs'] / commits if commits else 0, stats['maxCommitSecs'],
+                     stats['retries'], stats['lockWaitSecs'], stats['failures'])
+
+    def bulkInsert(self, table, columns, rows, count=None, chunkSize=None, label=None):
+        '''
+        Insert rows into `table` using a Core-level INSERT executed with "executemany"
+        semantics rather than by creating an ORM object per row. Rows are committed in
+        chunks so that very large inserts don't build a single enormous transaction,
+        and progress is logged after each chunk.
+
+        :param table: (sqlalchemy.Table or ORM class) the table to insert into
+        :param columns: (list of str) the names of the columns, in the order in
+           which values appear in each row
+        :param rows: (iterable of sequences) the row values; can be a generator
+        :param count: (int) the total number of rows, if known; used only in
+           progress messages
+        :param chunkSize: (int) the number of rows to insert per transaction.
+           Defaults to the value of config variable MCS.BulkInsertChunkSize.
+        :param label: (str) a description of the rows for progress messages.
+           Defaults to the table name.
+        :return: (int) the number of rows inserted
+        '''
+        from itertools import islice
+        import time
+
+        table = getattr(table, '__table__', table)   # accept ORM classes, too
+        chunkSize = chunkSize or getParamAsInt('MCS.BulkInsertChunkSize')
+        label = label or table.name
+
+        rows = iter(rows)
+        total = 0
+        start = time.time()
+
+        while True:
+            chunk = [dict(zip(columns, row)) for row in islice(rows, chunkSize)]
+            if not chunk:
+                break
+
+            with self.sessionScope() as session:
+                self.insertRows(session, table, chunk)
+
+            total += len(chunk)
+            elapsed = time.time() - start
+            rate = total / elapsed if elapsed else 0
+            of = ' of %d' % count if count else ''
+            _logger.info('Inserted %d%s %s rows (%.0f rows/sec)', total, of, label, rate)
+
+        return total
+
+    def insertRows(self, session, table, rows):
+        '''
+        Insert the given rows into `table` within the caller's session, using
+        a single Core INSERT statement executed with "executemany" semantics.
+        The caller is responsible for committing the transaction.
+
+        :param session: an open session
+        :param table: (sqlalchemy.Table or ORM class) the table to insert into
+        :param rows: (list of dict) values keyed by column name. All dicts must
+           have the same keys.
+        :return: none
+        '''
+        if not rows:
+            return
+
+        table = getattr(table, '__table__', table)
 
-            # except Exception as e:
-            #     raise PygcamMcsSystemError("commitWithRetry error: %s" % e)
+        if self.useCopy(session):
+            copyRows(session, table, rows)
+        else:
+            session.execute(table.insert(), rows)
 
+    def useCopy(self, session):
+        '''
+        Return True if rows should be inserted using Postgres' COPY command, i.e.,
+        if the session is bound to a psycopg2 engine and MCS.PostgresCopy is True.
+        '''
+        bind = session.get_bind()
+        return (bind.dialect.name == 'postgresql' and bind.dialect.driver == 'psycopg2' and
+                getParamAsBoolean('MCS.PostgresCopy'))
 
     def execute(self, sql):
         'Execute the given SQL string'
@@ -492,6 +710,8 @@ class CoreDatabase(object):
                 self.endSession(sess)
                 outputId = output.outputId
 
+            self.outputIdMaps.pop(program, None)    # force reload of cached ids
+
         return outputId
 
     def getOutputIds(self, nameList):
@@ -506,6 +726,48 @@ class CoreDatabase(object):
         return ids
         # return zip(*ids)[0] if ids else []
 
+    def getOutputIdMap(self, program=GCAM_PROGRAM, refresh=False):
+        '''
+        Return a dict of outputIds keyed by output name for the given program.
+        The dict is cached so subsequent calls don't access the database.
+
+        :param program: (str) the name of the program defining the outputs
+        :param refresh: (bool) if True, reload the cached dict from the database
+        :return: (dict) outputIds keyed by output name
+        '''
+        idMap = self.outputIdMaps.get(program)
+
+        if idMap is None or refresh:
+            with self.sessionScope() as session:
+                rows = session.query(Output.name, Output.outputId).\
+                    join(Program).filter(Program.name == program).all()
+
+            self.outputIdMaps[program] = idMap = dict(rows)
+
+        return idMap
+
+    def lookupOutputIds(self, names, program=GCAM_PROGRAM):
+        '''
+        Return a list of the outputIds for the given output names, using the
+        cache maintained by getOutputIdMap().
+
+        :param names: (iterable of str) output names
+        :param program: (str) the name of the program defining the outputs
+        :return: (list of int) the corresponding outputIds
+        :raises PygcamMcsSystemError: if any of the names is not a defined output
+        '''
+        names = list(names)
+        idMap = self.getOutputIdMap(program)
+
+        missing = [name for name in names if name not in idMap]
+        if missing:
+            idMap = self.getOutputIdMap(program, refresh=True)  # outputs may have been added
+            missing = [name for name in names if name not in idMap]
+            if missing:
+                raise PygcamMcsSystemError("%s output(s) %s not found in the Output table" % (program, missing))
+
+        return [idMap[name] for name in names]
+
     def getOutputs(self):
         rows = self.getTable(Output)
         return [obj.name for obj in rows]
@@ -566,6 +828,11 @@ class CoreDatabase(object):
         for the given sim, exp, and output variable.
         '''
         from pandas import DataFrame
+        from .columnStore import getColumnStore
+
+        store = getColumnStore(simId)
+        if store and store.hasOutput(expName, outputName):
+            return store.getOutValues(expName, outputName, limit=limit)
 
         session = self.Session()
 
@@ -604,6 +871,130 @@ class CoreDatabase(object):
             self.commitWithRetry(sess)
             self.endSession(sess)
 
+    def deleteRunResultsBatch(self, outputIdsByRun, session):
+        '''
+        Delete stale results for a batch of runs using one DELETE statement per
+        distinct set of outputIds (typically just one for the whole batch) rather
+        than one per run.
+
+        :param outputIdsByRun: (dict) lists of outputIds keyed by runId
+        :param session: an open session; the caller is responsible for committing.
+        :return: none
+        '''
+        for outputIds, runIds in iteritems(_groupRunsByOutputs(outputIdsByRun)):
+            stmt = OutValue.__table__.delete().where(OutValue.runId.in_(runIds))
+            if outputIds:
+                stmt = stmt.where(OutValue.outputId.in_(outputIds))
+            session.execute(stmt)
+
+    def saveRunStatsBatch(self, statsByRun, session):
+        '''
+        Save the resource use measured by workers for a batch of runs, replacing
+        any saved previously for the same runs.
+
+        :param statsByRun: (dict) dicts of values keyed by RunStats column name,
+           keyed by runId. Missing values are saved as NULL.
+        :param session: an open session; the caller is responsible for committing.
+        :return: none
+        '''
+        if not statsByRun:
+            return
+
+        columns = [col.name for col in RunStats.__table__.columns if col.name != 'runId']
+        rows = []
+        for runId, stats in iteritems(statsByRun):
+            row = {col: stats.get(col) for col in columns}
+            row['runId'] = runId
+            rows.append(row)
+
+        runIds = list(statsByRun.keys())
+        chunkSize = 500
+        for i in range(0, len(runIds), chunkSize):
+            session.execute(RunStats.__table__.delete().where(RunStats.runId.in_(runIds[i:i + chunkSize])))
+
+        self.insertRows(session, RunStats, rows)
+
+    def getRunStats(self, simId, expList=None):
+        '''
+        Return a DataFrame of the resource use of the runs of simulation `simId`,
+        optionally limited to the given experiments, with columns expName,
+        trialNum, status and those of the RunStats table. Note that maxRssMB
+        is the peak memory use of the worker process up to the end of the run,
+        which may include earlier runs by the same worker; gcamMaxRssMB is that
+        of the run's GCAM process alone.
+        '''
+        from pandas import DataFrame    # lazy import
+
+        if isinstance(expList, string_types):
+            expList = [expList]
+
+        statsCols = [col for col in RunStats.__table__.columns if col.name != 'runId']
+
+        with self.sessionScope() as session:
+            query = session.query(Experiment.expName, Run.trialNum, Run.status, *statsCols).\
+                filter(Run.simId == simId).join(Experiment).join(RunStats, RunStats.runId == Run.runId)
+
+            if expList:
+                query = query.filter(Experiment.expName.in_(expList))
+
+            rows = query.order_by(Run.trialNum).all()
+
+        columns = ['expName', 'trialNum', 'status'] + [col.name for col in statsCols]
+        return DataFrame.from_records(rows, columns=columns)
+
+    def savePeriodStatsBatch(self, periodsByRun, session):
+        '''
+        Save the solver progress of a batch of runs, replacing any saved previously
+        for the same runs.
+
+        :param periodsByRun: (dict) lists of dicts with keys period, year, iterations,
+           seconds and solved (as returned by pygcam.gcam.getSolverProgress), keyed by runId.
+        :param session: an open session; the caller is responsible for committing.
+        :return: none
+        '''
+        if not periodsByRun:
+            return
+
+        columns = [col.name for col in PeriodStats.__table__.columns if col.name != 'runId']
+        rows = []
+        for runId, periods in iteritems(periodsByRun):
+            for period in periods:
+                row = {col: period.get(col) for col in columns}
+                row['runId'] = runId
+                rows.append(row)
+
+        runIds = list(periodsByRun.keys())
+        chunkSize = 500
+        for i in range(0, len(runIds), chunkSize):
+            session.execute(PeriodStats.__table__.delete().where(PeriodStats.runId.in_(runIds[i:i + chunkSize])))
+
+        self.insertRows(session, PeriodStats, rows)
+
+    def getPeriodStats(self, simId, expList=None):
+        '''
+        Return a DataFrame of the solver progress of each model period of the runs
+        of simulation `simId`, optionally limited to the given experiments, with
+        columns expName, trialNum, status and those of the PeriodStats table.
+        '''
+        from pandas import DataFrame    # lazy import
+
+        if isinstance(expList, string_types):
+            expList = [expList]
+
+        statsCols = [col for col in PeriodStats.__table__.columns if col.name != 'runId']
+
+        with self.sessionScope() as session:
+            query = session.query(Experiment.expName, Run.trialNum, Run.status, *statsCols).\
+                filter(Run.simId == simId).join(Experiment).join(PeriodStats, PeriodStats.runId == Run.runId)
+
+            if expList:
+                query = query.filter(Experiment.expName.in_(expList))
+
+            rows = query.order_by(Run.trialNum, PeriodStats.period).all()
+
+        columns = ['expName', 'trialNum', 'status'] + [col.name for col in statsCols]
+        return DataFrame.from_records(rows, columns=columns)
+
     # def queryToDataFrame(self, query):  # TBD: Not used anywhere yet...
     #     from pandas import DataFrame    # lazy import
     #
@@ -636,6 +1027,12 @@ class CoreDatabase(object):
 
     def getParameterValues2(self, simId):
         from pandas import DataFrame    # lazy import
+        from .columnStore import getColumnStore
+
+        store = getColumnStore(simId)
+        if store and store.hasParameters():
+            return store.getParameterValues()
+
         session = self.Session()
 
         query = session.query(InValue.trialNum, InValue.value, Input.paramName).\
@@ -760,6 +1157,97 @@ class CoreDatabase(object):
             if not session:
                 self.endSession(sess)
 
+    def setRunStatuses(self, statusByRunId, session=None, chunkSize=500):
+        '''
+        Set the status of many runs using bulk UPDATE statements rather than one
+        ORM update per run. Timestamps are set as beforeSavingRun() does for ORM
+        updates, which aren't used here, but to the time of each change rather
+        than the time it's written. Runs that finished without a known startTime
+        need the one in the database to compute the duration, which is read with
+        one "SELECT ... WHERE runId IN (...)" per chunk of runIds.
+
+        :param statusByRunId: (dict) StatusChange instances, or status strings for
+           changes made now, keyed by runId
+        :param session: an open session, or None, in which case a session is
+           allocated and committed.
+        :param chunkSize: (int) the maximum number of runIds per IN clause
+        :return: none
+        '''
+        from sqlalchemy import bindparam
+
+        if not statusByRunId:
+            return
+
+        sess = session or self.Session()
+        table = Run.__table__
+        now = datetime.now()
+
+        def duration(startTime, endTime):
+            return (endTime - startTime).seconds // 60
+
+        queued   = []   # rows for runs changed to "new" or "queued"
+        running  = []   # rows for runs changed to "running"
+        finished = []   # rows for runs that finished, with startTime
+        notStarted = [] # rows for runs that finished, without startTime
+        lookup = {}     # changes needing the startTime in the database, by runId
+
+        for runId, change in iteritems(statusByRunId):
+            if isinstance(change, string_types):
+                change = StatusChange(change, now, None)
+
+            row = dict(_runId=runId, status=change.status)
+            if change.status in (RUN_NEW, RUN_QUEUED):
+                row.update(queueTime=change.time)
+                queued.append(row)
+            elif change.status == RUN_RUNNING:
+                row.update(startTime=change.time)
+                running.append(row)
+            elif change.startTime:
+                row.update(startTime=change.startTime, endTime=change.time,
+                           duration=duration(change.startTime, change.time))
+                finished.append(row)
+            else:
+                lookup[runId] = change
+
+        try:
+            runIds = list(lookup.keys())
+            for i in xrange(0, len(runIds), chunkSize):
+                query = sess.query(Run.runId, Run.startTime).filter(Run.runId.in_(runIds[i:i + chunkSize]))
+                for runId, startTime in query:
+                    change = lookup[runId]
+                    if startTime:
+                        finished.append(dict(_runId=runId, status=change.status, startTime=startTime,
+                                             endTime=change.time, duration=duration(startTime, change.time)))
+                    else:
+                        notStarted.append(dict(_runId=runId, status=change.status))
+
+            where = table.c.runId == bindparam('_runId')
+            statements = (
+                (queued,   table.update().where(where).values(status=bindparam('status'), queueTime=bindparam('queueTime'),
+                                                              startTime=None, endTime=None, duration=None)),
+                (running,  table.update().where(where).values(status=bindparam('status'), startTime=bindparam('startTime'),
+                                                              endTime=None, duration=None)),
+                (finished, table.update().where(where).values(status=bindparam('status'), startTime=bindparam('startTime'),
+                                                              endTime=bindparam('endTime'), duration=bindparam('duration'))),
+                (notStarted, table.update().where(where).values(status=bindparam('status'))),
+            )
+
+            for rows, stmt in statements:
+                if rows:
+                    sess.execute(stmt, rows)
+
+            if session is None:
+                self.commitWithRetry(sess)
+
+        except Exception:
+            if session is None:
+                sess.rollback()
+            raise
+
+        finally:
+            if session is None:
+                self.endSession(sess)
+
     def getRunsWithStatus(self, simId, expList, statusList):
         # Allow expList and statusList to be a single string,
         # which we convert to lists
@@ -784,6 +1272,25 @@ class CoreDatabase(object):
         #_logger.debug("for simid=%d, expList=%s, status=%s, rslt=%s" % (simId, expList, status, rslt))
         return rslt
 
+    def getRunDurations(self, simId, expList):
+        '''
+        Return a list of (expName, trialNum, seconds) for the succeeded runs of
+        the given experiments in simulation `simId`, where seconds is the elapsed
+        time from the run's startTime to its endTime.
+        '''
+        if isinstance(expList, string_types):
+            expList = [expList]
+
+        with self.sessionScope() as session:
+            query = session.query(Experiment.expName, Run.trialNum, Run.startTime, Run.endTime).\
+                filter(Run.simId == simId, Run.status == RUN_SUCCEEDED).\
+                join(Experiment).filter(Experiment.expName.in_(expList))
+
+            rslt = [(expName, trialNum, (endTime - startTime).total_seconds())
+                    for expName, trialNum, startTime, endTime in query if startTime and endTime]
+
+        return rslt
+
     def getRunsByStatus(self, simId, scenario, statusList, groupName=None, projectName=None):
         '''
         By default, returns tuples of (runId, trialNum) for the given scenario that have
@@ -815,16 +1322,17 @@ class CoreDatabase(object):
                             baseline=r[5], groupName=groupName, projectName=projectName) for r in rslt]
         return rslt
 
-    def createSim(self, trials, description, simId=None):
+    def createSim(self, trials, description, simId=None, seed=None):
         '''
-        Creates a new simulation with the given number of trials and description
+        Creates a new simulation with the given number of trials, description,
+        and seed for the random streams used to generate its trial data.
         '''
         with self.sessionScope() as session:
             if simId is None:
-                newSim = Sim(trials=trials, description=description)
+                newSim = Sim(trials=trials, description=description, seed=seed)
             else:
                 session.query(Sim).filter_by(simId=simId).delete()
-                newSim = Sim(trials=trials, description=description, simId=simId)
+                newSim = Sim(trials=trials, description=description, simId=simId, seed=seed)
 
             session.add(newSim)
 
@@ -835,6 +1343,19 @@ class CoreDatabase(object):
            sim = session.query(Sim).filter_by(simId=simId).one()
            sim.trials = trials
 
+    def setSimSeed(self, simId, seed):
+        with self.sessionScope() as session:
+            sim = session.query(Sim).filter_by(simId=simId).one()
+            sim.seed = seed
+
+    def getSimSeed(self, simId):
+        '''
+        Return the seed used to generate the sim's trial data, or None if it
+        was generated without one (e.g., by an earlier version of pygcam).
+        '''
+        with self.sessionScope() as session:
+            return session.query(Sim.seed).filter_by(simId=simId).scalar()
+
     def getTrialCount(self, simId):
         with self.sessionScope() as session:
             trialCount = session.query(Sim.trials).filter_by(simId=simId).scalar()
@@ -974,6 +1495,29 @@ class GcamDatabase(CoreDatabase):
             cls.instance.engine.dispose()
         cls.instance = None
 
+    _inherited = []     # instances set aside by afterFork()
+
+    @classmethod
+    def afterFork(cls):
+        '''
+        Call in a process forked from one that has used the database, before any
+        database access, so that a new instance with its own engine and connection
+        pool is created on the next call to getDatabase(). The pooled connections
+        inherited from the parent must be neither used nor closed in the child,
+        since closing a client/server connection (e.g., to Postgres) also ends the
+        parent's session. With SQLAlchemy 1.4.33 or later, the inherited pool is
+        disposed of without closing its connections; with earlier versions the
+        inherited instance is kept, unused, for the life of the process.
+        '''
+        db = cls.instance
+        cls.instance = None
+
+        if db and db.engine:
+            try:
+                db.engine.dispose(close=False)
+            except TypeError:
+                cls._inherited.append(db)
+
     def initDb(self, args=None):
         'Add GCAM-specific tables to the database'
         super(GcamDatabase, self).initDb(args=args)
@@ -1190,18 +1734,23 @@ class GcamDatabase(CoreDatabase):
 
         self.endSession(session)
 
-    def saveParameterValues(self, simId, tuples):
+    def saveParameterValues(self, simId, tuples, count=None):
         '''
         Save the value of the given parameter in the database. Tuples are
-        of the format: (trialNum, paramId, value, varNum)
+        of the format: (trialNum, paramId, value, varNum), and can be provided
+        by a generator. Values are written using a chunked bulk insert.
+
+        :param simId: (int) simulation ID
+        :param tuples: (iterable of tuples) the values to save
+        :param count: (int) the number of tuples, if known, for progress messages
+        :return: (int) the number of values saved
         '''
-        with self.sessionScope() as session:
-            for trialNum, paramId, value, varNum in tuples:
-                # We save varNum to distinguish among independent values for the same variable name.
-                # The only purpose this serves is to ensure uniqueness, enforced by the database.
-                inValue = InValue(inputId=paramId, simId=simId, trialNum=trialNum,
-                                  value=value, row=0, col=varNum)
-                session.add(inValue)
+        # We save varNum to distinguish among independent values for the same variable name.
+        # The only purpose this serves is to ensure uniqueness, enforced by the database.
+        columns = ('inputId', 'simId', 'trialNum', 'value', 'row', 'col')
+        rows = ((paramId, simId, trialNum, value, 0, varNum) for trialNum, paramId, value, varNum in tuples)
+
+        return self.bulkInsert(InValue, columns, rows, count=count, label='parameter value')
 
     def deleteRunResults(self, runId, outputIds=None, session=None):
         """
@@ -1222,6 +1771,80 @@ class GcamDatabase(CoreDatabase):
             self.commitWithRetry(sess)
             self.endSession(sess)
 
+    def deleteRunResultsBatch(self, outputIdsByRun, session):
+        """
+        Augment core method by deleting timeseries data, too.
+        """
+        super(GcamDatabase, self).deleteRunResultsBatch(outputIdsByRun, session)
+
+        for outputIds, runIds in iteritems(_groupRunsByOutputs(outputIdsByRun)):
+            stmt = TimeSeries.__table__.delete().where(TimeSeries.runId.in_(runIds))
+            if outputIds:
+                stmt = stmt.where(TimeSeries.outputId.in_(outputIds))
+            session.execute(stmt)
+
+    def saveResultsBatch(self, resultsByRun, session=None, program=GCAM_PROGRAM):
+        '''
+        Save the scalar and timeseries results for a batch of runs. Stale results
+        for the same runs and outputs are deleted, and all new values are inserted
+        with one bulk INSERT per table, so an entire batch of completed trials is
+        saved in a single transaction. If session is not provided, one is allocated
+        and the transaction is committed. If a session is provided, the caller is
+        responsible for calling commit.
+
+        :param resultsByRun: (dict) lists of result dicts, as produced by
+           XMLResultFile.collectResults(), keyed by runId
+        :param session: an open session, or None
+        :param program: (str) the name of the program defining the outputs
+        :return: none
+        '''
+        if not resultsByRun:
+            return
+
+        sess = session or self.Session()
+
+        yearCols = self.yearCols()
+        outValues = []
+        timeSeries = []
+        outputIdsByRun = {}
+
+        for runId, resultsList in iteritems(resultsByRun):
+            names = [resultDict['paramName'] for resultDict in resultsList]
+            outputIds = outputIdsByRun[runId] = self.lookupOutputIds(names, program=program)
+
+            for outputId, resultDict in zip(outputIds, resultsList):
+                value = resultDict['value']
+
+                if resultDict['isScalar']:
+                    outValues.append(dict(runId=runId, outputId=outputId, value=float(value)))
+                else:
+                    regionId = self.getRegionId(resultDict['regionName'])   # cached; not a DB query
+                    row = dict(runId=runId, outputId=outputId, regionId=regionId,
+                               units=resultDict['units'])
+
+                    # All rows must have the same keys for a single INSERT
+                    for col in yearCols:
+                        colValue = value.get(col)
+                        row[col] = None if colValue is None else float(colValue)
+                    timeSeries.append(row)
+
+        try:
+            self.deleteRunResultsBatch(outputIdsByRun, sess)
+            self.insertRows(sess, OutValue, outValues)
+            self.insertRows(sess, TimeSeries, timeSeries)
+
+            if session is None:
+                self.commitWithRetry(sess)
+
+        except Exception:
+            if session is None:
+                sess.rollback()
+            raise
+
+        finally:
+            if session is None:
+                self.endSession(sess)
+
     def saveTimeSeries(self, runId, regionId, paramName, values, units=None, session=None):
         sess = session or self.Session()
 
@@ -1247,6 +1870,27 @@ class GcamDatabase(CoreDatabase):
             sess.commit()
             self.endSession(sess)
 
+    def _getTimeSeriesFromStore(self, store, paramName, expList):
+        '''
+        Create the same (TimeSeries, expName) tuples that getTimeSeries() returns
+        from the SQL database, using data in the columnar store. The TimeSeries
+        instances are transient, i.e., not associated with a session.
+        '''
+        outputId = self.lookupOutputIds([paramName])[0]
+
+        rslt = []
+        for expName in expList:
+            for regionId, units, yearCols, runIds, values in store.getTimeSeries(expName, paramName):
+                for runId, row in zip(runIds.tolist(), values.tolist()):
+                    ts = TimeSeries(seriesId=len(rslt) + 1, runId=runId, outputId=outputId,
+                                    regionId=regionId, units=units)
+                    for col, value in zip(yearCols, row):
+                        setattr(ts, col, value)
+
+                    rslt.append((ts, expName))
+
+        return rslt
+
     def getTimeSeries(self, simId, paramName, expList):
         '''
         Retrieve all timeseries rows for the given simId and paramName.
@@ -1257,11 +1901,17 @@ class GcamDatabase(CoreDatabase):
            results for.
         :return: list of TimeSeries tuples or None
         '''
+        from .columnStore import getColumnStore
+
+        store = getColumnStore(simId)
+        if store and all(store.hasOutput(expName, paramName, isScalar=False) for expName in expList):
+            return self._getTimeSeriesFromStore(store, paramName, expList)
+
         cols = ['seriesId', 'runId', 'outputId', 'units'] + self.yearCols()
 
         with self.sessionScope() as session:
             query = session.query(TimeSeries, Experiment.expName).options(load_only(*cols)). \
-                join(Run).filter_by(simId=simId).filter_by(status='succeeded'). \
+                select_from(TimeSeries).join(Run).filter_by(simId=simId).filter_by(status='succeeded'). \
                 join(Experiment).filter(Experiment.expName.in_(expList)). \
                 join(Output).filter_by(name=paramName)
 
@@ -1280,6 +1930,62 @@ def getDatabase(checkInit=True):
     '''
     return GcamDatabase.getDatabase(checkInit=checkInit)
 
+def _copyText(value):
+    '''
+    Format a value for Postgres' COPY text format, in which NULL is written as
+    \\N and backslashes, tabs, and newlines in strings must be escaped.
+    '''
+    if value is None:
+        return '\\N'
+
+    if isinstance(value, string_types):
+        return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def copyRows(session, table, rows):
+    '''
+    Insert rows into a Postgres table by streaming them (in COPY's tab-delimited
+    text format) through "COPY ... FROM STDIN", which is much faster than INSERT
+    statements for large numbers of rows. The COPY runs on the session's
+    connection, so it is part of the session's transaction.
+
+    :param session: an open session bound to a psycopg2 engine
+    :param table: (sqlalchemy.Table) the table to insert into
+    :param rows: (list of dict) values keyed by column name. All dicts must
+       have the same keys.
+    :return: none
+    '''
+    from six.moves import StringIO
+
+    columns = list(rows[0].keys())
+
+    buffer = StringIO()
+    buffer.writelines('\t'.join(_copyText(row[col]) for col in columns) + '\n' for row in rows)
+    buffer.seek(0)
+
+    preparer = session.get_bind().dialect.identifier_preparer
+    sql = "COPY %s (%s) FROM STDIN" % \
+          (preparer.format_table(table), ', '.join(preparer.quote(col) for col in columns))
+
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+
+def _groupRunsByOutputs(outputIdsByRun):
+    '''
+    Invert a dict of lists of outputIds keyed by runId to produce a dict of
+    lists of runIds keyed by the (sorted tuple of) outputIds.
+    '''
+    groups = {}
+    for runId, outputIds in iteritems(outputIdsByRun):
+        key = tuple(sorted(set(outputIds or [])))
+        groups.setdefault(key, []).append(runId)
+
+    return groups
+
 def dropTable(tableName, meta):
     if tableName in meta.tables:
         # Drop the table if it exists and remove it from the metadata
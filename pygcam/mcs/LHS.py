@@ -15,26 +15,76 @@ Heavily modified from http://nullege.com/codes/show/src@m@o@model-builder-HEAD@B
 '''
 import numpy as np
 from scipy import stats
+from scipy.linalg import solve_triangular
 from pandas import DataFrame
 
+from ..log import getLogger
+
+_logger = getLogger(__name__)
+
+# Smallest eigenvalue allowed in a correlation matrix repaired by nearestCorrelation()
+MIN_EIGENVALUE = 1e-8
+
+# Keys distinguishing the random streams used by lhs() and lhsAmend(); see getSeedSequence()
+SAMPLE_STREAMS = 0
+LINKED_STREAMS = 1
+
+def rankColumns(m):
+    '''
+    Return an integer array of the 1-relative ranks of the values in each column
+    of the 2-D array 'm'. Ties are ranked in order of appearance, which makes no
+    difference for the continuous values to which this is applied.
+    '''
+    trials = m.shape[0]
+    order = np.argsort(m, axis=0)
+    ranks = np.empty(m.shape, dtype='i')
+    np.put_along_axis(ranks, order, np.arange(1, trials + 1, dtype='i')[:, np.newaxis], axis=0)
+    return ranks
+
+
 def rankCorrCoef(m):
     '''
     Take a 2-D array of values and produce a array of rank correlation
     coefficients representing the rank correlation among the columns.
     '''
-    dummy, cols = m.shape
-    corrCoef = np.zeros((cols, cols))  # @UndefinedVariable
-
-    for i in range(cols):
-        corrCoef[i, i] = 1.  # All columns are perfectly correlated with themselves
-        for j in range(i + 1, cols):
-            corr = stats.spearmanr(m[:, i], m[:, j])[0]
-            corrCoef[i, j] = corrCoef[j, i] = corr
+    return np.atleast_2d(np.corrcoef(rankColumns(m), rowvar=False))
 
-    return corrCoef
 
-
-def genRankValues(params, trials, corrMat):
+def nearestCorrelation(corrMat, maxIter=100):
+    '''
+    Return 'corrMat' if it is positive definite, otherwise the nearby positive
+    definite matrix with unit diagonal produced by repeatedly raising the negative
+    (or zero) eigenvalues to MIN_EIGENVALUE and rescaling the diagonal to 1.
+    Correlations specified independently for pairs of parameters needn't be
+    mutually consistent, in which case the matrix cannot be factored.
+    '''
+    corrMat = np.asarray(corrMat, dtype=float)
+    try:
+        np.linalg.cholesky(corrMat)
+        return corrMat
+    except np.linalg.LinAlgError:
+        pass
+
+    repaired = (corrMat + corrMat.T) / 2
+    for _ in range(maxIter):
+        values, vectors = np.linalg.eigh(repaired)
+        repaired = np.dot(vectors * np.maximum(values, MIN_EIGENVALUE), vectors.T)
+        scale = np.sqrt(np.diag(repaired))
+        repaired = repaired / np.outer(scale, scale)
+        try:
+            np.linalg.cholesky(repaired)
+            break
+        except np.linalg.LinAlgError:
+            continue
+    else:
+        raise np.linalg.LinAlgError('Failed to repair correlation matrix in %d iterations' % maxIter)
+
+    _logger.warning('Correlation matrix is not positive definite; using nearest repaired matrix '
+                    '(largest change in a correlation: %.4f)', np.abs(repaired - corrMat).max())
+    return repaired
+
+
+def genRankValues(params, trials, corrMat, rng=None):
     '''
     Generate a data set of 'trials' ranks for 'params'
     parameters that obey the given correlation matrix.
@@ -45,7 +95,10 @@ def genRankValues(params, trials, corrMat):
 
     corrMat: rank correlation matrix for parameters.
     corrMat[i,j] denotes the rank correlation between parameter
-    i and j.
+    i and j. If it is not positive definite, the nearest matrix
+    that is (see nearestCorrelation) is used instead.
+
+    rng: random Generator to use; default is numpy's global state.
 
     Output is a matrix with 'trials' rows and 'params' columns.
     The i'th column represents the ranks for the i'th parameter.
@@ -59,41 +112,147 @@ def genRankValues(params, trials, corrMat):
      [5,2,1],
      [3,6,4]]
     '''
-    # Create van der Waarden scores
+    rng = np.random if rng is None else rng
+
+    # Create van der Waarden scores, shuffled independently for each column
     strata = np.arange(1.0, trials + 1) / (trials + 1)
     vdwScores = stats.norm().ppf(strata)
+    S = vdwScores[np.argsort(rng.random((trials, params)), axis=0)]
 
-    S = np.zeros((trials, params))
-    for i in xrange(params):
-        np.random.shuffle(vdwScores)
-        S[:, i] = vdwScores
+    # Transform S from its actual rank correlation E = Q Q' to the target P P',
+    # i.e., compute S (P Q^-1)', solving with the triangular Q rather than inverting it.
+    P = np.linalg.cholesky(nearestCorrelation(corrMat))
+    Q = np.linalg.cholesky(nearestCorrelation(rankCorrCoef(S)))
+    T = solve_triangular(Q.T, P.T, lower=False)
+    final = np.dot(S, T)
 
-    P = np.linalg.cholesky(corrMat)
+    return rankColumns(final)
 
-    E = rankCorrCoef(S)
-    Q = np.array(np.linalg.cholesky(E))
-    final = np.dot(np.dot(S, np.linalg.inv(Q).T), P.T)
 
-    ranks = np.zeros((trials, params), dtype='i')
-    for i in xrange(params):
-        ranks[:, i] = stats.rankdata(final[:, i])
-
-    return ranks
-
-
-def getPercentiles(trials=100):
+def getPercentiles(trials=100, rng=None):
     '''
     Generate a list of 'trials' values, one from each of 'trials' equal-size
     segments from a uniform distribution. These are used with an RV's ppf
     (percent point function = inverse cumulative function) to retrieve the
-    values for that RV at the corresponding percentiles.
+    values for that RV at the corresponding percentiles. Random numbers are
+    drawn from 'rng', if given, otherwise from numpy's global state.
     '''
+    rng = np.random if rng is None else rng
     segmentSize = float(1. / trials)
-    points = stats.uniform.rvs(size=trials) * segmentSize + np.arange(trials) * segmentSize  # @UndefinedVariable
+    points = rng.random(trials) * segmentSize + np.arange(trials) * segmentSize
+    return points
+
+
+def getSamplePercentiles(param, values):
+    '''
+    Return the percentiles at which the given values of 'param' lie: from the
+    param's cdf, if it defines one, or otherwise assuming that each value lies
+    at the midpoint of the stratum corresponding to its rank among the values.
+    '''
+    cdf = getattr(param, 'cdf', None)
+    percentiles = cdf(values) if cdf else None
+
+    if percentiles is None:
+        percentiles = (stats.rankdata(values, method='ordinal') - 0.5) / len(values)
+
+    return np.asarray(percentiles)
+
+
+def getExtensionPercentiles(existing, trials, rng=None):
+    '''
+    Generate a list of 'trials' percentiles with which to extend a Latin Hypercube
+    sample whose values lie at the percentiles 'existing', so that the combined
+    sample remains stratified. The unit interval is divided into len(existing) +
+    trials equal segments, and one value is drawn from each of 'trials' segments
+    not holding an existing value (chosen at random, if there are more of these).
+    If 'trials' is a multiple of len(existing), e.g., when doubling the sample,
+    exactly 'trials' segments are empty, so the combined sample is fully stratified.
+    Random numbers are drawn from 'rng', if given, otherwise from numpy's global state.
+    '''
+    rng = np.random if rng is None else rng
+    total = len(existing) + trials
+    occupied = np.minimum(np.floor(np.asarray(existing) * total), total - 1).astype(int)
+
+    empty = np.ones(total, dtype=bool)
+    empty[occupied] = False
+    segments = np.flatnonzero(empty)
+
+    if len(segments) > trials:
+        segments = np.sort(rng.choice(segments, trials, replace=False))
+
+    points = (segments + rng.random(trials)) / total
     return points
 
 
-def lhs(paramList, trials, corrMat=None, columns=None, skip=None):
+def newSeed():
+    '''
+    Return a new random seed for a simulation's sample, which fits a (signed) 64-bit integer.
+    '''
+    return int(np.random.SeedSequence().generate_state(1, np.uint64)[0] >> 1)
+
+
+def getSeedSequence(seed, start=0, key=SAMPLE_STREAMS):
+    '''
+    Return the SeedSequence from which the random streams for the trials of a sample
+    starting at trial 'start' are spawned: one per column and one for the rank
+    correlations (key SAMPLE_STREAMS), or one per linked parameter (LINKED_STREAMS).
+    Each column's values depend only on its own stream, so they are the same whether
+    the columns are generated serially or by any number of processes, and trials
+    added by "gensim --extend" use streams independent of the existing trials'.
+    '''
+    return np.random.SeedSequence(seed, spawn_key=(start, key))
+
+
+def columnGenerator(seedSeq):
+    '''
+    Return a random Generator for the column whose stream is 'seedSeq', after seeding
+    numpy's global state from the same stream, so that ppf functions that use it (e.g.,
+    GridRV's shuffle, or PythonFunc parameters) are also reproducible.
+    '''
+    np.random.seed(seedSeq.generate_state(1)[0])
+    return np.random.default_rng(seedSeq)
+
+
+# The function evaluated by genColumns' processes, which inherit it when forked
+_columnFunc = None
+
+def _evalColumn(i):
+    return _columnFunc(i)
+
+
+def genColumns(func, count, processes=1):
+    '''
+    Return the list [func(0), func(1), ..., func(count - 1)], evaluated by a pool of
+    'processes' processes if processes > 1. The processes are forked, so func (e.g.,
+    a closure over the parameter objects) needn't be picklable, but its results must
+    be. Where processes can't be forked, the columns are evaluated serially.
+    '''
+    global _columnFunc
+    import multiprocessing as mp
+
+    processes = min(processes, count)
+    if processes > 1:
+        try:
+            context = mp.get_context('fork')
+        except ValueError:
+            _logger.warning('Processes cannot be forked on this platform; generating columns serially')
+            processes = 1
+
+    if processes <= 1:
+        return [func(i) for i in range(count)]
+
+    _columnFunc = func
+    pool = context.Pool(processes)
+    try:
+        return pool.map(_evalColumn, range(count), chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+        _columnFunc = None
+
+
+def lhs(paramList, trials, corrMat=None, columns=None, skip=None, existing=None,
+        seed=None, start=0, processes=1):
     """
     Produce an ndarray or DataFrame of 'trials' rows of values for the given parameter
     list, respecting the correlation matrix 'corrMat' if one is specified, using Latin
@@ -112,33 +271,64 @@ def lhs(paramList, trials, corrMat=None, columns=None, skip=None):
     :param skip: (list of params)) Parameters to process later because they are
            dependent on other parameter values (e.g., they're "linked"). These
            cannot be correlated.
+    :param existing: (None or 2-D array) values previously generated for the same
+           parameters (in the same column order), which the values returned extend,
+           so that the combined sample remains stratified. See getExtensionPercentiles.
+    :param seed: (int) if not None, random numbers are drawn from independent streams
+           spawned from this seed (see getSeedSequence) rather than numpy's global state,
+           so the sample is reproducible.
+    :param start: (int) the number of existing trials, if extending a sample.
+    :param processes: (int) the number of processes to use to compute the columns.
+           Random streams are required to use multiple processes, so if seed is
+           None and processes > 1, a new seed is used.
     :return: ndarray or DataFrame with `trials` rows of values for the `paramList`.
     """
-    ranks = genRankValues(len(paramList), trials, corrMat) if corrMat is not None else None
+    count = len(paramList)
+    if seed is None and processes > 1:
+        seed = newSeed()
+
+    streams = None if seed is None else getSeedSequence(seed, start).spawn(count + 1)
 
-    samples = np.zeros((trials, len(paramList)))  # @UndefinedVariable
+    ranks = None
+    if corrMat is not None:
+        rng = None if streams is None else np.random.default_rng(streams[-1])
+        ranks = genRankValues(count, trials, corrMat, rng=rng)
 
     skip = skip or []
 
-    for i, param in enumerate(paramList):
+    def column(i):
+        param = paramList[i]
         if param in skip:
-            continue    # process later
+            return None     # process later
 
-        values = param.ppf(getPercentiles(trials))  # extract values from the RV for these percentiles
+        rng = None if streams is None else columnGenerator(streams[i])
+
+        if existing is None:
+            percentiles = getPercentiles(trials, rng=rng)
+        else:
+            percentiles = getExtensionPercentiles(getSamplePercentiles(param, existing[:, i]), trials, rng=rng)
+
+        values = np.asarray(param.ppf(percentiles), dtype=float)  # extract values from the RV for these percentiles
 
         if corrMat is None:
             # Sequence is a special case for which we don't shuffle (and we ignore stratified sampling)
             if param.param.dataSrc.distroName != 'sequence':
-                np.random.shuffle(values)  # randomize the stratified samples
+                (np.random if rng is None else rng).shuffle(values)  # randomize the stratified samples
         else:
             indices = ranks[:, i] - 1  # make them 0-relative
             values = values[indices]   # reorder to respect correlations
 
-        samples[:, i] = values
+        return values
+
+    samples = np.zeros((trials, count))
+
+    for i, values in enumerate(genColumns(column, count, processes=processes)):
+        if values is not None:
+            samples[:, i] = values
 
     return DataFrame(samples, columns=columns) if columns else samples
 
-def lhsAmend(df, rvList, trials):
+def lhsAmend(df, rvList, trials, seed=None, start=0):
     """
     Amend the DataFrame with LHS data by adding columns for the given parameters.
     This allows "linked" parameters to refer to values of other parameters.
@@ -146,14 +336,21 @@ def lhsAmend(df, rvList, trials):
     :param df: (DataFrame) Generated by prior call to LHS or something similar.
     :param paramList: (list of params) The parameters to fill in the df with
     :param trials: (int) the number of trials to generate for each parameter
+    :param seed: (int) if not None, random numbers are drawn from streams spawned
+           from this seed rather than numpy's global state (see getSeedSequence)
+    :param start: (int) the number of existing trials, if extending a sample.
     :return: none
     """
-    for rv in rvList:
-        values = rv.ppf(getPercentiles(trials))  # extract values from the RV for these percentiles
+    streams = None if seed is None else getSeedSequence(seed, start, key=LINKED_STREAMS).spawn(len(rvList))
+
+    for i, rv in enumerate(rvList):
+        rng = np.random if streams is None else columnGenerator(streams[i])
+
+        values = rv.ppf(getPercentiles(trials, rng=rng))  # extract values from the RV for these percentiles
         if not isinstance(values, np.ndarray):
             values = values.values               # convert pandas Series if needed
 
-        np.random.shuffle(values)                # randomize the stratified samples
+        rng.shuffle(values)                      # randomize the stratified samples
         param = rv.getParameter()
         paramName = param.getName()
         df[paramName] = values
@@ -0,0 +1,152 @@
+'''
+.. Quasi-Monte Carlo sampling: scrambled Sobol' or Halton sequences mapped
+   through each parameter's ppf, as a low-discrepancy alternative to LHS.
+
+.. Copyright (c) 2016  Richard Plevin
+   See the https://opensource.org/licenses/MIT for license details.
+'''
+import json
+import os
+
+import numpy as np
+from scipy import stats
+from pandas import DataFrame
+
+from ..log import getLogger
+from .context import getSimDir
+from .error import PygcamMcsUserError
+from .LHS import nearestCorrelation, getSeedSequence, columnGenerator, genColumns
+
+_logger = getLogger(__name__)
+
+# gensim --method names; "sobol" is taken by SALib's Sobol' sensitivity analysis
+QMC_METHODS = ('sobolseq', 'halton')
+
+SAMPLER_FILE = 'sampler.json'
+
+# Points are kept this far from 0 and 1 so that their normal scores are finite
+EPSILON = 1e-10
+
+
+def getSampler(method, dims, seed):
+    '''
+    Return a scrambled scipy.stats.qmc sampler of the given method and dimension.
+    '''
+    try:
+        from scipy.stats import qmc     # scipy >= 1.7
+
+    except ImportError:
+        raise PygcamMcsUserError('Method "%s" requires scipy version 1.7 or later' % method)
+
+    classes = {'sobolseq': qmc.Sobol, 'halton': qmc.Halton}
+    if method not in classes:
+        raise PygcamMcsUserError('Unknown quasi-random method "%s": must be one of %s' % (method, QMC_METHODS))
+
+    return classes[method](dims, scramble=True, seed=seed)
+
+
+def genPoints(method, dims, trials, seed, start=0):
+    '''
+    Return a (trials x dims) array of points in the unit hypercube: points
+    start to start + trials - 1 of the sequence scrambled with the given seed,
+    so that successive calls with increasing `start` continue the sequence.
+    '''
+    _logger.debug('Generating %d %s points of dimension %d from point %d (seed %d)', trials, method, dims, start, seed)
+    sampler = getSampler(method, dims, seed)
+    if start:
+        sampler.fast_forward(start)
+
+    return sampler.random(trials)
+
+
+def correlatePoints(points, corrMat):
+    '''
+    Impose the rank correlations in corrMat on the columns of 'points' with a
+    Gaussian copula: the points' normal scores are multiplied by the Cholesky
+    factor of the Pearson correlation matrix producing the given Spearman rank
+    correlations, and mapped back to percentiles. Unlike the Iman-Conover
+    reordering used by lhs(), this is a smooth transformation of the points,
+    so it largely preserves their low discrepancy.
+    '''
+    pearson = 2 * np.sin(np.pi * np.asarray(corrMat) / 6)
+    P = np.linalg.cholesky(nearestCorrelation(pearson))
+
+    scores = stats.norm.ppf(np.clip(points, EPSILON, 1 - EPSILON))
+    return stats.norm.cdf(np.dot(scores, P.T))
+
+
+def qmc(paramList, trials, method, seed, corrMat=None, columns=None, skip=None, start=0, processes=1):
+    """
+    Produce an ndarray or DataFrame of 'trials' rows of values for the given parameter
+    list, respecting the correlation matrix 'corrMat' if one is specified, using the
+    quasi-random sequence 'method'. Arguments are as for LHS.lhs(), plus:
+
+    :param method: (str) one of QMC_METHODS
+    :param seed: (int) the seed used to scramble the sequence
+    :param start: (int) the number of points of the sequence to skip, i.e., the
+           number of trials previously generated with the same method and seed.
+    :param processes: (int) the number of processes to use to compute the columns.
+    :return: ndarray or DataFrame with `trials` rows of values for the `paramList`.
+    """
+    points = genPoints(method, len(paramList), trials, seed, start=start)
+
+    if corrMat is not None:
+        points = correlatePoints(points, corrMat)
+
+    count = len(paramList)
+    streams = getSeedSequence(seed, start).spawn(count)     # for ppfs that draw random numbers
+
+    skip = skip or []
+
+    def column(i):
+        param = paramList[i]
+        if param in skip:
+            return None     # process later
+
+        columnGenerator(streams[i])
+        return np.asarray(param.ppf(points[:, i]), dtype=float)
+
+    samples = np.zeros((trials, count))
+
+    for i, values in enumerate(genColumns(column, count, processes=processes)):
+        if values is not None:
+            samples[:, i] = values
+
+    return DataFrame(samples, columns=columns) if columns else samples
+
+
+def getSamplerFile(simId):
+    return os.path.join(getSimDir(simId), SAMPLER_FILE)
+
+
+def writeSamplerFile(simId, method, seed, paramNames):
+    '''
+    Record the method, seed, and parameter order used to generate the trial data
+    for simId, so that "gensim --extend" can continue the same sequence.
+    '''
+    state = {'method': method, 'seed': seed, 'parameters': list(paramNames)}
+
+    with open(getSamplerFile(simId), 'w') as f:
+        json.dump(state, f, indent=2)
+
+
+def readSamplerFile(simId):
+    '''
+    Return the dict saved by writeSamplerFile for simId, or None if the
+    simulation wasn't generated by a quasi-random method.
+    '''
+    path = getSamplerFile(simId)
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def removeSamplerFile(simId):
+    '''
+    Remove any sampler file left by a previous generation of simId's trial data.
+    '''
+    path = getSamplerFile(simId)
+    if os.path.exists(path):
+        os.remove(path)
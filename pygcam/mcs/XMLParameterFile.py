@@ -236,6 +236,12 @@ class XMLTrialData(XMLWrapper):
     def ppf(self, *args):
         raise PygcamMcsSystemError('Called abstract "ppf" method of %s' % self.___class__.name)
 
+    def cdf(self, values):
+        """
+        Return the cumulative probabilities of `values`, or None if not defined.
+        """
+        return None
+
 
 class XMLDistribution(XMLTrialData):
     """
@@ -283,9 +289,9 @@ class XMLDistribution(XMLTrialData):
             attr = 'parameter'
             self.argDict[attr] = self.child.get(attr)
 
-        elif self.distroName == 'sequence':
+        elif self.distroName in ('sequence', 'empirical'):
             for key, val in self.child.items():
-                self.argDict[key] = val           # don't convert to float
+                self.argDict[key] = val           # don't convert to float (bins is converted by EmpiricalRV)
 
         else:
             for key, val in self.child.items():
@@ -319,6 +325,14 @@ class XMLDistribution(XMLTrialData):
         """
         return self.rv.ppf(*args)
 
+    def cdf(self, values):
+        """
+        Return the cumulative probabilities of `values`, or None if the distribution
+        doesn't define a cdf (e.g., "sequence" and "grid").
+        """
+        cdf = getattr(self.rv, 'cdf', None)
+        return cdf(values) if cdf else None
+
     def loadTrialFunc(self):
 
         funcRef = self.modDict['apply']
@@ -430,6 +444,7 @@ class XMLVariable(XMLWrapper):
         self.param       = param
         self.paramPath   = None
         self.storedValue = None      # cached float value
+        self.storedText  = None      # original element text, restored between trials
 
         # N.B. "is not None" is required because "not element" isn't guaranteed to work.
         if element is not None:      # For shared RVs, XMLParameter creates XMLRandomVar with element=None
@@ -464,6 +479,7 @@ class XMLVariable(XMLWrapper):
         Store the current value as a float
         """
         value = self.getValue()
+        self.storedText = value
         try:
             self.storedValue = float(value)
         except Exception:
@@ -473,6 +489,12 @@ class XMLVariable(XMLWrapper):
     def getFloatValue(self):
         return self.storedValue
 
+    def restoreValue(self):
+        """
+        Restore the element's original text, e.g., before applying another trial's values.
+        """
+        self.getElement().text = self.storedText
+
 
 class XMLRandomVar(XMLVariable):
     """
@@ -507,6 +529,12 @@ class XMLRandomVar(XMLVariable):
         assert dataSrc, 'Called ppf on shared XMLRandomVar (dataSrc is None)'
         return dataSrc.ppf(*args)
 
+    def cdf(self, values):
+        """
+        Pass-thru to the Distribution's cdf() method. Called by LHS when extending a sample.
+        """
+        return self.param.getDataSrc().cdf(values)
+
 class XMLParameter(XMLWrapper):
     """
     Stores information for a single parameter definition, whether a distribution,
@@ -674,6 +702,14 @@ class XMLParameter(XMLWrapper):
         # Add these to the list since we might be called for multiple scenarios
         self.vars.extend(vars)
 
+    def restoreElements(self):
+        """
+        Restore the original values of the elements found by our query.
+        """
+        for var in self.vars:
+            if var.getElement() is not None:    # shared RVs don't point to an XML element
+                var.restoreValue()
+
     def updateElements(self, simId, trialNum, df):
         """
         Update an element's text (assuming it's a number) by multiplying
@@ -980,6 +1016,48 @@ class XMLParameterFile(XMLFile):
         for obj in self.inputFiles.values():
             obj.generateRandomVars()
 
+    def isReusable(self):
+        """
+        Return True if the parsed and queried files can be reused for another trial
+        after calling restoreValues(), i.e., if no trial function or write function
+        is defined, since these can modify the XML trees arbitrarily.
+        """
+        if self.hasTrialFuncs():
+            return False
+
+        for inputFile in self.inputFiles.values():
+            if inputFile.writeFuncs:
+                return False
+
+        return True
+
+    def hasTrialFuncs(self):
+        """
+        Return True if any active parameter is applied by a trial function.
+        """
+        for inputFile in self.inputFiles.values():
+            for param in inputFile.parameters.values():
+                if param.isActive() and param.getDataSrc().isTrialFunc():
+                    return True
+
+        return False
+
+    def restoreValues(self):
+        """
+        Restore the original values of all elements modified by applying a trial.
+        """
+        for param in XMLParameter.getInstances():
+            param.restoreElements()
+
+    def getSourcePaths(self):
+        """
+        Return the pathnames of this file and of the config and input files it loaded.
+        """
+        paths = [self.getFilename()]
+        paths += [cfg.getFilename() for cfg in XMLConfigFile.instances.values()]
+        paths += [xmlFile.getAbsPath() for xmlFile in XMLInputFile.getModifiedXMLFiles()]
+        return paths
+
     def writeLocalXmlFiles(self, trialDir):
         """
         Write copies of all modified XML files
@@ -392,36 +392,11 @@ def saveResults(context, resultList):
     '''
     from .Database import getDatabase
 
-    runId = context.runId
-
     db = getDatabase()
-    session = db.Session()
-
-    # Delete any stale results for this runId (i.e., if re-running a given runId)
-    names = [resultDict['paramName'] for resultDict in resultList]
-    ids = db.getOutputIds(names)
-    db.deleteRunResults(runId, outputIds=ids, session=session)
-    db.commitWithRetry(session)
-
-    for resultDict in resultList:
-        paramName  = resultDict['paramName']
-        value      = resultDict['value']
-        regionName = resultDict['regionName']
-        regionId = db.getRegionId(regionName)
 
-        # Save the values to the database
-        try:
-            if resultDict['isScalar']:
-                db.setOutValue(runId, paramName, value, session=session)  # TBD: need regionId?
-            else:
-                units = resultDict['units']
-                db.saveTimeSeries(runId, regionId, paramName, value, units=units, session=session)
-
-        except Exception as e:
-            session.rollback()
-            db.endSession(session)
-            # TBD: distinguish database save errors from data access errors?
-            raise PygcamMcsSystemError("saveResults failed: %s" % e)
+    try:
+        db.saveResultsBatch({context.runId: resultList})
 
-    db.commitWithRetry(session)
-    db.endSession(session)
+    except Exception as e:
+        # TBD: distinguish database save errors from data access errors?
+        raise PygcamMcsSystemError("saveResults failed: %s" % e)
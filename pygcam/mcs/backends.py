@@ -0,0 +1,1156 @@
+'''
+.. Execution backends for running MCS trials.
+
+   The Master decides which trials to run, records their status and saves their
+   results; an execution backend runs them. Each backend supports the same small
+   interface: submit a trial (optionally after another trial), wait for completed
+   trials, cancel outstanding trials, and scale the number of workers. The backend
+   is chosen by config variable ``MCS.ExecutionBackend``, or by the runsim options
+   ``--runLocal`` ("inprocess") and ``--localWorkers`` ("local").
+
+.. Copyright (c) 2016  Richard Plevin
+   See the https://opensource.org/licenses/MIT for license details.
+'''
+from __future__ import division, print_function
+import os
+import subprocess
+import sys
+from six import iteritems
+from six.moves import queue
+from time import sleep, time
+
+from ..config import getParam, getParamAsInt, getParamAsFloat
+from ..log import getLogger
+from .Database import (RUN_SUCCEEDED, RUN_RUNNING, RUN_QUEUED, RUN_KILLED, RUN_ABORTED, RUN_UNSOLVED,
+                       ENG_TERMINATE)
+from .error import IpyparallelError, PygcamMcsUserError
+
+_logger = getLogger(__name__)
+
+BASELINE_FAILED = 'baseline trial did not succeed'
+STRAGGLER_KILLED = 'killed after running much longer than other trials of its scenario'
+
+
+def _chunks(lst, size):
+    '''
+    Return a list of consecutive sublists of `lst` of length `size`, except
+    that the last sublist may be shorter.
+    '''
+    return [lst[i:i + size] for i in range(0, len(lst), size)]
+
+def getBackendName(args):
+    '''
+    Return the name of the execution backend to use for the given runsim args.
+    '''
+    if getattr(args, 'runLocal', False):
+        return 'inprocess'
+
+    if getattr(args, 'localWorkers', 0):
+        return 'local'
+
+    name = getParam('MCS.ExecutionBackend').lower()
+    if name not in _backendClasses:
+        raise PygcamMcsUserError('Unknown execution backend "%s" (config var MCS.ExecutionBackend); must be one of %s'
+                                 % (name, ', '.join(sorted(_backendClasses))))
+    return name
+
+def getBackend(master):
+    '''
+    Return an instance of the execution backend selected for `master`.
+    '''
+    name = getBackendName(master.args)
+    return _backendClasses[name](master)
+
+
+class ExecutionBackend(object):
+    '''
+    Interface between the Master and the mechanism used to run trials.
+    Handles returned by submit() are opaque to the Master, which only
+    passes them back to submit() to express dependencies.
+    '''
+    def __init__(self, master):
+        self.master = master
+        self.args = master.args
+
+    def start(self):
+        '''
+        Prepare to run trials, e.g., by waiting for workers to register.
+        '''
+        pass
+
+    def submit(self, context, argDict, after=None):
+        '''
+        Submit a trial to run.
+
+        :param context: (Context) the run to perform
+        :param argDict: (dict) args to pass to worker.runTrial()
+        :param after: (handle) if not None, the trial must not start until the
+           trial with this handle has completed.
+        :return: a handle identifying the submitted trial
+        '''
+        raise NotImplementedError('%s.submit' % self.__class__.__name__)
+
+    def flush(self):
+        '''
+        Called after all trials are submitted, for backends that submit in batches.
+        '''
+        pass
+
+    def pending(self):
+        '''
+        Return the number of submitted trials whose results have not yet been returned.
+        '''
+        raise NotImplementedError('%s.pending' % self.__class__.__name__)
+
+    def wait(self, timeout):
+        '''
+        Wait up to `timeout` seconds for trials to complete.
+
+        :return: (list of WorkerResult) results of the trials completed since
+           the last call, which may be empty.
+        '''
+        raise NotImplementedError('%s.wait' % self.__class__.__name__)
+
+    def cancel(self):
+        '''
+        Cancel all outstanding trials.
+
+        :return: (list of Context) the runs that were cancelled
+        '''
+        return []
+
+    def cancelQueued(self):
+        '''
+        Cancel the trials that have not yet started, leaving running trials to
+        complete. By default, all outstanding trials are cancelled.
+
+        :return: (list of Context) the runs that were cancelled
+        '''
+        return self.cancel()
+
+    def workerCount(self):
+        '''
+        Return the number of trials that can run concurrently, or None if unknown.
+        '''
+        return None
+
+    def kill(self, context):
+        '''
+        Stop a running trial, e.g., one that is taking much longer than its peers.
+
+        :param context: (Context) the run to stop
+        :return: (list of WorkerResult) results for the stopped run, whose status
+           is set to "unsolved", and for any runs aborted as a consequence, or
+           None if the run isn't running or the backend can't stop it.
+        '''
+        _logger.debug('%s does not support killing trials', self.__class__.__name__)
+        return None
+
+    def scale(self, workers):
+        '''
+        Adjust the number of workers running trials, if the backend supports it.
+        '''
+        _logger.debug('%s does not support scaling', self.__class__.__name__)
+
+    def shutdown(self):
+        '''
+        Release resources after all trials have completed.
+        '''
+        pass
+
+
+class InProcessBackend(ExecutionBackend):
+    '''
+    Runs trials serially in the current process, one per call to wait().
+    Used by "runsim --runLocal", mainly for debugging.
+    '''
+    def __init__(self, master):
+        super(InProcessBackend, self).__init__(master)
+        self.queued = []        # (context, argDict, after) tuples
+        self.outcomes = {}      # completed runs' statuses keyed by runId
+
+    def submit(self, context, argDict, after=None):
+        self.queued.append((context, argDict, after))
+        return context
+
+    def pending(self):
+        return len(self.queued)
+
+    def wait(self, timeout):
+        import copy
+        from . import worker
+
+        context, argDict, after = self.queued.pop(0)
+
+        if after is not None and self.outcomes.get(after.runId) != RUN_SUCCEEDED:
+            context.setVars(status=RUN_ABORTED)
+            result = worker.WorkerResult(context, BASELINE_FAILED)
+        else:
+            self.master.setRunStatus(context, status=RUN_RUNNING)
+            ctx = copy.copy(context)    # use a copy to simulate what happens with remote call...
+            try:
+                result = worker.runTrial(ctx, argDict)
+
+            except Exception as e:
+                _logger.error("Exception running 'runTrial': %s", e)
+                context.setVars(status=RUN_ABORTED)
+                result = worker.WorkerResult(context, str(e))
+
+        self.outcomes[context.runId] = result.context.status
+        return [result]
+
+    def workerCount(self):
+        return 1
+
+    def cancel(self):
+        cancelled = [context for context, argDict, after in self.queued]
+        self.queued = []
+        return cancelled
+
+
+class LocalPoolBackend(ExecutionBackend):
+    '''
+    Runs trials concurrently in up to args.localWorkers local processes, one
+    process per trial. A dependent trial is started only after the trial it
+    depends on has succeeded. Runs whose process exits without returning a
+    result (e.g., it crashed or was killed by the OS) are marked "aborted".
+
+    Where processes are forked (the default start method on Linux), they
+    inherit the master's configuration, including settings made on the command
+    line. Only the forking thread is copied, so the child must not use anything
+    the master's other threads (e.g., the StatusWriter) may have held locked:
+    the child runs only worker.runTrialInProcess(), which doesn't use the
+    master's objects, and which replaces the inherited database instance
+    (see GcamDatabase.afterFork) before any database access.
+    '''
+    def __init__(self, master):
+        import multiprocessing as mp
+
+        super(LocalPoolBackend, self).__init__(master)
+        self.maxWorkers = self.args.localWorkers or getParamAsInt('MCS.LocalWorkers') or mp.cpu_count()
+        self.ready = []         # (context, argDict) of trials that can be started
+        self.waiting = {}       # lists of (context, argDict) keyed by the runId they depend on
+        self.running = {}       # (Process, Context) keyed by runId
+        self.outcomes = {}      # completed runs' statuses keyed by runId
+        self.aborted = []       # results not yet returned for trials whose baseline failed
+        self.results = mp.Queue()
+
+    def submit(self, context, argDict, after=None):
+        from . import worker
+
+        argDict = dict(argDict, standalone=True)
+        outcome = None if after is None else self.outcomes.get(after.runId)
+
+        if after is None or outcome == RUN_SUCCEEDED:
+            self.ready.append((context, argDict))
+
+        elif outcome is None:
+            self.waiting.setdefault(after.runId, []).append((context, argDict))
+
+        else:
+            context.setVars(status=RUN_ABORTED)
+            self.aborted.append(worker.WorkerResult(context, BASELINE_FAILED))
+
+        return context
+
+    def pending(self):
+        return len(self.ready) + len(self.running) + len(self.aborted) + sum(map(len, self.waiting.values()))
+
+    def startProcesses(self):
+        import multiprocessing as mp
+        from . import worker
+
+        while self.ready and len(self.running) < self.maxWorkers:
+            context, argDict = self.ready.pop(0)
+            proc = mp.Process(target=worker.runTrialInProcess, args=(context, argDict, self.results),
+                              name='trial-%d-%s' % (context.trialNum, context.scenario))
+            proc.start()
+            self.running[context.runId] = (proc, context)
+            self.master.setRunStatus(context, status=RUN_RUNNING)
+
+    def completed(self, result):
+        '''
+        Record a completed trial and release or abort the trials that depend on it.
+        Returns the list of results, including those for aborted dependents.
+        '''
+        from . import worker
+
+        context = result.context
+        if context.runId in self.outcomes:
+            return []       # e.g., the result of a trial that was killed as it finished
+
+        proc, _ = self.running.pop(context.runId, (None, None))
+        if proc:
+            proc.join()
+
+        self.outcomes[context.runId] = context.status
+        results = [result]
+
+        dependents = self.waiting.pop(context.runId, [])
+        if context.status == RUN_SUCCEEDED:
+            self.ready.extend(dependents)
+        else:
+            for ctx, argDict in dependents:
+                ctx.setVars(status=RUN_ABORTED)
+                results.extend(self.completed(worker.WorkerResult(ctx, BASELINE_FAILED)))
+
+        return results
+
+    def crashed(self):
+        '''
+        Return results for runs whose process exited abnormally without returning a result.
+        '''
+        from . import worker
+
+        results = []
+        for proc, context in list(self.running.values()):
+            if not proc.is_alive() and proc.exitcode != 0:
+                _logger.error('Process for trial %d of %s exited with code %s',
+                              context.trialNum, context.scenario, proc.exitcode)
+                context.setVars(status=RUN_ABORTED)
+                results.extend(self.completed(worker.WorkerResult(context, 'worker process exited with code %s' % proc.exitcode)))
+
+        return results
+
+    def wait(self, timeout):
+        if self.aborted:
+            results, self.aborted = self.aborted, []
+            return results
+
+        self.startProcesses()
+        deadline = time() + timeout
+
+        while self.running:
+            try:
+                return self.completed(self.results.get(timeout=min(1, max(0, deadline - time()))))
+
+            except queue.Empty:
+                pass
+
+            results = self.crashed()
+            if results or time() >= deadline:
+                return results
+
+        return []
+
+    def cancel(self):
+        cancelled = []
+        for proc, context in self.running.values():
+            _logger.warn('Terminating trial %d of %s', context.trialNum, context.scenario)
+            proc.terminate()
+            proc.join()
+            cancelled.append(context)
+
+        cancelled += [context for context, argDict in self.ready]
+        for dependents in self.waiting.values():
+            cancelled += [context for context, argDict in dependents]
+
+        self.running = {}
+        self.ready = []
+        self.waiting = {}
+        self.aborted = []
+        return cancelled
+
+    def cancelQueued(self):
+        # Trials waiting for a running trial to complete haven't started either
+        cancelled = [context for context, argDict in self.ready]
+        for dependents in self.waiting.values():
+            cancelled += [context for context, argDict in dependents]
+
+        self.ready = []
+        self.waiting = {}
+        return cancelled
+
+    def workerCount(self):
+        return self.maxWorkers
+
+    def kill(self, context):
+        from . import worker
+
+        proc, _ = self.running.get(context.runId, (None, None))
+        if not proc:
+            return None
+
+        proc.terminate()
+        proc.join()
+        context.setVars(status=RUN_UNSOLVED)
+        return self.completed(worker.WorkerResult(context, STRAGGLER_KILLED))
+
+    def scale(self, workers):
+        self.maxWorkers = max(1, workers)
+
+
+class IpyparallelBackend(ExecutionBackend):
+    '''
+    Runs trials on the engines of an ipyparallel cluster, which "runsim" starts
+    (unless it is already running) before creating the Master. If config variable
+    IPP.TrialsPerTask is greater than 1, trials are submitted in chunks of that
+    size, each run sequentially by one task, to reduce per-task overhead.
+    '''
+    def __init__(self, master):
+        super(IpyparallelBackend, self).__init__(master)
+        self.client = None
+        self.view = None
+        self.hubStopped = False
+        self.idleEngines = set()
+
+        self.trialsPerTask = getParamAsInt('IPP.TrialsPerTask')
+        self.argDict = None
+        self.buffered = []                   # (context, after) of trials to submit in chunks
+
+        self.contexts       = {}             # lists of Contexts of tasks not yet completed, keyed by AsyncResult
+        self.unstartedTasks = set()          # pending tasks not yet reported as running
+        self.hubTasks       = set()          # resubmitted tasks, which must be polled
+        self.completedTasks = queue.Queue()  # filled by AsyncResult callbacks
+
+        self.statusSecs = getParamAsFloat('IPP.StatusPollSecs')
+        self.queueSecs  = getParamAsFloat('IPP.QueueStatusSecs')
+        self.lastStatusPoll = self.lastQueuePoll = 0
+
+    def start(self):
+        self.waitForWorkers()    # wait for engines to spin up
+        self.view = self.client.load_balanced_view() # retries=2)
+
+    def waitForWorkers(self):
+        import ipyparallel as ipp
+
+        maxTries  = getParamAsInt('IPP.StartupWaitTries')
+        seconds   = getParamAsInt('IPP.StartupWaitSecs')
+        profile   = self.args.profile
+        clusterId = self.args.clusterId
+        client = None
+
+        for i in range(1, maxTries+1):
+            if client and len(client) > 0:
+                return
+
+            if client is None:
+                try:
+                    # default timeout is 10 seconds
+                    self.client = client = ipp.Client(profile=profile, cluster_id=clusterId)
+
+                # except IOError:
+                except Exception as e:
+                    _logger.debug("Error waiting for workers: %s", e)
+
+                    if i == maxTries - 1:
+                        raise
+
+                    _logger.info("Waiting for client (%d/%d)", i, maxTries)
+                    sleep(seconds)
+                    continue
+
+            if len(client.ids) == 0:
+                _logger.info("Waiting for engines (%d/%d)", i, maxTries)
+                sleep(seconds)
+
+        if not client or len(client) == 0:
+            raise IpyparallelError('Failed to connect to engines')
+
+    def submit(self, context, argDict, after=None):
+        from . import worker
+
+        self.argDict = argDict
+
+        if self.trialsPerTask > 1:
+            self.buffered.append((context, after))      # submitted by flush()
+            return context
+
+        view = self.view
+        if after is None:
+            ar = view.map_async(worker.runTrial, [context], [argDict])
+        else:
+            # Create a dependency on the baseline that we've already submitted
+            with view.temp_flags(after=after):
+                ar = view.map_async(worker.runTrial, [context], [argDict])
+
+        self.watchTasks([ar], [[context]])
+        return ar
+
+    def submitChunk(self, contexts, after=None):
+        '''
+        Submit a task to run the given trials sequentially.
+        '''
+        from . import worker
+
+        view = self.view
+        if after is None:
+            ar = view.map_async(worker.runTrials, [contexts], [self.argDict])
+        else:
+            with view.temp_flags(after=after):
+                ar = view.map_async(worker.runTrials, [contexts], [self.argDict])
+
+        self.watchTasks([ar], [contexts])
+        return ar
+
+    def flush(self):
+        '''
+        Submit buffered trials in chunks of IPP.TrialsPerTask. Trials without
+        dependencies (baselines) are submitted first. Dependent (policy) trials
+        are grouped by the chunk containing their baseline trial, so each policy
+        chunk waits only for the chunk holding its own baseline trials.
+        '''
+        from collections import OrderedDict
+
+        size = self.trialsPerTask
+        chunkARs = {}                   # baseline chunk AsyncResults keyed by runId
+        dependents = OrderedDict()      # lists of Contexts keyed by the baseline chunk they depend on
+
+        independent = [context for context, after in self.buffered if after is None]
+        for contexts in _chunks(independent, size):
+            ar = self.submitChunk(contexts)
+            chunkARs.update({context.runId: ar for context in contexts})
+
+        for context, after in self.buffered:
+            if after is not None:
+                dependents.setdefault(chunkARs[after.runId], []).append(context)
+
+        for after, contexts in dependents.items():
+            for chunk in _chunks(contexts, size):
+                self.submitChunk(chunk, after=after)
+
+        self.buffered = []
+
+    def pending(self):
+        return sum(map(len, self.contexts.values())) + len(self.buffered)
+
+    def queueTotals(self):
+        """
+        Return totals for queue status across all engines
+        """
+        qstatus = self.client.queue_status()
+        unassigned = qstatus.pop(u'unassigned')
+        totals = dict(queue=0, completed=0, tasks=0, unassigned=unassigned)
+
+        _logger.debug("queueTotals: %d statuses returned", len(qstatus))
+
+        for eid, qs in iteritems(qstatus):
+            for key, count in iteritems(qs):
+                totals[key] += count
+
+        return totals
+
+    def idleEngineIds(self):
+        '''
+        Return the ids of engines with no tasks, or an empty set if
+        some tasks are not yet assigned to engines.
+        '''
+        qstatus = self.client.queue_status()
+
+        if qstatus.pop(u'unassigned'):
+            # some tasks are not yet assigned to engines
+            return set()
+
+        if len(qstatus) == 0:
+            _logger.info("No engines are running")
+
+        return set([id for id, stats in iteritems(qstatus) if stats[u'tasks'] + stats[u'queue'] == 0])
+
+    def shutdownIdleEngines(self, maxCount=None):
+        # Shutdown idle engines if there are no unassigned tasks
+        idleEngines = self.idleEngineIds()
+
+        if idleEngines:
+            newlyIdle = idleEngines.difference(self.idleEngines)
+            if maxCount is not None:
+                newlyIdle = set(sorted(newlyIdle)[:maxCount])
+
+            if not newlyIdle:
+                return
+
+            self.idleEngines = self.idleEngines.union(newlyIdle)
+
+            _logger.debug('Idle engines: %s', newlyIdle)
+            _logger.info('Shutting down %d idle engines', len(newlyIdle))
+            self.client.shutdown(targets=newlyIdle, block=False)
+
+    def checkEngines(self):
+        import ipyparallel as ipp
+        from .slurm import Slurm
+
+        engineSleep = 10
+        client = self.client
+
+        while True:
+            try:
+                if len(client) > 0:
+                    return True
+
+                slurm = Slurm()
+                pending = slurm.jobsInState('pending', jobName='mcs-engine')    # pending engines, not tasks...
+
+                if len(pending):
+                    _logger.info('No engines registered; %d workers PENDING', len(pending))
+                    sleep(engineSleep)
+                    continue
+
+                else:
+                    _logger.info("No engines running or pending. Shutting down hub.")
+                    client.shutdown(targets='all',  hub=True, block=False) #, block=True) # stopped working on PIC
+                    self.hubStopped = True
+                    return False
+
+            except ipp.NoEnginesRegistered:
+                sleep(engineSleep)  # handled in loop
+
+    def resubmit(self, ar, context, reason):
+        _logger.info('Resubmitting task (%s) %s', reason, context)
+        newAR = self.client.resubmit(ar.msg_ids)
+        self.master.setRunStatus(context, RUN_QUEUED)
+        self.watchTasks([newAR], [[context]])
+
+    def resubmitTrials(self, contexts, reason):
+        '''
+        Resubmit some trials of a chunk as a new task.
+        '''
+        _logger.info('Resubmitting %d trials (%s)', len(contexts), reason)
+        self.master.setRunStatuses([(context, RUN_QUEUED) for context in contexts])
+        self.submitChunk(contexts)
+
+    def watchTasks(self, ars, contexts):
+        """
+        Arrange to be notified when the given tasks complete. Callbacks run on the
+        client's I/O thread, so they just queue the AsyncResult for the main loop.
+        Results of resubmitted tasks (AsyncHubResults) are delivered to the hub rather
+        than to this client, so these can't use callbacks and are polled instead.
+
+        :param ars: (list of AsyncResult) the tasks to watch
+        :param contexts: (list of lists of Context) the runs performed by each task
+        :return: none
+        """
+        import ipyparallel as ipp
+
+        for ar, context in zip(ars, contexts):
+            self.contexts[ar] = context
+            self.unstartedTasks.add(ar)
+
+            if isinstance(ar, ipp.AsyncHubResult):
+                self.hubTasks.add(ar)
+            else:
+                ar.add_done_callback(self.completedTasks.put)
+
+    def waitForCompletions(self, timeout):
+        """
+        Wait up to `timeout` seconds for at least one task to complete, and return
+        the set of all tasks that have completed since the last call.
+        """
+        done = set()
+
+        for ar in list(self.hubTasks):
+            if ar.ready():          # polls the hub
+                self.hubTasks.remove(ar)
+                done.add(ar)
+
+        try:
+            if not done:
+                done.add(self.completedTasks.get(timeout=timeout))
+
+            while True:
+                done.add(self.completedTasks.get_nowait())
+
+        except queue.Empty:
+            pass
+
+        return done
+
+    def checkStatusUpdates(self):
+        """
+        Record the "running" status published by workers when they start a trial.
+        Only tasks that haven't yet reported being started are checked, except that
+        tasks running several trials are checked until they complete.
+        """
+        for ar in list(self.unstartedTasks):
+            data = ar.data[0] if ar.data else None
+            context = data.get('context') if data else None
+            if context:
+                self.master.setRunStatus(context)
+                if len(self.contexts.get(ar, ())) <= 1:
+                    self.unstartedTasks.discard(ar)
+
+    def taskEngineId(self, ar):
+        '''
+        Return the id of the engine running (or that ran) task `ar`, or None if
+        it isn't known yet. The engine_id metadata of the AsyncMapResults returned
+        by map_async is a list holding None until the task completes, so for
+        running tasks the id published by the worker (see Worker.setStatus) is used.
+        '''
+        engineId = ar.engine_id
+        if isinstance(engineId, list):
+            engineId = engineId[0] if engineId else None
+
+        if engineId is None:
+            data = ar.data[0] if ar.data else None
+            engineId = data.get('engine_id') if data else None
+
+        return engineId
+
+    def getResults(self, ars):
+        """
+        Get the WorkerResults of the given completed tasks, resubmitting tasks
+        whose engine was terminated or whose run was killed.
+
+        :param ars: (iterable of AsyncResult) completed tasks
+        :return: (list of WorkerResult)
+        """
+        client = self.client
+        results = []
+        msgIds = []
+
+        for ar in ars:
+            msgIds += ar.msg_ids
+            try:
+                chunk = ar.get(0)[0]    # already complete, so this doesn't block
+                workerResults = chunk if isinstance(chunk, list) else [chunk]
+                terminated = []
+                killed = []
+
+                for workerResult in workerResults:
+                    context = workerResult.context
+                    status = context.status
+
+                    if status == ENG_TERMINATE:
+                        terminated.append(context)
+
+                    elif status == RUN_KILLED:
+                        killed.append(context)
+
+                    else:
+                        results.append(workerResult)
+
+                engineId = self.taskEngineId(ar)
+                if terminated and engineId is not None:
+                    _logger.info("Terminating engine %s: insufficient time remaining", engineId)
+                    client.shutdown(engineId)
+                    sleep(2)
+
+                for contexts, reason in ((terminated, "engine terminated"), (killed, "run killed")):
+                    if not contexts:
+                        continue
+
+                    if isinstance(chunk, list):
+                        self.resubmitTrials(contexts, reason)
+                    else:
+                        self.resubmit(ar, contexts[0], reason)
+
+            except Exception as e:
+                # Raised if an engine dies, e.g., walltime expired.
+                _logger.warning('getResults: %s', e)
+
+        if msgIds:
+            try:
+                client.purge_results(jobs=msgIds)
+            except Exception as e:
+                _logger.debug('getResults: failed to purge results: %s', e)
+
+        return results
+
+    def wait(self, timeout):
+        # The hub is queried for worker status updates and queue status at most
+        # every IPP.StatusPollSecs and IPP.QueueStatusSecs, respectively.
+        if not self.checkEngines():
+            self.contexts = {}      # nothing more will complete
+            return []
+
+        done = self.waitForCompletions(timeout)
+        now = time()
+
+        if now - self.lastStatusPoll >= self.statusSecs:
+            self.checkStatusUpdates()
+            self.lastStatusPoll = now
+
+        results = []
+        if done:
+            _logger.debug('%d completed tasks', len(done))
+            for ar in done:
+                self.contexts.pop(ar, None)
+                self.unstartedTasks.discard(ar)
+
+            results = self.getResults(done)
+            if not results:
+                _logger.warning('%d completed tasks with no results (engine died?)', len(done))
+
+        if now - self.lastQueuePoll >= self.queueSecs:
+            if not self.args.dontShutdownWhenIdle:
+                self.shutdownIdleEngines()
+
+            totals = self.queueTotals()
+            _logger.info("%d clients, %d client.ids, %d tasks", len(self.client), len(self.client.ids), totals['tasks'])
+            _logger.info("Queue totals: %s", totals)
+            self.lastQueuePoll = now
+
+        return results
+
+    def cancel(self):
+        cancelled = [context for contexts in self.contexts.values() for context in contexts]
+        cancelled += [context for context, after in self.buffered]
+        msgIds = [msgId for ar in self.contexts for msgId in ar.msg_ids]
+
+        if msgIds:
+            try:
+                self.client.abort(jobs=msgIds, block=False)
+            except Exception as e:
+                _logger.warning('Failed to abort %d tasks: %s', len(msgIds), e)
+
+        self.contexts = {}
+        self.buffered = []
+        self.unstartedTasks.clear()
+        self.hubTasks.clear()
+        return cancelled
+
+    def cancelQueued(self):
+        # Tasks for which no worker has published a status haven't started.
+        queued = [ar for ar in self.unstartedTasks if not ar.data]
+        cancelled = [context for context, after in self.buffered]
+        msgIds = []
+
+        for ar in queued:
+            cancelled += self.contexts.pop(ar, [])
+            msgIds += ar.msg_ids
+            self.unstartedTasks.discard(ar)
+            self.hubTasks.discard(ar)
+
+        if msgIds:
+            try:
+                self.client.abort(jobs=msgIds, block=False)
+            except Exception as e:
+                _logger.warning('Failed to abort %d tasks: %s', len(msgIds), e)
+
+        self.buffered = []
+        return cancelled
+
+    def workerCount(self):
+        return len(self.client.ids) if self.client else None
+
+    def kill(self, context):
+        """
+        Shut down the engine running `context`, since a running task can't be
+        aborted. Other trials of the same task are resubmitted. Nothing is done
+        unless some other engine is idle, or if the engine running the trial
+        isn't known yet.
+        """
+        from . import worker
+
+        for ar, contexts in list(self.contexts.items()):
+            if context.runId not in [ctx.runId for ctx in contexts]:
+                continue
+
+            engineId = self.taskEngineId(ar)
+            if engineId is None:
+                _logger.debug("Not killing straggler trial %d of %s: its engine is unknown",
+                              context.trialNum, context.scenario)
+                return None
+
+            if not (self.idleEngineIds() - self.idleEngines - {engineId}):
+                _logger.debug("Not killing straggler trial %d of %s: no engines are idle",
+                              context.trialNum, context.scenario)
+                return None
+
+            _logger.info("Terminating engine %s running straggler trial %d of %s",
+                         engineId, context.trialNum, context.scenario)
+            del self.contexts[ar]
+            self.unstartedTasks.discard(ar)
+            self.client.shutdown(engineId)
+
+            others = [ctx for ctx in contexts if ctx.runId != context.runId]
+            if others:
+                self.resubmitTrials(others, "straggler killed")
+
+            context.setVars(status=RUN_UNSOLVED)
+            return [worker.WorkerResult(context, STRAGGLER_KILLED)]
+
+        return None
+
+    def scale(self, workers):
+        from .master import startEngines, templatePath
+
+        engines = len(self.client.ids)
+        if workers > engines:
+            template = templatePath(getParam('IPP.Scheduler'), self.args.profile, self.args.clusterId, 'engine')
+            startEngines(workers - engines, template)
+
+        elif workers < engines:
+            self.shutdownIdleEngines(maxCount=engines - workers)
+
+    def shutdown(self):
+        if self.client and not self.hubStopped:
+            _logger.info("Shutting down hub")
+            self.client.shutdown(hub=True, block=True)
+            self.hubStopped = True
+
+
+#
+# SLURM job arrays
+#
+_slurmArrayTemplate = """#!/bin/sh
+#SBATCH --account={account}
+#SBATCH --partition={queue}
+#SBATCH --job-name={jobName}
+#SBATCH --array={array}
+#SBATCH --ntasks=1
+#SBATCH --time={timelimit}
+#SBATCH --output={logPattern}
+#{otherArgs}
+exec {python} -m pygcam.mcs.backends "{taskFile}" $SLURM_ARRAY_TASK_ID
+"""
+
+def arrayResultFile(taskFile, trialNum):
+    '''
+    Return the pathname of the file holding the WorkerResult of `trialNum`
+    for the SLURM job array described by `taskFile`.
+    '''
+    return '%s-%d.result' % (os.path.splitext(taskFile)[0], trialNum)
+
+
+class SlurmArrayBackend(ExecutionBackend):
+    '''
+    Submits the trials of each scenario as a SLURM job array, indexed by trial
+    number, without running an ipyparallel controller or engines. Policy arrays
+    depend on their baseline array with "--dependency=aftercorr", so each policy
+    trial starts as soon as the same baseline trial succeeds. Array tasks save
+    their WorkerResults to files, for which the master polls.
+    '''
+    def __init__(self, master):
+        super(SlurmArrayBackend, self).__init__(master)
+        self.batches = {}       # lists of (context, argDict) keyed by (scenario, baseline array key)
+        self.tasks = {}         # (context, resultFile, jobId) of incomplete tasks keyed by runId
+        self.jobIds = []        # ids of submitted array jobs
+        self.missing = set()    # runIds not found in the queue at the last check
+        self.taskDir = None
+
+        self.pollSecs  = getParamAsFloat('SLURM.ArrayPollSecs')
+        self.queueSecs = getParamAsFloat('IPP.QueueStatusSecs')
+        self.lastQueuePoll = time()
+
+    def submit(self, context, argDict, after=None):
+        # Trials are batched by scenario; those depending on a baseline trial are
+        # batched separately from those whose baseline isn't being run.
+        key = (context.scenario, None if after is None else after[0])
+        self.batches.setdefault(key, []).append((context, dict(argDict, standalone=True)))
+        return key, context.trialNum
+
+    def pending(self):
+        return len(self.tasks) + sum(map(len, self.batches.values()))
+
+    def sbatch(self, scriptFile, options):
+        '''
+        Submit a batch script and return the job id.
+        '''
+        command = ['sbatch', '--parsable'] + options + [scriptFile]
+        _logger.info(' '.join(command))
+        output = subprocess.check_output(command)
+        if not isinstance(output, str):
+            output = output.decode('utf-8')
+
+        return output.strip().split(';')[0]
+
+    def makeTaskDir(self, simId):
+        import tempfile
+        from .context import getSimDir
+
+        if self.taskDir is None:
+            simDir = getSimDir(simId, create=True)
+            self.taskDir = tempfile.mkdtemp(prefix='slurm-', dir=simDir)
+
+        return self.taskDir
+
+    def submitArray(self, name, batch, dependency=None):
+        from six.moves import cPickle as pickle
+        from .util import createTrialString
+
+        context = batch[0][0]
+        taskDir = self.makeTaskDir(context.simId)
+        taskFile = os.path.join(taskDir, name + '.task')
+
+        contexts = {ctx.trialNum: ctx for ctx, argDict in batch}
+        with open(taskFile, 'wb') as f:
+            pickle.dump({'argDict': batch[0][1], 'contexts': contexts}, f, protocol=2)
+
+        array = createTrialString(sorted(contexts))
+        maxRunning = getParamAsInt('SLURM.ArrayMaxRunning')
+        if maxRunning:
+            array += '%%%d' % maxRunning
+
+        minutes = int(self.args.minutesPerRun)
+        values = {'account'    : getParam('IPP.Account'),
+                  'queue'      : self.args.queue,
+                  'jobName'    : 'mcs-%s' % context.scenario,
+                  'array'      : array,
+                  'timelimit'  : "%02d:%02d:00" % (minutes // 60, minutes % 60),
+                  'logPattern' : os.path.join(taskDir, name + '-%a.log'),
+                  'otherArgs'  : getParam('IPP.OtherEngineArgs'),
+                  'python'     : sys.executable,
+                  'taskFile'   : taskFile}
+
+        scriptFile = os.path.join(taskDir, name + '.sh')
+        with open(scriptFile, 'w') as f:
+            f.write(_slurmArrayTemplate.format(**values))
+
+        options = ['--dependency=aftercorr:%s' % dependency, '--kill-on-invalid-dep=yes'] if dependency else []
+        jobId = self.sbatch(scriptFile, options)
+
+        _logger.info('Submitted %d trials of %s as job array %s', len(contexts), context.scenario, jobId)
+        self.jobIds.append(jobId)
+
+        for ctx in contexts.values():
+            self.tasks[ctx.runId] = (ctx, arrayResultFile(taskFile, ctx.trialNum), jobId)
+
+        return jobId
+
+    def flush(self):
+        # Submit baseline arrays first, since policy arrays refer to their job ids
+        arrayJobs = {}
+        keys = sorted(self.batches, key=lambda key: key[1] is not None)
+
+        for i, key in enumerate(keys):
+            scenario, baselineKey = key
+            dependency = arrayJobs[baselineKey] if baselineKey else None
+            arrayJobs[key] = self.submitArray('a%03d' % i, self.batches[key], dependency=dependency)
+
+        self.batches = {}
+
+    def queuedTasks(self):
+        '''
+        Return a dict of SLURM states (e.g., "PD", "R") keyed by runId for the
+        tasks of our arrays that are still in the queue.
+        '''
+        command = ['squeue', '-h', '-r', '-o', '%i|%t', '-j', ','.join(self.jobIds)]
+        try:
+            output = subprocess.check_output(command)
+        except subprocess.CalledProcessError as e:
+            _logger.warning('squeue failed: %s', e)
+            return None
+
+        if not isinstance(output, str):
+            output = output.decode('utf-8')
+
+        runIds = {(jobId, ctx.trialNum): runId for runId, (ctx, resultFile, jobId) in iteritems(self.tasks)}
+        states = {}
+        for line in output.splitlines():
+            taskId, state = line.strip().split('|')
+            jobId, _, index = taskId.partition('_')
+            runId = runIds.get((jobId, int(index))) if index.isdigit() else None
+            if runId is not None:
+                states[runId] = state
+
+        return states
+
+    def checkQueue(self):
+        '''
+        Record the runs that have started, and return results for the runs that have
+        left the queue without saving a result (e.g., the task was killed or timed out,
+        or its baseline failed) on two consecutive checks.
+        '''
+        from . import worker
+
+        states = self.queuedTasks()
+        if states is None:
+            return []
+
+        results = []
+        for runId, (context, resultFile, jobId) in list(self.tasks.items()):
+            state = states.get(runId)
+            if state == 'R':
+                self.master.setRunStatus(context, status=RUN_RUNNING)
+
+            if state is not None or os.path.exists(resultFile):
+                self.missing.discard(runId)
+
+            elif runId in self.missing:
+                del self.tasks[runId]
+                self.missing.discard(runId)
+                context.setVars(status=RUN_ABORTED)
+                errorMsg = BASELINE_FAILED if context.baseline else 'array task ended without saving a result'
+                results.append(worker.WorkerResult(context, errorMsg))
+
+            else:
+                self.missing.add(runId)   # the result file may not be visible yet
+
+        return results
+
+    def collectResults(self):
+        from six.moves import cPickle as pickle
+
+        results = []
+        for runId, (context, resultFile, jobId) in list(self.tasks.items()):
+            if os.path.exists(resultFile):
+                with open(resultFile, 'rb') as f:
+                    results.append(pickle.load(f))
+                del self.tasks[runId]
+
+        return results
+
+    def wait(self, timeout):
+        deadline = time() + timeout
+
+        while True:
+            results = self.collectResults()
+
+            now = time()
+            if now - self.lastQueuePoll >= self.queueSecs:
+                results += self.checkQueue()
+                self.lastQueuePoll = now
+
+            if results or not self.tasks or now >= deadline:
+                return results
+
+            sleep(min(self.pollSecs, max(0, deadline - now)))
+
+    def cancel(self):
+        cancelled = [context for context, resultFile, jobId in self.tasks.values()]
+        if self.jobIds:
+            subprocess.call(['scancel'] + self.jobIds)
+
+        self.tasks = {}
+        return cancelled
+
+    def cancelQueued(self):
+        states = self.queuedTasks()
+        if states is None:
+            return []
+
+        cancelled = []
+        taskIds = []
+        for runId, state in iteritems(states):
+            if state == 'PD':
+                context, resultFile, jobId = self.tasks.pop(runId)
+                self.missing.discard(runId)
+                taskIds.append('%s_%d' % (jobId, context.trialNum))
+                cancelled.append(context)
+
+        if taskIds:
+            subprocess.call(['scancel'] + taskIds)
+
+        return cancelled
+
+    def workerCount(self):
+        return getParamAsInt('SLURM.ArrayMaxRunning') or None
+
+    def kill(self, context):
+        from . import worker
+
+        task = self.tasks.pop(context.runId, None)
+        if task is None:
+            return None
+
+        jobId = task[2]
+        subprocess.call(['scancel', '%s_%d' % (jobId, context.trialNum)])
+        self.missing.discard(context.runId)
+        context.setVars(status=RUN_UNSOLVED)
+        return [worker.WorkerResult(context, STRAGGLER_KILLED)]
+
+    def scale(self, workers):
+        for jobId in self.jobIds:
+            subprocess.call(['scontrol', 'update', 'JobId=%s' % jobId, 'ArrayTaskThrottle=%d' % workers])
+
+
+_backendClasses = {'inprocess'   : InProcessBackend,
+                   'local'       : LocalPoolBackend,
+                   'ipyparallel' : IpyparallelBackend,
+                   'slurm'       : SlurmArrayBackend}
+
+
+if __name__ == '__main__':
+    # Entry point for SLURM array tasks: python -m pygcam.mcs.backends taskFile trialNum
+    from .worker import runArrayTask
+
+    sys.exit(runArrayTask(sys.argv[1], int(sys.argv[2])))
@@ -27,16 +27,17 @@ def getDiscreteDistFromData(data, bins=30):
     bins: number of bins to put data into. Default is 30.
     """
     import numpy as np
-    from math import ceil, floor
-    from six import iteritems
+    from math import ceil
     from ..error import DistributionSpecError
 
     if bins <= 0 or int(bins) != bins:
         raise DistributionSpecError('Number of bins must be a positive integer.')
 
-    dataArray = np.zeros(bins)
-    minData = min(data)
-    dataRange = max(data) - minData
+    values = np.fromiter(data.keys(), dtype=float, count=len(data))
+    counts = np.fromiter(data.values(), dtype=float, count=len(data))
+
+    minData = values.min()
+    dataRange = values.max() - minData
     binSize = int(ceil(dataRange / bins))
 
     # if dataRange is zero, only one value was given. Turns out this edge case isn't well handled by the rest of the code
@@ -47,13 +48,13 @@ def getDiscreteDistFromData(data, bins=30):
     # increment binsize to avoid fencemaking error
     if binSize * bins == dataRange:
         binSize += 1
-    size = 0
-    for key, cnt in iteritems(data):
-        dataArray[int(floor((key - minData) / binSize))] += cnt  # divide by size so results sum to 1
-        size += cnt
 
+    binNums = np.floor((values - minData) / binSize).astype(int)
+    dataArray = np.bincount(binNums, weights=counts, minlength=bins)
+
+    size = counts.sum()
     if size:
-        dataArray /= float(size)
+        dataArray /= size   # divide by size so results sum to 1
 
     # half bin offset of min because we're sampling from the middle of each bucket, not from its bottom
     return {'data': dataArray, 'min': minData + float(binSize) / 2, 'binSize': binSize}
@@ -246,8 +247,8 @@ class DiscreteDist(object):
         """
         Takes in a list of (value, probability) tuples to initiate.
         Tolerance allows for distributions with a sum of probabilities close but
-        not equal to 1 due to rounding errors. precision determines how many entries
-        are in the fast ppf list; ppf values will be accurate within 1/precision
+        not equal to 1 due to rounding errors. The ppf is computed exactly from
+        the cumulative probabilities; precision is retained for compatibility.
         """
         import numpy as np
 
@@ -258,18 +259,11 @@ class DiscreteDist(object):
         self.probList = sorted(probList)
         self.values = [x[0] for x in self.probList]
         self.probs = [x[1] / totalProb for x in self.probList]
-
-        # Initialize the lookup table for fast ppf
         self.precision = precision
-        self.fastPPF = np.zeros(precision)
 
-        index = 0
-        cumProb = 0
-        for i in range(precision):
-            if i / float(precision) > self.probs[index] + cumProb:
-                cumProb += self.probs[index]
-                index += 1
-            self.fastPPF[i] = self.values[index]
+        # Lookup arrays for ppf and cdf
+        self.valueArray = np.array(self.values, dtype=float)
+        self.cumProbs = np.cumsum(self.probs)
 
     def __eq__(self, comp):
         return self.values == comp.values and self.probs == comp.probs and self.precision == comp.precision
@@ -284,13 +278,22 @@ class DiscreteDist(object):
         The percentiles parameter must be 'array-like' to match (some) of the
         behavior of scipy.stats.rv_continuous.ppf
         """
-        from functools import reduce
+        import numpy as np
 
-        if not reduce(lambda x, y: x and 0 < y < 1, percentiles):
+        percentiles = np.asarray(percentiles, dtype=float)
+        if np.any((percentiles <= 0) | (percentiles >= 1)):
             raise DistributionSpecError('Percentiles must all be > 0 and < 1')
 
-        return [self.fastPPF[int(x * self.precision)] for x in percentiles]
-        #return map(lambda x: self.fastPPF[int(x * self.precision)], percentiles)
+        # The i'th value is returned for percentiles in [cumProbs[i-1], cumProbs[i])
+        indices = np.searchsorted(self.cumProbs, percentiles, side='right')
+        return self.valueArray[np.minimum(indices, len(self.valueArray) - 1)]
+
+    def cdf(self, values):
+        """Returns the cumulative probability of each of the given values."""
+        import numpy as np
+
+        indices = np.searchsorted(self.valueArray, values, side='right')
+        return np.concatenate([[0.0], self.cumProbs])[indices]
 
     def rvs(self, n=1):
         """Returns one or more random values, according to the RV's distribution."""
@@ -16,6 +16,7 @@ def genSALibData(trials, method, paramFileObj, args):
     from ..error import PygcamMcsUserError
     from ..sensitivity import DFLT_PROBLEM_FILE, Sobol, FAST, Morris # , MonteCarlo
     from pygcam.utils import ensureExtension, removeTreeSafely, mkdirs
+    from ..util import writeTrialDataMatrix
 
     SupportedDistros = ['Uniform', 'LogUniform', 'Triangle', 'Linked']
 
@@ -84,27 +85,48 @@ def genSALibData(trials, method, paramFileObj, args):
 
     # saves to input.csv in file package
     sa.sample(trials=trials, calc_second_order=args.calcSecondOrder)
+    writeTrialDataMatrix(sa.inputsFile, sa.inputsDF.set_index('trialNum'))
     return sa.inputsDF
 
 
-def genTrialData(simId, trials, paramFileObj, args):
+def genTrialData(simId, trials, paramFileObj, args, start=0):
     """
     Generate the given number of trials for the given simId, using the objects created
-    by parsing parameters.xml. Return a DataFrame of values.
+    by parsing parameters.xml. Return a DataFrame of values. If `start` is > 0, the
+    simulation's first `start` trials already exist, and the new trials are generated
+    so that, combined with these, they remain a Latin Hypercube sample or, if they
+    were generated by a quasi-random method, continue the same sequence.
     """
+    import multiprocessing as mp
+    import pandas as pd
     from pandas import DataFrame
+    from pygcam.config import getParamAsInt
     from ..distro import linkedDistro
-    from ..LHS import lhs, lhsAmend
+    from ..error import PygcamMcsUserError
+    from ..LHS import lhs, lhsAmend, newSeed
+    from ..QMC import QMC_METHODS, qmc, readSamplerFile, writeSamplerFile, removeSamplerFile
     from ..XMLParameterFile import XMLRandomVar, XMLCorrelation
-    from ..util import writeTrialDataFile
+    from ..util import readTrialDataFile, writeTrialDataFile
 
     rvList = XMLRandomVar.getInstances()
 
     linked = [obj for obj in rvList if obj.param.dataSrc.isLinked()]
 
+    # Values are reproducible given the seed, regardless of the number of processes
+    seed = args.seed if args.seed is not None else newSeed()
+    processes = args.processes if args.processes is not None else getParamAsInt('MCS.GensimProcesses')
+    processes = processes or mp.cpu_count()
+
     method = args.method
-    if method == 'montecarlo':
-        # legacy Monte Carlo method. Supporting numerous distributions and correlations.
+    sampler = readSamplerFile(simId) if start else None
+    if sampler:
+        method = sampler['method']      # continue the sequence used to generate the sim
+
+    elif not start and method not in QMC_METHODS:
+        removeSamplerFile(simId)        # left by a previous generation of this simId
+
+    if method == 'montecarlo' or method in QMC_METHODS:
+        # legacy Monte Carlo method or quasi-random sequences. Supporting numerous distributions and correlations.
 
         corrMatrix = XMLCorrelation.corrMatrix()
 
@@ -114,14 +136,42 @@ def genTrialData(simId, trials, paramFileObj, args):
         # TBD: on integration with pygcam. (getName() will fail on XMLVariable instances)
 
         paramNames = [obj.getParameter().getName() for obj in rvList]
-        trialData = lhs(rvList, trials, corrMat=corrMatrix, columns=paramNames, skip=linked)
-        writeTrialDataFile(simId, trialData)
+        existing = readTrialDataFile(simId)[paramNames] if start else None
+
+        if method == 'montecarlo':
+            trialData = lhs(rvList, trials, corrMat=corrMatrix, columns=paramNames, skip=linked,
+                            existing=None if existing is None else existing.values,
+                            seed=seed, start=start, processes=processes)
+        else:
+            if start and not sampler:
+                raise PygcamMcsUserError('Simulation %d was not generated with method "%s"' % (simId, method))
+
+            if sampler and sampler['parameters'] != paramNames:
+                raise PygcamMcsUserError('Simulation %d was generated with different parameters; '
+                                         'it cannot be extended with the same sequence' % simId)
+
+            seed = sampler['seed'] if sampler else seed
+            trialData = qmc(rvList, trials, method, seed, corrMat=corrMatrix, columns=paramNames,
+                            skip=linked, start=start, processes=processes)
+            writeSamplerFile(simId, method, seed, paramNames)
+
+        if start:
+            # Save the existing trials' data with the new trials'
+            trialData.index += start
+            writeTrialDataFile(simId, pd.concat([existing, trialData]))
+            trialData = trialData.reset_index(drop=True)
+        else:
+            writeTrialDataFile(simId, trialData)
+
+    elif start:
+        raise PygcamMcsUserError('Only simulations generated with methods "montecarlo", "sobolseq" or "halton" can be extended')
+
     else:
         # SALib methods
         trialData = genSALibData(trials, method, paramFileObj, args)
 
     linkedDistro.storeTrialData(trialData)  # so its ppf() can access linked values
-    lhsAmend(trialData, linked, trials)
+    lhsAmend(trialData, linked, trials, seed=seed, start=start)
 
     df = DataFrame(data=trialData)
     return df
@@ -133,6 +183,7 @@ def saveTrialData(df, simId, start=0):
     """
     from ..Database import getDatabase
     from ..XMLParameterFile import XMLRandomVar
+    from ..columnStore import getColumnStore
     from six.moves import xrange
 
     trials = df.shape[0]
@@ -140,29 +191,37 @@ def saveTrialData(df, simId, start=0):
     # Delete all Trial entries for this simId and this range of trialNums
     db = getDatabase()
 
-    paramValues = []
+    # Look up the column name, parameter id, and varNum once per RV rather than once per value
+    instances = XMLRandomVar.getInstances()
+    pnames   = [var.getParameter().getName() for var in instances]
+    paramIds = [db.getParamId(pname) for pname in pnames]
+    varNums  = [var.getVarNum() for var in instances]
 
-    for trial in xrange(trials):
-        trialNum = trial + start
+    # Extract the trials x RVs matrix once, in RV order
+    matrix = df[pnames].values
 
-        # Save all RV values to the database
-        instances = XMLRandomVar.getInstances()
-        for var in instances:
-            varNum = var.getVarNum()
-            param = var.getParameter()
-            pname = param.getName()
-            value = df[pname][trial]
-            paramId = db.getParamId(pname)
-            paramValues.append((trialNum, paramId, value, varNum))
+    def paramValues():
+        """
+        "Melt" the matrix into (trialNum, paramId, value, varNum) tuples, converting
+        a row at a time to native python types for the database driver.
+        """
+        for trial in xrange(trials):
+            trialNum = trial + start
+            for paramId, value, varNum in zip(paramIds, matrix[trial].tolist(), varNums):
+                yield (trialNum, paramId, value, varNum)
 
-    # Write the tuples (simId, trialNum, paramId, value) to the database
-    db.saveParameterValues(simId, paramValues)
+    # Write the tuples (trialNum, paramId, value, varNum) to the database
+    db.saveParameterValues(simId, paramValues(), count=trials * len(instances))
 
     # SALib methods may not create exactly the number of trials requested
     # so we update the database to set the record straight.
-    db.updateSimTrials(simId, trials)
+    db.updateSimTrials(simId, start + trials)
     _logger.info('Generated %d trials for simId %d', trials, simId)
 
+    store = getColumnStore(simId, create=True)
+    if store:
+        store.saveParameters(df[pnames], start=start)
+
 
 def runStaticSetup(runWorkspace, project, groupName):
     """
@@ -283,6 +342,61 @@ def genSimulation(simId, trials, paramPath, args):
     simParamFile = getSimParameterFile(simId)
     filecopy(paramPath, simParamFile)
 
+def extendSimulation(simId, trials, paramPath, args):
+    '''
+    Add `trials` trials to existing simulation `simId`, numbered after the
+    existing trials, which are not modified. By default, the parameters are
+    read from the copy of the parameter file saved when the simulation was
+    generated, so the new trials sample the same distributions.
+    '''
+    from ..context import Context
+    from ..Database import getDatabase
+    from ..error import PygcamMcsUserError
+    from ..XMLParameterFile import XMLParameterFile
+    from ..LHS import newSeed
+    from ..util import getSimParameterFile, createTrialString, getTrialDataPath, TRIAL_DATA_FILE
+    from pygcam.project import Project
+    from pygcam.xmlSetup import ScenarioSetup
+
+    db = getDatabase()
+    existing = db.getTrialCount(simId)
+    if not existing:
+        raise PygcamMcsUserError("Simulation %s has no trials to extend" % simId)
+
+    # Workers read the trial data of sims generated by SALib methods from data.sa/inputs.csv
+    dataFile = getTrialDataPath(simId)
+    if os.path.basename(dataFile) != TRIAL_DATA_FILE:
+        raise PygcamMcsUserError("Simulation %s was generated by a SALib method (see %s) and can't be extended"
+                                 % (simId, dataFile))
+
+    paramPath = paramPath or getSimParameterFile(simId)
+
+    # The new trials' random streams are spawned from the sim's seed (see LHS.getSeedSequence)
+    args.seed = db.getSimSeed(simId)
+    if args.seed is None:
+        args.seed = newSeed()
+        db.setSimSeed(simId, args.seed)
+
+    projectName = getParam('GCAM.ProjectName')
+    project = Project.readProjectFile(projectName, groupName=args.groupName)
+    args.groupName = groupName = args.groupName or project.scenarioSetup.defaultGroup
+
+    scenarioSetup = ScenarioSetup.parse(getParam('GCAM.ScenarioSetupFile'))
+    scenarioNames = scenarioSetup.scenariosInGroup(groupName)
+
+    # The sim's config files were written by gensim, so they are used as is
+    paramFileObj = XMLParameterFile(paramPath)
+    context = Context(projectName=args.projectName, simId=simId, groupName=groupName)
+    paramFileObj.loadInputFiles(context, scenarioNames, writeConfigFiles=False)
+    paramFileObj.generateRandomVars()
+
+    _logger.info("Extending simId %d from %d to %d trials", simId, existing, existing + trials)
+    df = genTrialData(simId, trials, paramFileObj, args, start=existing)
+    saveTrialData(df, simId, start=existing)
+
+    _logger.info('Use "runsim -s %d --redo missing" or "runsim -s %d --trials %s" to run the new trials',
+                 simId, simId, createTrialString(range(existing, existing + trials)))
+
 def _newsim(runWorkspace, trials):
     '''
     Setup the app and run directories for a given user app.
@@ -371,6 +485,7 @@ def driver(args, tool):
     from pygcam.utils import removeTreeSafely
     from ..Database import getDatabase
     from ..error import PygcamMcsUserError
+    from ..LHS import newSeed
     from ..util import saveDict
 
     paramFile = args.paramFile or getParam('MCS.ParametersFile')
@@ -383,6 +498,13 @@ def driver(args, tool):
     desc   = args.desc
     trials = args.trials
 
+    if args.extend:
+        if args.extend < 0 or trials >= 0 or args.delete:
+            raise PygcamMcsUserError("--extend requires a positive integer, and can't be used with --trials or --delete")
+
+        extendSimulation(simId, args.extend, args.paramFile, args)
+        return
+
     if trials < 0:
         raise PygcamMcsUserError("Trials argument is required: must be an integer >= 0")
 
@@ -409,7 +531,10 @@ def driver(args, tool):
         # The simId can be provided on command line, in which case we need
         # to delete existing parameter entries for this app and simId.
         db = getDatabase()
-        simId = db.createSim(trials, desc, simId=simId)
+        if args.seed is None:
+            args.seed = newSeed()
+
+        simId = db.createSim(trials, desc, simId=simId, seed=args.seed)
 
     genSimulation(simId, trials, paramFile, args=args)
 
@@ -436,12 +561,25 @@ class GensimCommand(McsSubcommandABC):
         parser.add_argument('-e', '--exportVars', default='',
                             help=clean_help('Export variable and distribution info in a tab-delimited file with the given name and exit.'))
 
+        parser.add_argument('-E', '--extend', type=int, default=0,
+                            help=clean_help('''Add the given number of trials to the existing simulation
+                            identified by --simId, keeping its existing trials. The new trials fill
+                            the strata left empty by the existing ones, so the combined sample remains
+                            a Latin Hypercube sample, or, for methods "sobolseq" and "halton", continue
+                            the same sequence. SALib methods cannot be extended. Use "runsim --redo
+                            missing" to run only the new trials.'''))
+
         parser.add_argument('-g', '--groupName', default='',
                             help=clean_help('''The name of a scenario group to process.'''))
 
-        parser.add_argument('-m', '--method', choices=['montecarlo', 'sobol', 'fast', 'morris'],
+        parser.add_argument('-m', '--method', choices=['montecarlo', 'sobolseq', 'halton', 'sobol', 'fast', 'morris'],
                             default='montecarlo',
-                            help=clean_help('''Use the specified method to generate trial data. Default is "montecarlo".'''))
+                            help=clean_help('''Use the specified method to generate trial data. Default is "montecarlo",
+                            i.e., Latin Hypercube sampling. Methods "sobolseq" and "halton" map scrambled Sobol'
+                            or Halton quasi-random sequences through each parameter's distribution, supporting
+                            the same distributions and correlations; these converge faster than "montecarlo",
+                            particularly when the number of trials is a power of 2. Methods "sobol", "fast",
+                            and "morris" generate trials for the corresponding SALib sensitivity analysis.'''))
 
         parser.add_argument('-o', '--outFile',
                             help=clean_help('''For methods other than "montecarlo". The path to a "package 
@@ -458,6 +596,12 @@ class GensimCommand(McsSubcommandABC):
                             (currently %s)''' % getParam('MCS.ParametersFile')))
 
         runRoot = getParam('MCS.Root')
+        parser.add_argument('-P', '--processes', type=int, default=None,
+                            help=clean_help('''The number of processes to use to compute parameter values.
+                            Default is the value of config variable MCS.GensimProcesses. If 0, one
+                            process per CPU is used. The results are the same for any number of
+                            processes.'''))
+
         parser.add_argument('-r', '--runRoot', default=None,
                             help=clean_help('''Root of the run-time directory for running user programs. Defaults to
                             value of config parameter MCS.Root (currently %s)''' % runRoot))
@@ -465,6 +609,12 @@ class GensimCommand(McsSubcommandABC):
         parser.add_argument('-S', '--calcSecondOrder', action='store_true',
                             help=clean_help('''For Sobol method only -- calculate second-order sensitivities.'''))
 
+        parser.add_argument('--seed', type=int, default=None,
+                            help=clean_help('''The seed from which the random streams used to generate
+                            trial data are spawned, to reproduce a simulation. By default, a new seed
+                            is chosen. The seed is saved in the "sim" table of the database, and
+                            --extend uses the seed saved for the simulation.'''))
+
         parser.add_argument('-s', '--simId', type=int, default=1,
                             help=clean_help('The id of the simulation. Default is 1.'))
 
@@ -10,11 +10,12 @@ _logger = getLogger(__name__)
 
 def driver(args, tool):
     from pygcam.project import Project
+    from ..backends import getBackendName
     from ..master import Master, pidFileExists, startCluster, getTrialsToRedo
     from ..Database import getDatabase
     from ..util import parseTrialString
 
-    if not (args.runLocal or args.redoListOnly):
+    if getBackendName(args) == 'ipyparallel' and not args.redoListOnly:
         # If the pid file doesn't exist, we assume the cluster is
         # not running and we run it with the given profile and
         # cluster ID, relying on the config file for other parameters.
@@ -73,6 +74,9 @@ class RunSimCommand(McsSubcommandABC):
         defaultMaxEngines = getParamAsInt('IPP.MaxEngines')
         defaultMinutes    = getParamAsFloat('IPP.MinutesPerRun')
         defaultWaitSecs   = getParamAsFloat('IPP.ResultLoopWaitSecs')
+        defaultLocalWorkers = getParamAsInt('MCS.LocalWorkers')
+        defaultTolerance  = getParamAsFloat('MCS.ConvergenceTolerance')
+        defaultWindow     = getParamAsInt('MCS.ConvergenceWindow')
 
         # TBD: document this variable
         defaultScenario = getParam('MCS.DefaultScenario', raiseError=False)
@@ -92,6 +96,24 @@ class RunSimCommand(McsSubcommandABC):
                             --noPostProcessor --runLocal. Useful if runs have actually
                             succeeded but results have not been saved to the SQL database.'''))
 
+        parser.add_argument('--convergeOn', type=str, action=ParseCommaList,
+                            help=clean_help('''Comma-separated list of scalar outputs whose convergence
+                            ends the simulation: once the mean and 5th and 95th percentiles of each
+                            output have stopped changing for all scenarios (see --convergeTolerance
+                            and --convergeWindow), trials that haven't started are cancelled and
+                            their status is reset to "new".'''))
+
+        parser.add_argument('--convergeTolerance', type=float, default=defaultTolerance,
+                            help=clean_help('''The largest change in each statistic, as a fraction of
+                            its current value, over the last --convergeWindow trials for an output
+                            given by --convergeOn to be considered converged. Default is the value
+                            of config var MCS.ConvergenceTolerance, currently %s.''' % defaultTolerance))
+
+        parser.add_argument('--convergeWindow', type=int, default=defaultWindow,
+                            help=clean_help('''The number of trials over which outputs given by
+                            --convergeOn must not change. Default is the value of config var
+                            MCS.ConvergenceWindow, currently %d.''' % defaultWindow))
+
         parser.add_argument('-D', '--noDatabase', dest='updateDatabase', action='store_false',
                             help=clean_help('''Don't save query results to the SQL database.'''))
 
@@ -115,6 +137,13 @@ class RunSimCommand(McsSubcommandABC):
         parser.add_argument('-l', '--runLocal', action='store_true',
                             help=clean_help('''Runs the program locally instead of submitting a batch job.'''))
 
+        parser.add_argument('-L', '--localWorkers', type=int, default=defaultLocalWorkers,
+                            help=clean_help('''Run trials concurrently in up to the given number of
+                            processes on the local machine rather than on an ipyparallel cluster.
+                            Policy scenarios are run after their baseline for the same trial has
+                            succeeded. Ignored if --runLocal is specified. Default is the value of
+                            config var MCS.LocalWorkers, currently %d.''' % defaultLocalWorkers))
+
         parser.add_argument('-m', '--minutesPerRun', type=int, default=defaultMinutes,
                             help=clean_help('''Set the number of minutes of walltime to allocate
                             per GCAM run. Ignored unless -C flag is specified. Overrides 
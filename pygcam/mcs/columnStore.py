@@ -0,0 +1,405 @@
+'''
+.. Columnar "side-car" store for MCS parameter values and results.
+
+   The store holds one ``.npy`` file per (scenario, output) -- or per (scenario,
+   output, region) for timeseries -- indexed by trial number, plus a small JSON
+   manifest describing the files. The master writes values in place as results
+   arrive, and readers memory-map only the columns they need, so retrieving an
+   output for all trials is a column read rather than a multi-table SQL join.
+
+   The SQL database remains the system of record; the store is enabled by
+   setting config variable ``MCS.ColumnStore`` to True.
+
+.. Copyright (c) 2012-2018. The Regents of the University of California (Regents)
+   and Richard Plevin. See the file COPYRIGHT.txt for details.
+'''
+import json
+import os
+
+from pygcam.config import getParamAsBoolean
+from pygcam.log import getLogger
+from pygcam.utils import mkdirs
+
+from .context import getSimDir
+from .error import PygcamMcsSystemError
+
+_logger = getLogger(__name__)
+
+STORE_DIR_NAME = 'columns'
+MANIFEST_NAME  = 'manifest.json'
+MANIFEST_VERSION = 1
+
+PARAMETER_FILE = 'parameters.npy'
+RUNID_FILE = 'runId.npy'
+
+NO_RUN = -1     # runId stored for trials with no (successful) run
+
+
+def usingColumnStore():
+    '''
+    Return True if the config file enables the columnar result store.
+    '''
+    return getParamAsBoolean('MCS.ColumnStore')
+
+def getColumnStore(simId, create=False):
+    '''
+    Return the ColumnStore for `simId` if the store is enabled and either it
+    already exists or `create` is True, else return None.
+
+    :param simId: (int) simulation id
+    :param create: (bool) whether to create the store if it doesn't exist
+    :return: (ColumnStore or None)
+    '''
+    if not usingColumnStore():
+        return None
+
+    store = ColumnStore._instances.get(simId)
+    if store is None or store.directory != ColumnStore.storeDir(simId):
+        store = ColumnStore(simId)
+        ColumnStore._instances[simId] = store
+
+    if store.exists():
+        store.reload()
+    elif not create:
+        return None
+
+    return store
+
+
+class ColumnStore(object):
+    '''
+    Trial-indexed arrays of parameter values and results for one simulation.
+    Arrays are grown as needed when trials are added; rows for which no value
+    has been saved hold NaN (or NO_RUN, for runIds).
+    '''
+    _instances = {}     # cached instances, keyed by simId
+
+    def __init__(self, simId):
+        self.simId = simId
+        self.directory = self.storeDir(simId)
+        self.manifest = None
+        self.manifestMtime = None
+        self.arrays = {}        # writable memmaps, keyed by relative filename
+        self.dirty = False      # whether the manifest needs to be written
+
+    @staticmethod
+    def storeDir(simId):
+        return os.path.join(getSimDir(simId), STORE_DIR_NAME)
+
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def exists(self):
+        return os.path.exists(self._path(MANIFEST_NAME))
+
+    @staticmethod
+    def _emptyManifest(trials=0):
+        return {'version': MANIFEST_VERSION, 'trials': trials, 'parameters': None, 'scenarios': {}}
+
+    def reload(self):
+        '''
+        Re-read the manifest if it has been modified since it was last read,
+        e.g., by the master while results were being analyzed.
+        '''
+        path = self._path(MANIFEST_NAME)
+        mtime = os.path.getmtime(path)
+        if self.manifest is not None and mtime == self.manifestMtime:
+            return
+
+        with open(path) as f:
+            manifest = json.load(f)
+
+        if manifest.get('version') != MANIFEST_VERSION:
+            raise PygcamMcsSystemError("Column store manifest %s has unknown version %s" % (path, manifest.get('version')))
+
+        self.manifest = manifest
+        self.manifestMtime = mtime
+        self.arrays = {}
+
+    def reset(self, trials):
+        '''
+        Delete any existing store files and create an empty manifest
+        for the given number of trials.
+        '''
+        import shutil
+
+        self.arrays = {}
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
+
+        mkdirs(self.directory)
+        self.manifest = self._emptyManifest(trials)
+        self.dirty = True
+        self.flush()
+
+    def flush(self):
+        '''
+        Flush modified arrays to disk and write the manifest if it has changed.
+        '''
+        for array in self.arrays.values():
+            array.flush()
+
+        if self.dirty:
+            path = self._path(MANIFEST_NAME)
+            tmpPath = path + '.tmp'
+            with open(tmpPath, 'w') as f:
+                json.dump(self.manifest, f, indent=1, sort_keys=True)
+
+            os.rename(tmpPath, path)    # atomic, so readers never see a partial manifest
+            self.manifestMtime = os.path.getmtime(path)
+            self.dirty = False
+
+    def _ensureManifest(self):
+        if self.manifest is None:
+            if self.exists():
+                self.reload()
+            else:
+                # Not created by gensim, so size the arrays for the simulation's trials
+                from .Database import getDatabase
+                self.reset(getDatabase().getTrialCount(self.simId) or 0)
+
+    #
+    # Array access
+    #
+    def _createArray(self, filename, shape, fill):
+        from numpy.lib.format import open_memmap
+
+        path = self._path(filename)
+        mkdirs(os.path.dirname(path))
+        array = open_memmap(path, mode='w+', dtype=type(fill), shape=shape)
+        array[:] = fill
+        self.arrays[filename] = array
+        return array
+
+    def _writable(self, filename, fill, minTrials=0, cols=None):
+        '''
+        Return a writable memmap for `filename`, creating it if necessary and
+        growing it if it has fewer than `minTrials` rows. Arrays are grown to at
+        least twice their size, so saving results for trials in increasing order
+        copies each array only O(log(trials)) times; rows beyond the number of
+        trials in the manifest are ignored by readers.
+        '''
+        from numpy.lib.format import open_memmap
+
+        trials = max(self.manifest['trials'], minTrials)
+        if trials > self.manifest['trials']:
+            self.manifest['trials'] = trials
+            self.dirty = True
+
+        shape = (trials,) if cols is None else (trials, cols)
+
+        array = self.arrays.get(filename)
+        if array is None:
+            path = self._path(filename)
+            if not os.path.exists(path):
+                return self._createArray(filename, shape, fill)
+
+            array = self.arrays[filename] = open_memmap(path, mode='r+')
+
+        if array.shape[0] < trials:
+            # Copy the existing values into a larger file
+            old = array[:].copy()
+            del self.arrays[filename]
+            del array
+            array = self._createArray(filename, (max(trials, 2 * old.shape[0]),) + old.shape[1:], fill)
+            array[:old.shape[0]] = old
+
+        return array
+
+    def _readable(self, filename):
+        import numpy as np
+        return np.load(self._path(filename), mmap_mode='r')
+
+    def _scenarioInfo(self, scenario, create=False):
+        scenarios = self.manifest['scenarios']
+        info = scenarios.get(scenario)
+        if info is None and create:
+            info = scenarios[scenario] = {'dir': 'x%03d' % len(scenarios),
+                                          'scalars': {}, 'timeseries': {}}
+            self.dirty = True
+        return info
+
+    #
+    # Writing
+    #
+    def saveParameters(self, df, start=0):
+        '''
+        Save trial parameter values.
+
+        :param df: (pandas.DataFrame) the trial data, with one column per parameter
+        :param start: (int) the trial number of the first row in `df`. If zero,
+           the store is reset, since results for prior trial data are invalid.
+        :return: none
+        '''
+        import numpy as np
+
+        names = [str(name) for name in df.columns]
+        trials = start + df.shape[0]
+
+        if start == 0:
+            self.reset(trials)
+        else:
+            self._ensureManifest()
+            params = self.manifest['parameters']
+            if params and params['names'] != names:
+                raise PygcamMcsSystemError("saveParameters: parameter names differ from those in the column store")
+
+        self.manifest['parameters'] = {'file': PARAMETER_FILE, 'names': names}
+        self.dirty = True
+
+        array = self._writable(PARAMETER_FILE, np.nan, minTrials=trials, cols=len(names))
+        array[start:trials] = df.values
+        self.flush()
+
+    def saveResults(self, runId, scenario, trialNum, resultsList):
+        '''
+        Save the results for one run, as produced by XMLResultFile.collectResults().
+        Call flush() after saving a batch of results.
+
+        :param runId: (int) the run id of the trial
+        :param scenario: (str) the scenario name
+        :param trialNum: (int) the trial number
+        :param resultsList: (list of dict) the results for the run
+        :return: none
+        '''
+        import numpy as np
+        from .Database import getDatabase
+        from .util import activeYears, YEAR_COL_PREFIX
+
+        self._ensureManifest()
+        info = self._scenarioInfo(scenario, create=True)
+        scenDir = info['dir']
+        minTrials = trialNum + 1
+
+        self._writable(os.path.join(scenDir, RUNID_FILE), np.int64(NO_RUN), minTrials=minTrials)[trialNum] = runId
+
+        for resultDict in resultsList:
+            name  = resultDict['paramName']
+            value = resultDict['value']
+
+            if resultDict['isScalar']:
+                scalars = info['scalars']
+                filename = scalars.get(name)
+                if filename is None:
+                    filename = scalars[name] = os.path.join(scenDir, 's%03d.npy' % len(scalars))
+                    self.dirty = True
+
+                self._writable(filename, np.nan, minTrials=minTrials)[trialNum] = value
+            else:
+                allSeries = info['timeseries']
+                series = allSeries.get(name)
+                if series is None:
+                    years = [YEAR_COL_PREFIX + y for y in activeYears()]
+                    series = allSeries[name] = {'units': resultDict['units'], 'years': years,
+                                                'regions': {}, 'prefix': 't%03d' % len(allSeries)}
+                    self.dirty = True
+
+                regionId = str(getDatabase().getRegionId(resultDict['regionName']))
+                regions = series['regions']
+                filename = regions.get(regionId)
+                if filename is None:
+                    filename = regions[regionId] = os.path.join(scenDir, '%s-r%s.npy' % (series['prefix'], regionId))
+                    self.dirty = True
+
+                row = [value.get(col, np.nan) for col in series['years']]
+                self._writable(filename, np.nan, minTrials=minTrials, cols=len(row))[trialNum] = row
+
+    def clearRun(self, scenario, trialNum):
+        '''
+        Mark the given trial as having no valid results, e.g., when it is re-run
+        and fails. Values are left in place but are ignored by readers.
+        '''
+        import numpy as np
+
+        self._ensureManifest()
+        info = self._scenarioInfo(scenario)
+        if info is None or trialNum >= self.manifest['trials']:
+            return
+
+        self._writable(os.path.join(info['dir'], RUNID_FILE), np.int64(NO_RUN))[trialNum] = NO_RUN
+
+    #
+    # Reading
+    #
+    def hasParameters(self):
+        return bool(self.manifest['parameters'])
+
+    def hasOutput(self, scenario, outputName, isScalar=True):
+        info = self._scenarioInfo(scenario)
+        if info is None:
+            return False
+
+        return outputName in info['scalars' if isScalar else 'timeseries']
+
+    def _validTrials(self, info, values):
+        '''
+        Return the trial numbers and runIds of the successful runs for a scenario
+        that have rows in the array `values`, which may have fewer rows than the
+        runId array if the output was added to the results file after some trials
+        were run.
+        '''
+        import numpy as np
+
+        runIds = self._readable(os.path.join(info['dir'], RUNID_FILE))
+        trialNums = np.flatnonzero(runIds[:values.shape[0]] != NO_RUN)
+        return trialNums, runIds[trialNums]
+
+    def getParameterValues(self):
+        '''
+        Return a DataFrame of parameter values indexed by trialNum, with
+        columns sorted by parameter name, or None if none were saved.
+        '''
+        from pandas import DataFrame, Index
+
+        params = self.manifest['parameters']
+        if not params:
+            return None
+
+        array = self._readable(params['file'])[:self.manifest['trials']]
+        index = Index(range(array.shape[0]), name='trialNum')
+        df = DataFrame(array, index=index, columns=params['names'])
+        df.columns.name = 'paramName'
+        return df.sort_index(axis=1)
+
+    def getOutValues(self, scenario, outputName, limit=None):
+        '''
+        Return a DataFrame with index trialNum and a single column outputName
+        holding the scalar result for each successful trial, or None.
+        '''
+        import numpy as np
+        from pandas import DataFrame, Index
+
+        info = self._scenarioInfo(scenario)
+        values = self._readable(info['scalars'][outputName])
+        trialNums, _ = self._validTrials(info, values)
+
+        values = values[trialNums]
+        valid = ~np.isnan(values)
+        trialNums = trialNums[valid]
+        values = values[valid]
+
+        if limit:
+            trialNums = trialNums[:limit]
+            values = values[:limit]
+
+        if len(values) == 0:
+            return None
+
+        return DataFrame({outputName: values}, index=Index(trialNums, name='trialNum'))
+
+    def getTimeSeries(self, scenario, outputName):
+        '''
+        Return a list of (regionId, units, yearCols, runIds, values) tuples,
+        one per region, where values is a 2-D array with one row per runId
+        and one column per year.
+        '''
+        info = self._scenarioInfo(scenario)
+        series = info['timeseries'][outputName]
+
+        result = []
+        for regionId, filename in sorted(series['regions'].items()):
+            values = self._readable(filename)
+            trialNums, runIds = self._validTrials(info, values)
+            result.append((int(regionId), series['units'], series['years'], runIds, values[trialNums]))
+
+        return result
@@ -18,6 +18,9 @@ DEFAULT_BINS     = 30
 DEFAULT_TRUNCATE = 3
 COUNT_TITLE      = 'count'
 
+# Empirical distributions read from data files
+DEFAULT_EMPIRICAL_BINS = 1000
+
 DISCRETE_ENTRY_SEPARATOR = ':'
 DICT_SEPARATOR = '='
 DISTRO_SUFFIX  = 'distro'
@@ -0,0 +1,139 @@
+"""
+.. Tracking the convergence of the running statistics of simulation outputs,
+   so that runsim can stop once more trials would not change the results.
+
+.. Copyright (c) 2016  Richard Plevin
+   See the https://opensource.org/licenses/MIT for license details.
+"""
+from __future__ import division
+from bisect import insort
+from collections import deque
+import math
+
+from ..config import getParamAsInt, getParamAsFloat
+from ..log import getLogger
+
+_logger = getLogger(__name__)
+
+# The statistics tracked for each output: the mean and these percentiles
+PERCENTILES = (5, 95)
+
+
+def _percentile(sortedValues, pct):
+    '''
+    Return the `pct` percentile of the list `sortedValues`, interpolating
+    linearly between values, as numpy.percentile does by default.
+    '''
+    pos = (len(sortedValues) - 1) * pct / 100
+    lo = int(math.floor(pos))
+    hi = min(lo + 1, len(sortedValues) - 1)
+    return sortedValues[lo] + (sortedValues[hi] - sortedValues[lo]) * (pos - lo)
+
+
+class RunningStats(object):
+    '''
+    The running mean and percentiles of the values of one output of one scenario,
+    and the values of these statistics after each of the last `window` values.
+    '''
+    def __init__(self, window):
+        self.count = 0
+        self.total = 0.0
+        self.sortedValues = []
+        self.history = deque(maxlen=window)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        insort(self.sortedValues, value)
+        self.history.append(self.stats())
+
+    def stats(self):
+        '''
+        Return a tuple of the mean and the percentiles in PERCENTILES.
+        '''
+        return (self.total / self.count,) + tuple(_percentile(self.sortedValues, pct) for pct in PERCENTILES)
+
+    def converged(self, tolerance):
+        '''
+        Return True if each statistic has stayed within `tolerance` (relative to its
+        current value) of its current value after each of the last `window` values.
+        '''
+        history = self.history
+        if len(history) < history.maxlen:
+            return False
+
+        current = history[-1]
+        for stats in history:
+            for value, final in zip(stats, current):
+                if abs(value - final) > tolerance * abs(final):
+                    return False
+
+        return True
+
+
+class ConvergenceMonitor(object):
+    '''
+    Tracks the running statistics (mean, 5th and 95th percentiles) of the given
+    scalar outputs of each scenario as results are saved. An output has converged
+    for a scenario once, over the last `window` results, none of its statistics
+    has differed from its current value by more than `tolerance` (as a fraction of
+    the current value), provided that at least MCS.ConvergenceMinTrials results
+    have been received. The simulation has converged once every output has
+    converged for every scenario run, except that an output never reported for a
+    scenario with MCS.ConvergenceMinTrials succeeded runs is taken not to apply to it.
+    '''
+    def __init__(self, outputs, scenarios, tolerance=None, window=None):
+        self.outputs = list(outputs)
+        self.scenarios = list(scenarios)
+        self.tolerance = getParamAsFloat('MCS.ConvergenceTolerance') if tolerance is None else tolerance
+        self.window = max(1, getParamAsInt('MCS.ConvergenceWindow') if window is None else window)
+        self.minTrials = max(self.window, getParamAsInt('MCS.ConvergenceMinTrials'))
+
+        self.stats = {}         # RunningStats keyed by (scenario, output)
+        self.runs = {scenario: 0 for scenario in self.scenarios}    # count of results by scenario
+
+    def addResults(self, scenario, resultsList):
+        '''
+        Update the statistics with the results of one succeeded run of `scenario`.
+
+        :param scenario: (str) the scenario name
+        :param resultsList: (list of dict) results as created by XMLResultFile.extractResult
+        :return: none
+        '''
+        self.runs[scenario] = self.runs.get(scenario, 0) + 1
+
+        for result in resultsList:
+            name = result['paramName']
+            if name not in self.outputs or not result.get('isScalar', True):
+                continue
+
+            value = result['value']
+            if value is None or math.isnan(value):
+                continue
+
+            key = (scenario, name)
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = RunningStats(self.window)
+
+            stats.add(value)
+
+    def isConverged(self, scenario, output):
+        stats = self.stats.get((scenario, output))
+        if stats is None:
+            return self.runs.get(scenario, 0) >= self.minTrials     # output doesn't apply
+
+        return stats.count >= self.minTrials and stats.converged(self.tolerance)
+
+    def converged(self):
+        '''
+        Return True if all outputs have converged for all scenarios.
+        '''
+        return bool(self.scenarios) and all(self.isConverged(scenario, output)
+                                            for scenario in self.scenarios for output in self.outputs)
+
+    def logStats(self):
+        for (scenario, output), stats in sorted(self.stats.items()):
+            mean, low, high = stats.stats()
+            _logger.info('%s/%s: %d values, mean %g, %d%%-%d%% range [%g, %g]',
+                         scenario, output, stats.count, mean, PERCENTILES[0], PERCENTILES[1], low, high)
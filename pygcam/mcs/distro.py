@@ -9,6 +9,7 @@
 This module is based on code originally developed by Sam Fendell.
 '''
 import math
+import os
 import re
 from inspect import getargspec
 
@@ -16,6 +17,7 @@ import numpy as np
 from scipy.stats import lognorm, triang, uniform, norm, rv_discrete
 
 from pygcam.log import getLogger
+from .constants import DEFAULT_EMPIRICAL_BINS
 from .error import PygcamMcsUserError
 
 _logger = getLogger(__name__)
@@ -151,9 +153,7 @@ class constant():
         self.value = value
 
     def ppf(self, q):
-        n = np.ndarray(len(q))
-        n[:] = self.value
-        return n
+        return np.full(len(q), self.value, dtype=float)
 
 class sequence():
     """
@@ -161,17 +161,11 @@ class sequence():
     of constant values. Useful for forcing parameters to given values.
     """
     def __init__(self, values):
-        self.values = [float(item) for item in values.split(',')]
+        self.values = np.array([float(item) for item in values.split(',')])
 
     def ppf(self, q):
-        n = len(q)  # length of array to return
-        count = len(self.values)    # items in the sequence
-
-        seq = ((int(n / count) + (1 if n % count else 0)) * self.values)
-
-        # truncate in case n wasn't a multiple of count
-        arr = np.array(seq[:n])
-        return arr
+        # cycle through the sequence as many times as needed to produce len(q) values
+        return np.resize(self.values, len(q))
 
 class GridRV(object):
     '''
@@ -182,7 +176,7 @@ class GridRV(object):
     for use in CoreMCS and derivatives only.
     '''
     def __init__(self, min, max, count):
-        self.values = np.linspace(min, max, count)
+        self.values = np.linspace(min, max, int(count))
         _logger.debug("Generated values: %s", self.values)
 
 
@@ -192,16 +186,76 @@ class GridRV(object):
         as many times as necessary to produce 'n' values, where 'n' is the length of
         the percentile list given by 'q'. (We ignore the values, though.)
         '''
-        n = len(q)
         values = self.values
         assert len(values.shape) == 1, "Grid values were converted to ndarray of > 1 dimension"
-        count  = values.shape[0]
-        reps   = 1 if n <= count else np.ceil(float(n) / count)
-        tiled  = np.tile(values, reps)[:n]
+        tiled = np.resize(values, len(q))
         np.random.shuffle(tiled)
-        # _logger.debug("tiled=%s", tiled)
         return tiled
 
+class EmpiricalRV(object):
+    '''
+    An RV-like object whose distribution is the histogram of the values in one
+    column of a (possibly very large) delimited data file. The file is read in
+    chunks of `chunksize` rows, twice: once to find the range of the values, and
+    again to count them into `bins` equal-width bins, so memory use is bounded by
+    the chunk size rather than the file size. Within each bin, values are taken
+    to be uniformly distributed, so ppf and cdf are piecewise linear.
+    '''
+    def __init__(self, file, column, bins=DEFAULT_EMPIRICAL_BINS, sep=',', chunksize=100000):
+        import pandas as pd
+
+        self.file = os.path.expanduser(file)
+        self.column = column
+
+        bins = int(bins)
+        if bins <= 0:
+            raise PygcamMcsUserError("Empirical distribution 'bins' must be a positive integer; %d was given" % bins)
+
+        def chunks():
+            reader = pd.read_csv(self.file, sep=sep, usecols=[column], chunksize=chunksize)
+            for chunk in reader:
+                values = chunk[column].values.astype(float)
+                yield values[~np.isnan(values)]
+
+        lo, hi = np.inf, -np.inf
+        for values in chunks():
+            if len(values):
+                lo = min(lo, values.min())
+                hi = max(hi, values.max())
+
+        if lo > hi:
+            raise PygcamMcsUserError("No values for column '%s' were found in '%s'" % (column, self.file))
+
+        # If all values are equal, use one bin of zero width, so ppf returns that value
+        bins = bins if hi > lo else 1
+        histRange = (lo, hi) if hi > lo else (lo - 0.5, lo + 0.5)
+
+        counts = np.zeros(bins)
+        for values in chunks():
+            counts += np.histogram(values, bins=bins, range=histRange)[0]
+
+        self.edges = np.linspace(lo, hi, bins + 1)
+        self.cumProbs = np.concatenate([[0.0], np.cumsum(counts) / counts.sum()])
+        self.count = int(counts.sum())
+        self.lastBin = np.flatnonzero(counts)[-1]
+
+        _logger.debug("Read %d values for '%s' from %s into %d bins", self.count, column, self.file, bins)
+
+    def ppf(self, q):
+        q = np.asarray(q, dtype=float)
+        edges = self.edges
+        cumProbs = self.cumProbs
+
+        # Find the bin holding each percentile: since side='right', cumProbs[i] <= q < cumProbs[i+1],
+        # so the bin isn't empty. Percentiles of 1 are assigned to the last non-empty bin.
+        i = np.minimum(np.searchsorted(cumProbs, q, side='right') - 1, self.lastBin)
+
+        fraction = (q - cumProbs[i]) / (cumProbs[i + 1] - cumProbs[i])
+        return edges[i] + np.clip(fraction, 0, 1) * (edges[i + 1] - edges[i])
+
+    def cdf(self, values):
+        return np.interp(values, self.edges, self.cumProbs)
+
 class linkedDistro(object):
     def __init__(self, parameter):
         '''Linked to (i.e., shares RV data with) `withParameter`'''
@@ -306,4 +360,8 @@ class DistroGen(object):
 
         cls('sequence', lambda values: sequence(values))
 
+        # Histogram of the values in the given column of a CSV file, with the default or given number of bins
+        cls('empirical', lambda file, column: EmpiricalRV(file, column))
+        cls('empirical', lambda file, column, bins: EmpiricalRV(file, column, bins=bins))
+
         cls('linked', lambda parameter: linkedDistro(parameter))       # TBD: could be generalized
@@ -9,22 +9,23 @@
 # controller and engines using the values in the template.
 #
 from __future__ import division, print_function
-import copy
+from datetime import datetime
 from six import iteritems
 import os
 import stat
 import sys
-from time import sleep
+import threading
+from time import sleep, time
 from IPython.paths import locate_profile
 
 import ipyparallel as ipp
 from ipyparallel.apps.ipclusterapp import ALREADY_STARTED, ALREADY_STOPPED, NO_CLUSTER
 
 from .context import Context
-from .Database import RUN_NEW, RUN_RUNNING, RUN_SUCCEEDED, RUN_QUEUED, RUN_KILLED, ENG_TERMINATE, getDatabase
-from .error import IpyparallelError, PygcamMcsSystemError, PygcamMcsUserError
+from .Database import RUN_NEW, RUN_SUCCEEDED, RUN_QUEUED, RUN_KILLED, RUN_RUNNING, StatusChange, getDatabase
+from .error import PygcamMcsSystemError, PygcamMcsUserError
 from .util import parseTrialString, createTrialString
-from ..config import getParam, getParamAsInt
+from ..config import getParam, getParamAsInt, getParamAsFloat
 from ..log import getLogger
 
 # Exit values for Master.processTrials()
@@ -104,14 +105,121 @@ batchTemplates = {'slurm' : {'engine'     : _slurmEngineBatchTemplate,
                              'controller' : _lsfControllerBatchTemplate},
                   }
 
-class Master(object):
-    idleEngines = set()
+class StatusWriter(threading.Thread):
+    '''
+    A background thread that writes run status changes to the database in bulk.
+    Status changes are coalesced per runId (see StatusChange.combine), keeping
+    the latest status, the time of each change, and the start time of runs that
+    both started and finished since the last write, and are flushed every
+    `interval` seconds, when flush() is called explicitly, and when the writer
+    is stopped.
+    '''
+    def __init__(self, db, interval):
+        super(StatusWriter, self).__init__(name='StatusWriter')
+        self.daemon = True
+        self.db = db
+        self.interval = interval
+        self.pending = {}                       # StatusChange keyed by runId
+        self.lock = threading.Lock()            # protects self.pending
+        self.flushLock = threading.Lock()       # serializes writes to the database
+        self.wakeup = threading.Event()
+        self.stopping = False
+
+    def put(self, runId, status, when=None):
+        '''
+        Queue the change of run `runId` to `status` at time `when` (default now).
+        '''
+        change = StatusChange(status, when or datetime.now(), None)
+        with self.lock:
+            prior = self.pending.get(runId)
+            self.pending[runId] = prior.combine(change) if prior else change
+
+    def take(self):
+        '''
+        Remove and return the dict of pending status changes.
+        '''
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        return pending
+
+    def restore(self, statusByRunId):
+        '''
+        Return status changes that could not be written to the pending set,
+        combined with any newer changes of the same runs.
+        '''
+        with self.lock:
+            for runId, change in iteritems(statusByRunId):
+                newer = self.pending.get(runId)
+                self.pending[runId] = change.combine(newer) if newer else change
+
+    def flush(self, session=None):
+        '''
+        Write all pending status changes. If `session` is given, the changes are
+        written in the caller's transaction (e.g., with the results of the runs),
+        and the caller must commit, or call restore() with the returned dict if
+        the transaction fails.
+
+        :param session: an open session, or None
+        :return: (dict) the StatusChanges written, keyed by runId
+        '''
+        with self.flushLock:
+            pending = self.take()
+            if pending:
+                try:
+                    self.db.setRunStatuses(pending, session=session)
+                except Exception:
+                    self.restore(pending)
+                    raise
+
+                _logger.debug('StatusWriter: wrote %d status changes', len(pending))
+
+            return pending
+
+    def run(self):
+        while not self.stopping:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                _logger.error('StatusWriter: failed to write status changes (will retry): %s', e)
+
+    def stop(self):
+        '''
+        Stop the thread and write any remaining status changes.
+        '''
+        self.stopping = True
+        self.wakeup.set()
+        self.join()
+        self.flush()
 
+
+class Master(object):
     def __init__(self, args):
         self.args = args
         self.db = getDatabase(checkInit=False)
-        self.client = None
+        self.backend = None     # set in processTrials() unless set by caller
+        self.trialOrder = []    # trial numbers in the order submitted, set in submitTrials()
         self.finished = False
+        self.statusWriter = None
+
+        # Counters reported by logLoopStats()
+        self.loopStats = {'iterations': 0, 'completed': 0, 'busySecs': 0.0, 'maxBusySecs': 0.0}
+
+        # Straggler detection: see checkStragglers()
+        self.stragglerFactor = getParamAsFloat('MCS.StragglerFactor')
+        self.runStarts = {}     # (time, Context) of running runs, keyed by runId
+        self.durations = {}     # lists of durations of succeeded runs, keyed by scenario
+
+        # Adaptive stopping: see checkConvergence()
+        self.convergence = None
+        self.converged = False
+        targets = getattr(args, 'convergeOn', None)
+        if targets:
+            from .convergence import ConvergenceMonitor
+            self.convergence = ConvergenceMonitor(targets, args.scenarios,
+                                                  tolerance=getattr(args, 'convergeTolerance', None),
+                                                  window=getattr(args, 'convergeWindow', None))
 
         projectName = args.projectName
 
@@ -126,79 +234,6 @@ class Master(object):
                 Context(projectName=projectName, runId=runId, simId=simId,
                         trialNum=trialNum, scenario=scenario, status=status)
 
-    def waitForWorkers(self):
-        maxTries  = getParamAsInt('IPP.StartupWaitTries')
-        seconds   = getParamAsInt('IPP.StartupWaitSecs')
-        profile   = self.args.profile
-        clusterId = self.args.clusterId
-        client = None
-
-        for i in range(1, maxTries+1):
-            if client and len(client) > 0:
-                return
-
-            if client is None:
-                try:
-                    # default timeout is 10 seconds
-                    self.client = client = ipp.Client(profile=profile, cluster_id=clusterId)
-
-                # except IOError:
-                except Exception as e:
-                    _logger.debug("Error waiting for workers: %s", e)
-
-                    if i == maxTries - 1:
-                        raise
-
-                    _logger.info("Waiting for client (%d/%d)", i, maxTries)
-                    sleep(seconds)
-                    continue
-
-            if len(client.ids) == 0:
-                _logger.info("Waiting for engines (%d/%d)", i, maxTries)
-                sleep(seconds)
-
-        if not client or len(client) == 0:
-            raise IpyparallelError('Failed to connect to engines')
-
-    def queueTotals(self):
-        """
-        Return totals for queue status across all engines
-        """
-        qstatus = self.client.queue_status()
-        unassigned = qstatus.pop(u'unassigned')
-        totals = dict(queue=0, completed=0, tasks=0, unassigned=unassigned)
-
-        _logger.debug("queueTotals: %d statuses returned", len(qstatus))
-
-        for eid, qs in iteritems(qstatus):
-            for key, count in iteritems(qs):
-                totals[key] += count
-
-        return totals
-
-    def shutdownIdleEngines(self):
-        qstatus = self.client.queue_status()
-
-        if qstatus.pop(u'unassigned'):
-            # some tasks are not yet assigned to engines
-            return
-
-        engineCount = len(qstatus)
-        if engineCount == 0:
-            _logger.info("No engines are running")
-            return
-
-        # Shutdown idle engines if there are no unassigned tasks
-        idleEngines = set([id for id, stats in iteritems(qstatus) if stats[u'tasks'] + stats[u'queue'] == 0])
-
-        if idleEngines:
-            newlyIdle = idleEngines.difference(self.idleEngines)
-            self.idleEngines = self.idleEngines.union(idleEngines)
-
-            _logger.debug('Idle engines: %s', newlyIdle)
-            _logger.info('Shutting down %d idle engines', len(newlyIdle))
-            self.client.shutdown(targets=newlyIdle, block=False)
-
     def createRuns(self, simId, scenario, trialNums):
         '''
         Create entries in the "run" table for the given simId, trialNums, and scenario.
@@ -243,11 +278,46 @@ class Master(object):
                             baseline=baseline, status=r.status) for r in runs]
         return contexts
 
+    def logLoopStats(self):
+        '''
+        Log the time spent by the master processing completed tasks, which
+        excludes time spent waiting for tasks to complete.
+        '''
+        stats = self.loopStats
+        iterations = stats['iterations']
+        _logger.info("Master loop: %d iterations, %d tasks completed, %.1f ms/iteration avg, %.1f ms max",
+                     iterations, stats['completed'], 1000 * stats['busySecs'] / iterations if iterations else 0,
+                     1000 * stats['maxBusySecs'])
+
+    def startStatusWriter(self):
+        '''
+        Start the background thread that writes status changes to the database,
+        unless config variable MCS.StatusFlushSecs is zero, in which case status
+        changes are written synchronously.
+        '''
+        interval = getParamAsFloat('MCS.StatusFlushSecs')
+        if interval > 0:
+            self.statusWriter = StatusWriter(self.db, interval)
+            self.statusWriter.start()
+
+    def stopStatusWriter(self):
+        '''
+        Stop the status writer thread, if any, after writing all pending changes.
+        '''
+        if self.statusWriter:
+            self.statusWriter.stop()
+            self.statusWriter = None
+
     def setRunStatuses(self, pairs):
         """
         Process a list of status changes in a single transaction, e.g., when setting
         the status for a long list of runs to "queued".
         """
+        if self.statusWriter:
+            for context, status in pairs:
+                self.setRunStatus(context, status=status)
+            return
+
         db = getDatabase()
         with db.sessionScope() as session:
             for context, status in pairs:
@@ -277,7 +347,94 @@ class Master(object):
 
         _logger.info('%s -> %s', cached, status)
         cached.setVars(status=status)
-        self.db.setRunStatus(context.runId, status, session=session)
+        self.recordRunTime(cached, status)
+
+        if self.statusWriter:
+            self.statusWriter.put(context.runId, status)    # written in bulk by the writer thread
+        else:
+            self.db.setRunStatus(context.runId, status, session=session)
+
+    def recordRunTime(self, context, status):
+        """
+        Record when a run starts, and the duration of runs that succeed, for
+        straggler detection.
+        """
+        if not self.stragglerFactor:
+            return
+
+        if status == RUN_RUNNING:
+            self.runStarts[context.runId] = (time(), context)
+            return
+
+        start, _ = self.runStarts.pop(context.runId, (None, None))
+        if start is not None and status == RUN_SUCCEEDED:
+            self.durations.setdefault(context.scenario, []).append(time() - start)
+
+    def checkStragglers(self, backend):
+        """
+        Kill runs that have been running longer than MCS.StragglerFactor times the
+        median duration of the succeeded runs of their scenario, once at least
+        MCS.StragglerMinRuns of these are known, and mark them "unsolved". This
+        frees the worker for other trials rather than waiting for the walltime
+        limit; killed runs can be run again with "runsim --redo unsolved".
+
+        :param backend: (ExecutionBackend) the backend running the trials
+        :return: (list of WorkerResult) results of the runs killed
+        """
+        import numpy as np
+
+        minRuns = getParamAsInt('MCS.StragglerMinRuns')
+        now = time()
+        results = []
+
+        for runId, (start, context) in list(self.runStarts.items()):
+            durations = self.durations.get(context.scenario, [])
+            if len(durations) < max(1, minRuns):
+                continue
+
+            limit = self.stragglerFactor * np.median(durations)
+            if now - start <= limit:
+                continue
+
+            killed = backend.kill(context)
+            if killed is None:
+                continue
+
+            _logger.warning('Killed trial %d of %s after %.1f min (limit %.1f min)',
+                            context.trialNum, context.scenario, (now - start) / 60, limit / 60)
+            self.runStarts.pop(runId, None)
+            results.extend(killed)
+
+        return results
+
+    def checkConvergence(self, backend, results):
+        """
+        Update the running statistics of the outputs given by "runsim --convergeOn"
+        with the given results, and once these have converged (see
+        pygcam.mcs.convergence.ConvergenceMonitor), cancel the trials that haven't
+        started, and reset their status to "new" so they can be run later with
+        "runsim --redo new". Trials already running are completed.
+
+        :param backend: (ExecutionBackend) the backend running the trials
+        :param results: (list of WorkerResult) results just saved
+        :return: none
+        """
+        for result in results:
+            context = result.context
+            if context.status == RUN_SUCCEEDED and result.resultsList:
+                self.convergence.addResults(context.scenario, result.resultsList)
+
+        if self.converged or not self.convergence.converged():
+            return
+
+        self.converged = True
+        self.convergence.logStats()
+
+        cancelled = backend.cancelQueued()
+        _logger.info('Outputs %s have converged; cancelled %d queued trials',
+                     ', '.join(self.convergence.outputs), len(cancelled))
+
+        self.setRunStatuses([(context, RUN_NEW) for context in cancelled])
 
     # Deprecated
     # def _query_completion_status(self, completed=True):
@@ -296,140 +453,81 @@ class Master(object):
     # def completedTasks(self):
     #     return self._query_completion_status(completed=True)
 
-    def resubmit(self, task, context, reason):
-        _logger.info('Resubmitting task (%s) %s', reason, context)
-        self.client.resubmit(task)
-        self.setRunStatus(context, RUN_QUEUED)
-
-    def getResults(self, tasks):
-        if not tasks:
-            return None
-
-        client = self.client
-        results = []
-
-        for task in tasks:
-            try:
-                # owner (bool [default: True]) - Whether this AsyncResult should own the result.
-                # If so, calling ar.get() will remove data from the client's result and metadata
-                # cache. There should only be one owner of any given msg_id.
-                ar = client.get_result(task, block=False, owner=False)
-
-                try:
-                    if not ar.ready():
-                        continue
-
-                except KeyError:        # stale message id can trigger KeyError
-                    client.purge_results(jobs=task)
-                    continue
-
-                chunk = ar.get()
-                workerResult = chunk[0]
-                context = workerResult.context
-                status = context.status
-
-                if status == ENG_TERMINATE:
-                    if ar.engine_id is not None:
-                        _logger.info("Terminating engine %s: insufficient time remaining", ar.engine_id)
-                        client.shutdown(ar.engine_id)
-                        sleep(2)
-                        self.resubmit(task, context, "engine terminated")
-
-                elif status == RUN_KILLED:
-                    self.resubmit(task, context, "run killed")
-
-                else:
-                    results.append(workerResult)
-
-            except Exception as e:
-                # Raised if an engine dies, e.g., walltime expired.
-                _logger.warning('getResults: %s', e)
-
-            client.purge_results(jobs=task)
-
-        return results
-
     def saveResults(self, results):
         '''
         Called on the master to save results to the database that were prepared by the worker.
         '''
         db = getDatabase()
         session = db.Session()
+        written = None
 
         try:
-            # Delete all old values in first transaction
-            for result in results:
-                context = result.context
-                resultsList = result.resultsList
-
-                if resultsList:
-                    # Delete any stale results for this runId (i.e., if re-running a given runId)
-                    names = [resultDict['paramName'] for resultDict in resultsList]
-                    ids = db.getOutputIds(names)
-                    db.deleteRunResults(context.runId, outputIds=ids, session=session)
-
-            db.commitWithRetry(session)
-
-            # Add all new values in a second transaction
+            # Update run statuses and save the results of all successful runs
+            # in a single transaction, using bulk deletes and inserts.
+            resultsByRun = {}
+            statsByRun = {}
+            periodsByRun = {}
             for result in results:
                 context = result.context
-                resultsList = result.resultsList or []
-                runId   = context.runId
-
                 self.setRunStatus(context, session=session)
 
-                if context.status != RUN_SUCCEEDED:
-                    continue
+                if context.status == RUN_SUCCEEDED and result.resultsList:
+                    resultsByRun[context.runId] = result.resultsList
 
-                for resultDict in resultsList:
-                    paramName  = resultDict['paramName']
-                    value      = resultDict['value']
-                    regionName = resultDict['regionName']
+                stats = getattr(result, 'stats', None)
+                if stats and context.runId:
+                    statsByRun[context.runId] = stats
 
-                    # Save the values to the database
-                    if resultDict['isScalar']:
-                        db.setOutValue(runId, paramName, value, session=session)
-                    else:
-                        regionId = db.getRegionId(regionName)   # cached; not a DB query
-                        units = resultDict['units']
-                        db.saveTimeSeries(runId, regionId, paramName, value, units=units, session=session)
+                periods = getattr(result, 'periods', None)
+                if periods and context.runId:
+                    periodsByRun[context.runId] = periods
 
+            # Write all pending status changes (including those just set) in the same
+            # transaction as the results, so an earlier status (e.g., "running") that is
+            # still pending can't later overwrite a run's final status.
+            if self.statusWriter:
+                written = self.statusWriter.flush(session=session)
+
+            db.saveResultsBatch(resultsByRun, session=session)
+            db.saveRunStatsBatch(statsByRun, session=session)
+            db.savePeriodStatsBatch(periodsByRun, session=session)
             db.commitWithRetry(session)
 
+            self.saveColumnStoreResults(results)
+
         except Exception as e:
             session.rollback()
+            if written:
+                self.statusWriter.restore(written)
             # TBD: distinguish database save errors from data access errors?
             raise PygcamMcsSystemError("saveResults failed: %s" % e)
 
         finally:
             db.endSession(session)
 
-    def checkEngines(self):
-        from .slurm import Slurm
-
-        engineSleep = 10
-        client = self.client
-
-        while True:
-            try:
-                if len(client) > 0:
-                    return True
+    def saveColumnStoreResults(self, results):
+        '''
+        If the columnar result store is enabled, write the results of successful
+        runs to it, and invalidate any stored results for unsuccessful runs.
+        '''
+        from .columnStore import usingColumnStore, getColumnStore
 
-                slurm = Slurm()
-                pending = slurm.jobsInState('pending', jobName='mcs-engine')    # pending engines, not tasks...
+        if not usingColumnStore():
+            return
 
-                if len(pending):
-                    _logger.info('No engines registered; %d workers PENDING', len(pending))
-                    sleep(engineSleep)
-                    continue
+        stores = set()
+        for result in results:
+            context = result.context
+            store = getColumnStore(context.simId, create=True)
+            stores.add(store)
 
-                else:
-                    _logger.info("No engines running or pending. Shutting down hub.")
-                    client.shutdown(targets='all',  hub=True, block=False) #, block=True) # stopped working on PIC
-                    return False
+            if context.status == RUN_SUCCEEDED and result.resultsList:
+                store.saveResults(context.runId, context.scenario, context.trialNum, result.resultsList)
+            else:
+                store.clearRun(context.scenario, context.trialNum)
 
-            except ipp.NoEnginesRegistered:
-                sleep(engineSleep)  # handled in loop
+        for store in stores:
+            store.flush()
 
     def run(self):
         """
@@ -440,112 +538,142 @@ class Master(object):
         """
         args = self.args
 
-        if args.runLocal:
-            self.runTrials()
-            return
-
         if args.redoListOnly and args.statuses:
             listTrialsToRedo(self.db, args.simId, args.scenarios, args.statuses)
             return
 
-        self.waitForWorkers()    # wait for engines to spin up
+        self.startStatusWriter()
+        try:
+            self.processTrials()
+        finally:
+            self.stopStatusWriter()     # guarantee that all status changes are written
 
-        shutdownWhenIdle = not args.dontShutdownWhenIdle
+    def processTrials(self):
+        """
+        Submit the trials to the execution backend and wait for and process their results.
 
-        ars = self.runTrials()
+        :return: none
+        """
+        from .backends import getBackend
+        from .scheduler import getTrialOrder, logActualMakespans, TRIAL_ORDER
 
-        pending = copy.copy(self.client.outstanding)
+        args = self.args
+        backend = self.backend = self.backend or getBackend(self)
+        backend.start()
 
-        counter = 0         # for occasionally displaying queue status
+        try:
+            if self.stragglerFactor:
+                scenarios, exps = self.sortedScenarios()
+                for scenario, trialNum, secs in self.db.getRunDurations(args.simId, scenarios):
+                    self.durations.setdefault(scenario, []).append(secs)
 
-        while pending:
+            self.submitTrials(backend)
+            backend.flush()
 
-            if not self.checkEngines():
-                return
+            stats = self.loopStats
 
-            state = 'nominal'   # set to 'completed' when some are completed, to set shorter sleep
+            # Each iteration blocks until a trial completes (or args.waitSecs elapses),
+            # and then handles only the trials that completed.
+            while backend.pending():
+                results = backend.wait(args.waitSecs)
 
-            # check for status updates
-            for ar in ars:
-                data = ar.data[0]
-                if data:
-                    context = data.get('context')
-                    if context:
-                        self.setRunStatus(context)
+                if self.runStarts:
+                    results += self.checkStragglers(backend)
 
-            # finished is the set of msg_ids that are complete
-            finished = pending.difference(self.client.outstanding)
+                iterStart = time()
+                if results:
+                    self.saveResults(results)
 
-            # update pending to exclude those that finished
-            pending = pending.difference(finished)
+                    if self.convergence:
+                        self.checkConvergence(backend, results)
+
+                elapsed = time() - iterStart
+                stats['iterations'] += 1
+                stats['completed']  += len(results)
+                stats['busySecs']   += elapsed
+                stats['maxBusySecs'] = max(stats['maxBusySecs'], elapsed)
+                _logger.debug('Master iteration %d: %d completed, %d pending, %.1f ms',
+                              stats['iterations'], len(results), backend.pending(), 1000 * elapsed)
+
+        except BaseException:
+            cancelled = backend.cancel()
+            if cancelled:
+                _logger.warning('Cancelling %d trials', len(cancelled))
+                self.setRunStatuses([(context, RUN_KILLED) for context in cancelled])
+            raise
 
-            if finished:
-                state = 'completed'
-                _logger.debug('%d completed tasks', len(finished))
+        self.logLoopStats()
+        self.stopStatusWriter()
+        self.db.logStats()
 
-                results = self.getResults(finished)
-                if results:
-                    self.saveResults(results)
-                else:
-                    _logger.warning('Purging %d completed tasks with no results (engine died?)', len(finished))
-                    self.client.purge_results(jobs=finished)
+        if getTrialOrder() != TRIAL_ORDER:
+            scenarios, exps = self.sortedScenarios()
+            logActualMakespans(self.db, args.simId, scenarios, exps, self.trialOrder, backend.workerCount())
 
-                # drop finished tasks from list to avoid checking status needlessly
-                toDelete = []
-                for ar in ars:
-                    id = ar.msg_id[0]
-                    if id in finished:
-                        toDelete.append(ar)
-                        finished.remove(id)
+        backend.shutdown()
 
-                for ar in toDelete:
-                    ars.remove(ar)
+    def submitTrials(self, backend):
+        """
+        Submit the trials to run, baselines first, so that each policy trial can be
+        run after the baseline trial with the same trial number, if it is being run.
+        Within each scenario, trials are submitted in the order given by config
+        variable MCS.TrialOrder (see pygcam.mcs.scheduler).
 
-                if shutdownWhenIdle:
-                    self.shutdownIdleEngines()
+        :param backend: (ExecutionBackend) the backend to submit trials to
+        :return: none
+        """
+        from .scheduler import orderTrials
 
-            if counter % 5 == 0:
-                totals = self.queueTotals()
-                _logger.info("%d clients, %d client.ids, %d tasks", len(self.client), len(self.client.ids), totals['tasks'])
-                _logger.info("Queue totals: %s", totals)
+        argDict = self.workerArgs()
+        scenarios, exps = self.sortedScenarios()
 
-            secs = args.waitSecs if state == 'nominal' else 2
-            _logger.debug('sleep(%d)', secs)
-            sleep(secs)
+        contextsByScenario = {scenario: self.scenarioContexts(scenario) or [] for scenario in scenarios}
 
-            # handle the case of initial over-allocation
-            if counter == 0 and shutdownWhenIdle:
-                self.shutdownIdleEngines()
+        # Submit each scenario's trials in the order given by MCS.TrialOrder
+        self.trialOrder = trialNums = orderTrials(self.db, self.args.simId, contextsByScenario, exps,
+                                                  workers=backend.workerCount())
+        rank = {trialNum: i for i, trialNum in enumerate(trialNums)}
 
-            counter += 1
+        baselineHandles = {}    # handles of baseline trials keyed by (scenario, trialNum)
 
-        _logger.info("Shutting down hub")
-        self.client.shutdown(hub=True, block=True)
+        for scenario in scenarios:
+            baseline = exps.get(scenario)
+            contexts = sorted(contextsByScenario[scenario], key=lambda ctx: rank[ctx.trialNum])
+            statusPairs = []
 
-    def runTrials(self):
-        from . import worker
+            for context in contexts:
+                try:
+                    if baseline:
+                        after = baselineHandles.get((baseline, context.trialNum))
+                        backend.submit(context, argDict, after=after)
+                    else:
+                        handle = backend.submit(context, argDict)
+                        baselineHandles[(scenario, context.trialNum)] = handle
 
-        args = vars(self.args)
+                    statusPairs.append((context, RUN_QUEUED))
 
-        # Construct dict of args to pass to worker tasks
+                except Exception as e:
+                    _logger.error("Exception submitting trial %d of %s: %s", context.trialNum, scenario, e)
+
+            self.setRunStatuses(statusPairs)
+
+    def workerArgs(self):
+        """
+        Return the dict of command-line args to pass to worker tasks.
+        """
+        args = vars(self.args)
         argDict = {}
         for key in ('runLocal', 'noGCAM', 'noBatchQueries', 'noPostProcessor'):
             argDict[key] = args.get(key, False)
 
-        simId       = args['simId']
-        statuses    = args['statuses']
-        scenarios   = args['scenarios']
-        projectName = args['projectName']
-        groupName   = args['groupName']
-        trialStr    = args['trials']
-        runLocal    = args['runLocal']
-
-        asyncResults = []
-
-        view = None if runLocal else self.client.load_balanced_view() # retries=2)
+        return argDict
 
-        db = getDatabase()
-        exps = {e.expName: e.parent for e in db.getExps()}
+    def sortedScenarios(self):
+        """
+        Return the scenarios to run, with baselines first, and a dict of the
+        baseline name (or None, for baselines) keyed by scenario name.
+        """
+        exps = {e.expName: e.parent for e in self.db.getExps()}
 
         def isBaseline(scenario):
             return (not exps.get(scenario))
@@ -553,80 +681,62 @@ class Master(object):
         def notBaseline(scenario):
             return exps.get(scenario)
 
-        # sort so baselines come first
+        scenarios = self.args.scenarios
         baselines = list(filter(isBaseline,  scenarios))
         policies  = list(filter(notBaseline, scenarios))
-        scenarios = baselines + policies
-
-        baselineARs = {}      # baseline async_result objects keyed by trialnum
+        return baselines + policies, exps
 
-        for scenario in scenarios:
-
-            if statuses:
-                # Change this to return Run instances?
-                # If any of the "redo" options find trials, use these instead of args.trials
-                contexts = self.db.getRunsByStatus(simId, scenario, statuses,
-                                                   projectName=projectName,
-                                                   groupName=groupName)
-
-                if not contexts:
-                    _logger.warn("No trials found for simId=%s, scenario=%s with statuses=%s",
-                                 simId, scenario, statuses)
-                    continue
-            else:
-                trialCount = self.db.getTrialCount(simId)
-
-                if trialStr:
-                    # convert arg string like "4,7,9-12,42" to a list of ints
-                    trialList = parseTrialString(trialStr)
-                    userTrials = len(trialList)
-
-                    # remove nonsense values and warn user about them
-                    trialNums = [trial for trial in trialList if 0 <= trial < trialCount]
-                    goodTrials = len(trialNums)
-                    if goodTrials != userTrials:
-                        _logger.warn('Ignoring %d trial numbers that are out of range [0,%d]',
-                                     userTrials - goodTrials, trialCount)
-                else:
-                    # if trials aren't specified, queue all of them
-                    trialNums = list(range(trialCount))
-
-                contexts = self.createRuns(simId, scenario, trialNums)
-
-            statusPairs = []
-
-            for context in contexts:
-                try:
-                    if runLocal:
-                        self.setRunStatus(context, status=RUN_RUNNING)
-                        ctx = copy.copy(context)    # use a copy to simulate what happens with remote call...
-                        result = worker.runTrial(ctx, argDict)
-                        self.saveResults([result])
-
-                    else:
-                        if isBaseline(scenario):
-                            result = view.map_async(worker.runTrial, [context], [argDict])
-                            baselineARs[context.trialNum] = result
-
-                        else:
-                            baselineAR = baselineARs.get(context.trialNum, None)
-                            if baselineAR is None:
-                                result = view.map_async(worker.runTrial, [context], [argDict])
-                            else:
-                                # Create a dependency on the baseline that we've already submitted
-                                # TBD: looks like this should work ok if after=None...
-                                with view.temp_flags(after=baselineAR):
-                                    result = view.map_async(worker.runTrial, [context], [argDict])
-
-                        statusPairs.append((context, RUN_QUEUED))
-                        asyncResults.append(result)
+    def scenarioContexts(self, scenario):
+        """
+        Return the list of Contexts for the trials of `scenario` to run, either
+        those with the statuses given by the "--redo" option, or those selected by
+        "--trials" (by default, all trials), for which new runs are created.
+        """
+        args = vars(self.args)
 
-                except Exception as e:
-                    _logger.error("Exception running 'runTrial': %s", e)
+        simId       = args['simId']
+        statuses    = args['statuses']
+        projectName = args['projectName']
+        groupName   = args['groupName']
+        trialStr    = args['trials']
 
-            self.setRunStatuses(statusPairs)
+        if statuses:
+            # 'missing' is not a real status: it selects trials without runs, e.g.,
+            # those added by "gensim --extend", for which runs are created.
+            missing = 'missing' in statuses
+            statuses = [status for status in statuses if status != 'missing']
+
+            # Change this to return Run instances?
+            # If any of the "redo" options find trials, use these instead of args.trials
+            contexts = self.db.getRunsByStatus(simId, scenario, statuses,
+                                               projectName=projectName,
+                                               groupName=groupName)
+            if missing:
+                contexts += self.createRuns(simId, scenario, self.db.getMissingTrials(simId, scenario))
+
+            if not contexts:
+                _logger.warn("No trials found for simId=%s, scenario=%s with statuses=%s",
+                             simId, scenario, statuses)
+            return contexts
+
+        trialCount = self.db.getTrialCount(simId)
+
+        if trialStr:
+            # convert arg string like "4,7,9-12,42" to a list of ints
+            trialList = parseTrialString(trialStr)
+            userTrials = len(trialList)
+
+            # remove nonsense values and warn user about them
+            trialNums = [trial for trial in trialList if 0 <= trial < trialCount]
+            goodTrials = len(trialNums)
+            if goodTrials != userTrials:
+                _logger.warn('Ignoring %d trial numbers that are out of range [0,%d]',
+                             userTrials - goodTrials, trialCount)
+        else:
+            # if trials aren't specified, queue all of them
+            trialNums = list(range(trialCount))
 
-        return asyncResults
+        return self.createRuns(simId, scenario, trialNums)
 
 
 def getTrialsToRedo(db, simId, scenario, statuses):
@@ -634,7 +744,7 @@ def getTrialsToRedo(db, simId, scenario, statuses):
     # 'missing' is not a real status found in the database
     missing = 'missing' in statuses
     if missing:
-        statuses.remove('missing')
+        statuses = [status for status in statuses if status != 'missing']
 
     trialNums = []
 
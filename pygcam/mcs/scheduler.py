@@ -0,0 +1,261 @@
+"""
+.. Ordering of trials by their estimated duration, so that long trials are
+   not left running alone at the end of a simulation.
+
+.. Copyright (c) 2016  Richard Plevin
+   See the https://opensource.org/licenses/MIT for license details.
+"""
+from __future__ import division
+import heapq
+import numpy as np
+
+from ..config import getParam, getParamAsInt, getParamAsFloat
+from ..log import getLogger
+from .error import PygcamMcsUserError
+
+_logger = getLogger(__name__)
+
+TRIAL_ORDER = 'trial'
+LONGEST_FIRST = 'longest'
+
+TrialOrders = (TRIAL_ORDER, LONGEST_FIRST)
+
+
+def makespan(jobs, workers):
+    '''
+    Estimate the elapsed time to run `jobs` on `workers` workers, each of which
+    takes the next job in order when it becomes free, and waits for the job the
+    next one depends on (if any) to complete before starting it.
+
+    :param jobs: (list) tuples of (key, seconds, afterKey) in submission order,
+       where afterKey is the key of a job that must complete first, or None.
+    :param workers: (int) the number of jobs that can run concurrently
+    :return: (float) the time at which the last job completes
+    '''
+    freeTimes = [0.0] * max(1, workers)     # a heap of the times at which workers are free
+    endTimes = {}
+
+    for key, secs, after in jobs:
+        start = max(heapq.heappop(freeTimes), endTimes.get(after, 0.0))
+        endTimes[key] = end = start + secs
+        heapq.heappush(freeTimes, end)
+
+    return max(endTimes.values()) if endTimes else 0.0
+
+
+class DurationEstimator(object):
+    '''
+    Estimates the duration of trials from the durations of succeeded runs
+    of the same simulation. A run that has already succeeded (e.g., one being
+    re-run with "--redo") is expected to take as long as it did previously.
+    Other trials are estimated from a least-squares fit of the durations of
+    their scenario's runs on the trial parameters most correlated with them,
+    once at least MCS.SchedulerMinTrials runs of the scenario have succeeded,
+    or otherwise as the mean duration of the scenario's runs, or lacking these,
+    of all runs. If there are no succeeded runs at all, all trials are given
+    the same estimate (IPP.MinutesPerRun), leaving them in trial number order.
+    '''
+    def __init__(self, db, simId, scenarios):
+        self.simId = simId
+        self.minTrials = getParamAsInt('MCS.SchedulerMinTrials')
+        self.maxParams = getParamAsInt('MCS.SchedulerMaxParams')
+        self.default   = getParamAsFloat('IPP.MinutesPerRun') * 60
+
+        self.durations = {}     # dicts of seconds keyed by trialNum, keyed by scenario
+        for scenario, trialNum, secs in db.getRunDurations(simId, scenarios):
+            self.durations.setdefault(scenario, {})[trialNum] = secs
+
+        allSecs = [secs for d in self.durations.values() for secs in d.values()]
+        if allSecs:
+            self.default = np.mean(allSecs)
+
+        self.trialData = None   # read on demand
+
+    def getTrialData(self):
+        '''
+        Return the DataFrame of trial parameter values indexed by trialNum, or
+        None if it can't be read.
+        '''
+        from .util import readTrialDataFile
+
+        if self.trialData is None:
+            try:
+                self.trialData = readTrialDataFile(self.simId)
+            except Exception as e:
+                _logger.debug('DurationEstimator: no trial data for sim %s: %s', self.simId, e)
+                self.trialData = False
+
+        return self.trialData if self.trialData is not False else None
+
+    def fit(self, durations, trialNums):
+        '''
+        Predict the durations of `trialNums` from a linear fit of `durations`
+        (dict of seconds keyed by trialNum) on the trial parameters most
+        correlated with them. Return None if there's no useful relationship.
+        '''
+        df = self.getTrialData()
+        if df is None:
+            return None
+
+        known = [t for t in sorted(durations) if t in df.index]
+        if len(known) < self.minTrials or not trialNums:
+            return None
+
+        y = np.array([durations[t] for t in known])
+        X = df.loc[known].select_dtypes(include=[np.number]).values
+        if y.std() == 0 or X.shape[1] == 0:
+            return None
+
+        # Use the parameters with the largest absolute correlation with duration,
+        # limiting their number to avoid over-fitting with few observations.
+        xStd = X.std(axis=0)
+        varying = np.nonzero(xStd > 0)[0]
+        corr = np.array([abs(np.corrcoef(X[:, i], y)[0, 1]) for i in varying])
+        count = min(self.maxParams, len(known) // 5, len(varying))
+        if count == 0:
+            return None
+
+        cols = varying[np.argsort(-corr)[:count]]
+
+        A = np.column_stack([X[:, cols], np.ones(len(known))])
+        coefs = np.linalg.lstsq(A, y, rcond=None)[0]
+
+        predictIndex = [t for t in trialNums if t in df.index]
+        P = df.loc[predictIndex].select_dtypes(include=[np.number]).values[:, cols]
+        predicted = np.column_stack([P, np.ones(len(predictIndex))]).dot(coefs)
+
+        # Don't extrapolate beyond the range of observed durations
+        predicted = np.clip(predicted, y.min(), y.max())
+        return dict(zip(predictIndex, predicted))
+
+    def estimate(self, scenario, trialNums):
+        '''
+        Return a dict of the estimated durations (in seconds) of the given
+        trials of `scenario`, keyed by trialNum.
+        '''
+        durations = self.durations.get(scenario, {})
+        mean = np.mean(list(durations.values())) if durations else self.default
+
+        unknown = [t for t in trialNums if t not in durations]
+        fitted = self.fit(durations, unknown) or {}
+
+        return {t: durations.get(t, fitted.get(t, mean)) for t in trialNums}
+
+
+def trialPriorities(estimates, exps):
+    '''
+    Compute the priority of each trial number as the estimated duration of the
+    longest chain of runs for that trial, i.e., a baseline run followed by the
+    longest of its policy runs.
+
+    :param estimates: (dict) dicts of estimated seconds keyed by trialNum, keyed by scenario
+    :param exps: (dict) the baseline name (or None, for baselines) keyed by scenario name
+    :return: (dict) priorities keyed by trialNum
+    '''
+    chains = {}     # dicts of chain seconds keyed by trialNum, keyed by the chain's root scenario
+    for scenario, durations in estimates.items():
+        baseline = exps.get(scenario)
+        if baseline in estimates:   # chains with a baseline being run
+            chain = chains.setdefault(baseline, {})
+            for trialNum, secs in durations.items():
+                chain[trialNum] = max(chain.get(trialNum, 0.0), secs)
+
+    priorities = {}
+    for scenario, durations in estimates.items():
+        if exps.get(scenario) in estimates:
+            continue
+
+        dependents = chains.get(scenario, {})
+        for trialNum, secs in durations.items():
+            total = secs + dependents.get(trialNum, 0.0)
+            priorities[trialNum] = max(priorities.get(trialNum, 0.0), total)
+
+    return priorities
+
+
+def getTrialOrder():
+    '''
+    Return the value of config variable MCS.TrialOrder, after validating it.
+    '''
+    order = getParam('MCS.TrialOrder')
+    if order not in TrialOrders:
+        raise PygcamMcsUserError('Unknown MCS.TrialOrder "%s": must be one of %s' % (order, TrialOrders))
+
+    return order
+
+
+def orderTrials(db, simId, contextsByScenario, exps, workers=None):
+    '''
+    Return the trial numbers of the contexts in `contextsByScenario` in the order
+    given by config variable MCS.TrialOrder: "trial" (ascending trial number) or
+    "longest" (longest estimated chain of runs first). When ordering longest-first
+    and `workers` is known, the estimated makespans of both orders are logged.
+
+    :param db: (CoreDatabase) the database holding the run history
+    :param simId: (int) the simulation id
+    :param contextsByScenario: (dict) lists of Contexts to run, keyed by scenario
+    :param exps: (dict) the baseline name (or None, for baselines) keyed by scenario name
+    :param workers: (int) the number of trials that can run concurrently, or None
+    :return: (list of int) trial numbers in the order in which to submit them
+    '''
+    trialNums = sorted({ctx.trialNum for contexts in contextsByScenario.values() for ctx in contexts})
+
+    if getTrialOrder() == TRIAL_ORDER:
+        return trialNums
+
+    estimator = DurationEstimator(db, simId, list(contextsByScenario.keys()))
+    estimates = {scenario: estimator.estimate(scenario, [ctx.trialNum for ctx in contexts])
+                 for scenario, contexts in contextsByScenario.items()}
+
+    priorities = trialPriorities(estimates, exps)
+    ordered = sorted(trialNums, key=lambda t: -priorities.get(t, 0.0))    # stable, so ties stay in trial order
+
+    if workers:
+        naive   = makespan(scheduledJobs(estimates, exps, trialNums), workers)
+        longest = makespan(scheduledJobs(estimates, exps, ordered), workers)
+        _logger.info('Estimated makespan on %d workers: %.1f min in trial order, %.1f min longest-first (%.0f%% shorter)',
+                     workers, naive / 60, longest / 60, 100 * (naive - longest) / naive if naive else 0)
+
+    return ordered
+
+
+def scheduledJobs(estimates, exps, trialNums):
+    '''
+    Return the list of (key, seconds, afterKey) jobs for makespan(), in the order
+    in which Master.submitTrials() submits them: baselines first, each scenario's
+    trials in the order given by `trialNums`.
+    '''
+    scenarios = sorted(estimates, key=lambda scenario: exps.get(scenario) is not None)
+    jobs = []
+    for scenario in scenarios:
+        baseline = exps.get(scenario)
+        durations = estimates[scenario]
+        for trialNum in trialNums:
+            if trialNum in durations:
+                after = (baseline, trialNum) if baseline in estimates else None
+                jobs.append(((scenario, trialNum), durations[trialNum], after))
+
+    return jobs
+
+
+def logActualMakespans(db, simId, scenarios, exps, trialNums, workers):
+    '''
+    After trials have run, log the makespans that trial-number order and the
+    order used (`trialNums`) would have produced on `workers` workers given the
+    actual durations of the succeeded runs, for comparison with the estimates
+    logged by orderTrials().
+    '''
+    if not workers or not trialNums:
+        return
+
+    actual = {}
+    for scenario, trialNum, secs in db.getRunDurations(simId, scenarios):
+        actual.setdefault(scenario, {})[trialNum] = secs
+
+    if not actual:
+        return
+
+    naive = makespan(scheduledJobs(actual, exps, sorted(trialNums)), workers)
+    used  = makespan(scheduledJobs(actual, exps, trialNums), workers)
+    _logger.info('Makespan on %d workers from actual durations: %.1f min in trial order, %.1f min in the order used',
+                 workers, naive / 60, used / 60)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import (Column, Integer, String, Float, Boolean,
+from sqlalchemy import (Column, Integer, BigInteger, String, Float, Boolean,
                         ForeignKey, DateTime, UniqueConstraint, Index)
 from sqlalchemy.ext.declarative import declared_attr, declarative_base
 from pygcam.log import getLogger
@@ -47,7 +47,8 @@ class InValue(CoreMCSMixin, ORMBase):
     row      = Column(Integer, primary_key=True)    # TBD: drop?
     col      = Column(Integer, primary_key=True)    # TBD: drop?
     value    = Column(Float)
-    __table_args__ = (Index("invalue_index1", "inputId", unique=False),)
+    __table_args__ = (Index("invalue_index1", "inputId", unique=False),
+                      Index("invalue_index2", "simId", "trialNum"))
 
 
 class Output(CoreMCSMixin, ORMBase):
@@ -57,12 +58,15 @@ class Output(CoreMCSMixin, ORMBase):
     timeseries  = Column(Boolean, default=False)    # TBD: use this!
     description = Column(String, nullable=True)
     units       = Column(String, nullable=True)
+    __table_args__ = (Index("output_index1", "name", "programId"),)
 
 
 class OutValue(CoreMCSMixin, ORMBase):
     outputId = Column(Integer, ForeignKey('output.outputId', ondelete="CASCADE"), primary_key=True)
     runId    = Column(Integer, ForeignKey('run.runId', ondelete="CASCADE"), primary_key=True)
     value    = Column(Float)
+    # The primary key serves lookups by outputId; this serves lookups and deletes by runId
+    __table_args__ = (Index("outvalue_index1", "runId", "outputId"),)
 
 # deprecated
 class Program(CoreMCSMixin, ORMBase):
@@ -82,13 +86,39 @@ class Run(CoreMCSMixin, ORMBase):
     endTime   = Column(DateTime, nullable=True)
     duration  = Column(Integer,  nullable=True)
     status    = Column(String,   nullable=True)
-    __table_args__ = (Index("run_index1", "simId", "trialNum", "expId", unique=True),)
+    __table_args__ = (Index("run_index1", "simId", "trialNum", "expId", unique=True),
+                      Index("run_index2", "simId", "expId", "status"))
+
+class RunStats(CoreMCSMixin, ORMBase):
+    '''Resource use of a run, measured by the worker. Times are in seconds.'''
+    runId            = Column(Integer, ForeignKey('run.runId', ondelete="CASCADE"), primary_key=True)
+    wallSecs         = Column(Float, nullable=True)     # total time in the worker
+    setupSecs        = Column(Float, nullable=True)     # applying parameters and steps before GCAM
+    gcamSecs         = Column(Float, nullable=True)
+    querySecs        = Column(Float, nullable=True)
+    postSecs         = Column(Float, nullable=True)     # MCS.PostProcessorSteps
+    cpuSecs          = Column(Float, nullable=True)     # worker process, user + system
+    childCpuSecs     = Column(Float, nullable=True)     # all child processes, incl. GCAM
+    maxRssMB         = Column(Float, nullable=True)     # worker process peak RSS since it started (see gcamMaxRssMB)
+    gcamCpuSecs      = Column(Float, nullable=True)
+    gcamMaxRssMB     = Column(Float, nullable=True)
+    gcamBytesWritten = Column(BigInteger, nullable=True)
+
+class PeriodStats(CoreMCSMixin, ORMBase):
+    '''Solver progress of each model period of a run, parsed from GCAM's output.'''
+    runId       = Column(Integer, ForeignKey('run.runId', ondelete="CASCADE"), primary_key=True)
+    period      = Column(Integer, primary_key=True, autoincrement=False)
+    year        = Column(Integer, nullable=True)
+    iterations  = Column(Integer, nullable=True)
+    seconds     = Column(Float, nullable=True)
+    solved      = Column(Boolean, nullable=True)
 
 class Sim(CoreMCSMixin, ORMBase):
     simId       = Column(Integer, primary_key=True)
     trials      = Column(Integer)
     description = Column(String, nullable=True)
     stamp       = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    seed        = Column(BigInteger, nullable=True)     # seed of the random streams used by gensim
 
 
 # Map region numbers to region names. Both ids and names must be unique.
@@ -109,3 +139,5 @@ class TimeSeries(CoreMCSMixin, ORMBase):
     regionId = Column(Integer, ForeignKey('region.regionId', ondelete="CASCADE"))
     outputId = Column(Integer, ForeignKey('output.outputId', ondelete="CASCADE"))
     units = Column(String)
+    __table_args__ = (Index("timeseries_index1", "runId", "outputId"),
+                      Index("timeseries_index2", "outputId"))
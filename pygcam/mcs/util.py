@@ -26,12 +26,94 @@ _activeYearInts = None
 
 YEAR_COL_PREFIX = 'y'
 
+TRIAL_DATA_FILE = 'trialData.csv'
+
+# Binary copy of a trial data file: a (trials x parameters) matrix of float64 in
+# a .npy file, which workers memory-map to read only their trial's row, plus a
+# JSON index of its columns and the trialNum of its first row.
+TRIAL_MATRIX_EXT = '.npy'
+TRIAL_INDEX_EXT  = '.json'
+
+def getTrialDataPath(simId):
+    '''
+    Return the pathname of the CSV file holding the trial data for simId: the
+    SALib file package's inputs.csv, if it exists, else trialData.csv.
+    '''
+    simDir = getSimDir(simId)
+
+    # If SALib version exists, use it; otherwise use legacy file
+    dataFile = os.path.join(simDir, 'data.sa', 'inputs.csv')
+    if not os.path.lexists(dataFile):
+        dataFile = os.path.join(simDir, TRIAL_DATA_FILE)
+
+    return dataFile
+
+def _trialMatrixPaths(dataFile):
+    base = os.path.splitext(dataFile)[0]
+    return base + TRIAL_MATRIX_EXT, base + TRIAL_INDEX_EXT
+
+def writeTrialDataMatrix(dataFile, df):
+    '''
+    Save the trial DataFrame `df`, indexed by trialNum, in binary form alongside
+    the CSV file `dataFile`. Trial data that can't be stored this way (i.e., with
+    non-numeric values or non-consecutive trialNums) are left to be read from
+    the CSV file.
+    '''
+    import json
+    import numpy as np
+
+    matrixFile, indexFile = _trialMatrixPaths(dataFile)
+
+    for path in (indexFile, matrixFile):
+        if os.path.lexists(path):
+            os.remove(path)
+
+    trialNums = np.asarray(df.index)
+    first = int(trialNums[0]) if len(trialNums) else 0
+
+    if not np.array_equal(trialNums, np.arange(first, first + len(trialNums))):
+        _logger.debug("Not saving binary trial data for %s: trialNums aren't consecutive", dataFile)
+        return
+
+    try:
+        matrix = np.ascontiguousarray(df.values, dtype=float)
+    except (TypeError, ValueError):
+        _logger.debug("Not saving binary trial data for %s: values aren't all numeric", dataFile)
+        return
+
+    np.save(matrixFile, matrix)
+
+    # Written last, so its presence means the matrix is complete
+    with open(indexFile, 'w') as f:
+        json.dump({'columns': [str(col) for col in df.columns], 'firstTrial': first}, f)
+
+def _readTrialIndex(dataFile):
+    '''
+    Return the index dict and pathname of the binary copy of `dataFile`,
+    or (None, None) if there isn't one as recent as the CSV file.
+    '''
+    import json
+
+    matrixFile, indexFile = _trialMatrixPaths(dataFile)
+
+    if not (os.path.exists(indexFile) and os.path.exists(matrixFile)):
+        return None, None
+
+    # Ignore a binary file older than the CSV, e.g., if the CSV was edited by hand
+    if os.path.exists(dataFile) and os.path.getmtime(indexFile) < os.path.getmtime(dataFile):
+        _logger.debug('Ignoring binary trial data older than %s', dataFile)
+        return None, None
+
+    with open(indexFile) as f:
+        return json.load(f), matrixFile
+
 def writeTrialDataFile(simId, df):
     '''
-    Save the trial DataFrame in the file 'trialData.csv' in the simDir.
+    Save the trial DataFrame in the file 'trialData.csv' in the simDir, and
+    in binary form (see writeTrialDataMatrix) for quick access by workers.
     '''
     simDir = getSimDir(simId)
-    dataFile = os.path.join(simDir, 'trialData.csv')
+    dataFile = os.path.join(simDir, TRIAL_DATA_FILE)
 
     # If the file exists, rename it trialData.csv-.
     try:
@@ -40,25 +122,58 @@ def writeTrialDataFile(simId, df):
         pass
 
     df.to_csv(dataFile, index_label='trialNum')
+    writeTrialDataMatrix(dataFile, df)
 
 
 def readTrialDataFile(simId):
     """
     Load trial data (e.g., saved by writeTrialDataFile) and return a DataFrame
     """
+    import numpy as np
     import pandas as pd
 
-    simDir = getSimDir(simId)
+    dataFile = getTrialDataPath(simId)
 
-    # If SALib version exists, use it; otherwise use legacy file
-    dataFile = os.path.join(simDir, 'data.sa', 'inputs.csv')
-    if not os.path.lexists(dataFile):
-        dataFile = os.path.join(simDir, 'trialData.csv')
+    index, matrixFile = _readTrialIndex(dataFile)
+    if index:
+        matrix = np.load(matrixFile)
+        trialNums = pd.RangeIndex(index['firstTrial'], index['firstTrial'] + len(matrix), name='trialNum')
+        return pd.DataFrame(matrix, index=trialNums, columns=index['columns'])
 
     df = pd.read_table(dataFile, sep=',', index_col='trialNum')
     return df
     # return df.as_matrix()
 
+def readTrialDataRow(simId, trialNum):
+    """
+    Return a DataFrame holding the single row of trial data for `trialNum`.
+    Only that row is read from the binary trial data, if there is any; older
+    simulations' trial data are read from the CSV file.
+    """
+    import numpy as np
+    import pandas as pd
+
+    dataFile = getTrialDataPath(simId)
+
+    index, matrixFile = _readTrialIndex(dataFile)
+    if not index:
+        df = readTrialDataFile(simId)
+        if trialNum not in df.index:
+            raise PygcamMcsUserError('Trial %d not found in %s' % (trialNum, dataFile))
+
+        return df.loc[[trialNum]]
+
+    matrix = np.load(matrixFile, mmap_mode='r')
+    row = trialNum - index['firstTrial']
+    if not 0 <= row < len(matrix):
+        raise PygcamMcsUserError('Trial %d not found in %s' % (trialNum, matrixFile))
+
+    values = np.array(matrix[row:row + 1])     # copy, so the file can be closed
+    del matrix
+
+    trialNums = pd.Index([trialNum], name='trialNum')
+    return pd.DataFrame(values, index=trialNums, columns=index['columns'])
+
 def createOutputDir(outputDir):
     from ..utils import removeFileOrTree
     from ..temp_file import getTempDir
@@ -1,6 +1,7 @@
 # Copyright (c) 2012-2016. The Regents of the University of California (Regents)
 # and Richard Plevin. See the file COPYRIGHT.txt for details.
 import os
+import sys
 import time
 import ipyparallel as ipp
 
@@ -14,8 +15,8 @@ from pygcam.mcs.constants import RUNNER_SUCCESS, RUNNER_FAILURE
 from pygcam.mcs.context import Context
 from pygcam.mcs.error import PygcamMcsUserError, GcamToolError
 from pygcam.mcs.Database import (RUN_SUCCEEDED, RUN_FAILED, RUN_KILLED, RUN_ABORTED,
-                                 RUN_UNSOLVED, RUN_GCAMERROR, RUN_RUNNING)
-from pygcam.mcs.util import readTrialDataFile, symlink
+                                 RUN_UNSOLVED, RUN_GCAMERROR, RUN_RUNNING, ENG_TERMINATE)
+from pygcam.mcs.util import readTrialDataFile, readTrialDataRow, symlink
 from pygcam.mcs.XMLParameterFile import XMLParameter, XMLParameterFile, decache
 
 _logger = getLogger(__name__)
@@ -26,12 +27,75 @@ def _secondsToStr(t):
     return "%d:%02d:%02d" % (hours, minutes, seconds)
 
 
-def _runPygcamSteps(steps, context, runWorkspace=None, raiseError=True):
+# Whether pygcam.tool.main() has completed a run of project steps in this process,
+# after which steps are run in-process, if enabled. See _runStepsInProcess().
+_toolStarted = False
+
+# Timing of project step runs in this process, by method ('main' or 'inprocess')
+_stepStats = {'main': [0, 0.0], 'inprocess': [0, 0.0]}
+
+def _runStepsInProcess(steps, context, runWorkspace, params):
+    """
+    Run the given project steps for `context` using the GcamTool instance and
+    the Project already constructed in this process, which avoids re-reading
+    config files, rebuilding the argument parsers, re-instantiating plugins and
+    re-parsing the project file, as pygcam.tool.main() does for each call.
+    This is equivalent to calling main() with the arguments constructed in
+    _runPygcamSteps(), provided that main() has already been called once in
+    this process to initialize the config system, logging and the GcamTool.
+    """
+    from pygcam.config import setSection
+    from pygcam.project import Project
+    from pygcam.temp_file import TempFile
+    from pygcam.tool import GcamTool
+
+    projectName = context.projectName
+    groupName = context.groupName
+
+    setSection(projectName)
+    setParam('GCAM.SandboxRefWorkspace', runWorkspace, section=projectName)
+
+    # Settings for this trial only, restored when its steps have run
+    previous = {name: getParam(name, section=projectName, raiseError=False) for name in params}
+    for name, value in params.items():
+        setParam(name, value, section=projectName)
+
+    tool = GcamTool.getInstance()
+    tool.setMcsMode('trial')
+
+    runArgs = ['run', '-s', steps, '-S', context.scenario,
+               '--sandboxDir=' + context.getTrialDir()] + (['-g', groupName] if groupName else [])
+
+    tool.shellArgs = runArgs
+    args = tool.parser.parse_args(args=runArgs)
+    args.projectName = projectName
+
+    project = Project.readProjectFile(projectName, groupName=groupName, projectFile=args.projectFile)
+    project.setGroup(groupName)
+
+    try:
+        project.run([context.scenario], None, steps.split(','), None, args, tool)
+    finally:
+        # Delete any temporary files that were created, as main() does
+        TempFile.deleteAll()
+
+        for name, value in previous.items():
+            if value is not None:
+                setParam(name, value, section=projectName)
+
+    return 0
+
+def _runPygcamSteps(steps, context, runWorkspace=None, raiseError=True, params=None):
     """
     run "gt +P {project} --mcs=trial run -s {step[,step,...]} -S {scenarioName} ..."
-    For Monte Carlo trials.
+    For Monte Carlo trials. If config variable MCS.RunStepsInProcess is True, only
+    the first call in a process runs the full "gt" startup; subsequent calls run
+    the steps directly using the GcamTool and Project created then. The number
+    and total time of calls made each way are logged. If `params`
+    is a dict, the config variables it holds are set for the project's section.
     """
     import pygcam.tool
+    global _toolStarted
 
     runWorkspace = runWorkspace or getParam('MCS.RunWorkspace')
 
@@ -44,15 +108,32 @@ def _runPygcamSteps(steps, context, runWorkspace=None, raiseError=True):
                 'run', '-s', steps, '-S', context.scenario,
                 '--sandboxDir=' + trialDir] + groupArg
 
+    params = params or {}
+    toolArgs[2:2] = ['--set=%s=%s' % pair for pair in sorted(params.items())]
+
     command = 'gt ' + ' '.join(toolArgs)
     _logger.debug('Running: %s', command)
-    status = pygcam.tool.main(argv=toolArgs, raiseError=True)
+
+    method = 'inprocess' if (_toolStarted and getParamAsBoolean('MCS.RunStepsInProcess')) else 'main'
+    start = time.time()
+
+    if method == 'inprocess':
+        status = _runStepsInProcess(steps, context, runWorkspace, params)
+    else:
+        status = pygcam.tool.main(argv=toolArgs, raiseError=True)
+        _toolStarted = _toolStarted or status == 0
+
+    secs = time.time() - start
+    stats = _stepStats[method]
+    stats[0] += 1
+    stats[1] += secs
+
     msg = '"%s" exited with status %d' % (command, status)
 
     if status != 0 and raiseError:
         raise GcamToolError(msg)
 
-    _logger.info("_runSteps: " + msg)
+    _logger.info("_runSteps: %s (%s, %.2f sec; %.2f sec over %d calls)", msg, method, secs, stats[1], stats[0])
     return status
 
 def _readParameterInfo(context, paramPath):
@@ -67,6 +148,65 @@ def _readParameterInfo(context, paramPath):
     paramFile.runQueries()
     return paramFile
 
+# The parameter file loaded by this process, kept across trials if possible, as
+# (key, mtimes, paramFile, loadSecs). See _getParameterFile().
+_parameterCache = None
+
+# Parameter cache statistics for this process
+_parameterCacheStats = {'hits': 0, 'secsSaved': 0.0}
+
+def _fileMtimes(paths):
+    return [(path, os.path.getmtime(path)) for path in paths]
+
+def _getParameterFile(context, paramPath):
+    '''
+    Return the XMLParameterFile for `context`, with its input files loaded and
+    queries run. Since these are the same for all trials of a simulation, the
+    result is kept across trials in this process, keyed by simId, group name and
+    the parameter and scenario file pathnames, and reused as long as none of the
+    files read has been modified. Before reuse, the element values set by the
+    previous trial are restored. Caching is disabled by setting config variable
+    MCS.CacheParameterFiles to False, and isn't used if trial functions or write
+    functions are defined, since these can modify the XML trees arbitrarily.
+    '''
+    global _parameterCache
+
+    scenarioFile = getParam('GCAM.ScenarioSetupFile')
+    key = (context.simId, context.groupName, os.path.abspath(paramPath), os.path.abspath(scenarioFile))
+
+    if _parameterCache and getParamAsBoolean('MCS.CacheParameterFiles'):
+        cachedKey, mtimes, paramFile, loadSecs = _parameterCache
+
+        try:
+            unchanged = (cachedKey == key and _fileMtimes([path for path, mtime in mtimes]) == mtimes)
+        except OSError:
+            unchanged = False
+
+        if unchanged:
+            paramFile.restoreValues()
+
+            stats = _parameterCacheStats
+            stats['hits'] += 1
+            stats['secsSaved'] += loadSecs
+            _logger.info('Reusing parameter file %s: saved %.1f sec (%.1f sec over %d trials)',
+                         paramPath, loadSecs, stats['secsSaved'], stats['hits'])
+            return paramFile
+
+    # Forget instances from the last run
+    decache()
+    _parameterCache = None
+
+    start = time.time()
+    paramFile = _readParameterInfo(context, paramPath)
+    loadSecs = time.time() - start
+    _logger.info('Loaded parameter file %s in %.1f sec', paramPath, loadSecs)
+
+    if getParamAsBoolean('MCS.CacheParameterFiles') and paramFile.isReusable():
+        mtimes = _fileMtimes(paramFile.getSourcePaths() + [scenarioFile])
+        _parameterCache = (key, mtimes, paramFile, loadSecs)
+
+    return paramFile
+
 def _applySingleTrialData(df, context, paramFile):
     simId    = context.simId
     trialNum = context.trialNum
@@ -81,15 +221,84 @@ def _applySingleTrialData(df, context, paramFile):
     symlink('../../../../Workspace/local-xml', linkDest)
 
 
+def _restartDir(context):
+    '''
+    Return the directory in which restart files of `context`'s run are kept
+    across attempts to run the trial.
+    '''
+    return os.path.join(context.getTrialDir(), 'restart', context.scenario)
+
+def _sandboxRestartDir(context):
+    '''
+    Return the directory in `context`'s sandbox in which GCAM writes restart
+    files, or None if it's a link to a directory shared with other trials, as
+    it is in sandboxes created without MCS.ResumeFromRestart.
+    '''
+    from pygcam.scenarioSetup import RESTART_DIR
+
+    path = os.path.join(context.getScenarioDir(), RESTART_DIR)
+    if os.path.islink(path):
+        _logger.warning('Ignoring restart files in %s, which is shared by all trials', path)
+        return None
+
+    return path
+
+def _preserveRestartFiles(context):
+    '''
+    Move any restart files left in the sandbox by an earlier attempt to run this
+    trial to the trial's restart directory, since the setup step recreates the
+    sandbox, and return the config variables GCAM.RestartPeriod and
+    GCAM.RestartFile to use to restart GCAM after the last period for which a
+    restart file was written, or to run all periods if there is none.
+    '''
+    import shutil
+    from pygcam.gcam import getRestartFiles
+
+    restartDir = _restartDir(context)
+    sandboxRestart = _sandboxRestartDir(context)
+    sandboxFiles = getRestartFiles(sandboxRestart) if sandboxRestart else []
+
+    if sandboxFiles:
+        mkdirs(restartDir)
+        for period, path in sandboxFiles:
+            shutil.move(path, os.path.join(restartDir, os.path.basename(path)))
+
+    files = getRestartFiles(restartDir)
+    if not files:
+        return {'GCAM.RestartPeriod': -1, 'GCAM.RestartFile': ''}
+
+    period, path = files[-1]
+    _logger.info('Resuming trial %d of %s after period %d', context.trialNum, context.scenario, period)
+    return {'GCAM.RestartPeriod': period, 'GCAM.RestartFile': path}
+
+def _removeRestartFiles(context):
+    '''
+    Delete the restart files kept for `context`'s run, and those in its sandbox.
+    '''
+    from pygcam.utils import removeTreeSafely
+
+    removeTreeSafely(_restartDir(context), ignore_errors=True)
+
+    sandboxRestart = _sandboxRestartDir(context)
+    if sandboxRestart:
+        removeTreeSafely(sandboxRestart, ignore_errors=True)
+
 def _runGcamTool(context, noGCAM=False, noBatchQueries=False,
-                noPostProcessor=False):
+                noPostProcessor=False, stats=None, periods=None):
     '''
-    Run GCAM in the current working directory and return exit status.
+    Run GCAM in the current working directory and return exit status. If `stats`
+    is a dict, the elapsed time of each phase of the run (setupSecs, gcamSecs,
+    querySecs and postSecs) and the resource use of the GCAM process (gcamCpuSecs,
+    gcamMaxRssMB and gcamBytesWritten) are stored in it. If `periods` is a list,
+    the solver progress of each model period (see pygcam.gcam.getSolverProgress)
+    is appended to it.
     '''
+    from pygcam.gcam import getGcamUsage, getSolverProgress
+
     _logger.debug("_runGcamTool: %s", context)
 
-    # For running in an ipyparallel engine, forget instances from last run
-    decache()
+    stats = {} if stats is None else stats
+    phaseStart = time.time()
 
     # TBD: #### set to True to help debug ipyparallel issues ####
     debuggingOnly = False
@@ -103,9 +312,14 @@ def _runGcamTool(context, noGCAM=False, noBatchQueries=False,
 
     if isBaseline and not noGCAM:
         paramPath = getParam('MCS.ParametersFile')      # TBD: gensim has optional override of param file. Keep it?
-        paramFile = _readParameterInfo(context, paramPath)
+        paramFile = _getParameterFile(context, paramPath)
 
-        df = readTrialDataFile(simId)
+        # Trial functions are passed the trial data for all trials, as they may
+        # use other trials' values; otherwise only this trial's row is read.
+        if paramFile.hasTrialFuncs():
+            df = readTrialDataFile(simId)
+        else:
+            df = readTrialDataRow(simId, context.trialNum)
         columns = df.columns
 
         # add data for linked columns if not present
@@ -121,21 +335,41 @@ def _runGcamTool(context, noGCAM=False, noBatchQueries=False,
         gcamStatus = 0
     else:
         start = time.time()
+        getGcamUsage()      # discard any left from an earlier trial
+        getSolverProgress()
+
+        params = _preserveRestartFiles(context) if getParamAsBoolean('MCS.ResumeFromRestart') else None
 
         # N.B. setup step calls pygcam.setup.setupWorkspace
-        gcamStatus = _runPygcamSteps('setup,prequery,gcam', context)
+        try:
+            gcamStatus = _runPygcamSteps('setup,prequery,gcam', context, params=params)
+        finally:
+            stop = time.time()
+            usage = getGcamUsage()
+            if usage:
+                stats.update(gcamSecs=usage['wallSecs'], gcamCpuSecs=usage['cpuSecs'],
+                             gcamMaxRssMB=usage['maxRssMB'], gcamBytesWritten=usage['bytesWritten'])
+
+            stats['setupSecs'] = stop - phaseStart - stats.get('gcamSecs', 0)
+
+            progress = getSolverProgress()
+            if progress and periods is not None:
+                periods.extend(progress)
 
-        stop = time.time()
         _logger.info("_runGcamTool: elapsed time: %s", _secondsToStr(stop - start))
 
     if gcamStatus == 0:
         if not noBatchQueries:
+            start = time.time()
             _runPygcamSteps('query', context)
+            stats['querySecs'] = time.time() - start
 
         if not noPostProcessor:
             steps = getParam('MCS.PostProcessorSteps')     # e.g., "diff,CI"
             if steps:
+                start = time.time()
                 _runPygcamSteps(steps, context)
+                stats['postSecs'] = time.time() - start
 
         status = RUNNER_SUCCESS
     else:
@@ -149,11 +383,13 @@ class WorkerResult(object):
     '''
     Encapsulates the results returned from a worker task.
     '''
-    def __init__(self, context, errorMsg):
+    def __init__(self, context, errorMsg, stats=None, periods=None):
         from .XMLResultFile import collectResults, RESULT_TYPE_SCENARIO, RESULT_TYPE_DIFF
 
         self.context  = context
         self.errorMsg = errorMsg
+        self.stats    = stats       # resource use, keyed by RunStats column name
+        self.periods  = periods     # solver progress, list of dicts keyed by PeriodStats column name
         self.resultsList = []
 
         if context.status == RUN_SUCCEEDED:
@@ -194,6 +430,7 @@ class Worker(object):
         self.context  = context
         self.argDict  = argDict
         self.runLocal = argDict.get('runLocal', False)
+        self.standalone = argDict.get('standalone', False)  # not run by an ipyparallel engine
 
     def runTrial(self):
         """
@@ -227,8 +464,11 @@ class Worker(object):
         context = self.context
         context.setVars(status=status)
 
-        if not self.runLocal:
-            publish_data(dict(context=context))
+        # Standalone workers (local processes or SLURM array tasks) have
+        # no hub to publish to; the execution backend tracks their status.
+        # The engine id lets the master kill the engine running a straggler.
+        if not (self.runLocal or self.standalone):
+            publish_data(dict(context=context, engine_id=_engineId()))
 
     def _runTrial(self):
         """
@@ -247,11 +487,17 @@ class Worker(object):
         trialNum = context.trialNum
         errorMsg = None
 
+        stats = {}
+        periods = [] if getParamAsBoolean('MCS.SavePeriodStats') else None
+        usage = _resourceUsage()
+        start = time.time()
+
         _logger.info('Running trial %d' % trialNum)
         try:
             exitCode = _runGcamTool(context, noGCAM=noGCAM,
                                     noBatchQueries=noBatchQueries,
-                                    noPostProcessor=noPostProcessor)
+                                    noPostProcessor=noPostProcessor,
+                                    stats=stats, periods=periods)
             status = RUN_SUCCEEDED if exitCode == 0 else RUN_FAILED
 
         except TimeoutSignalException:
@@ -295,54 +541,186 @@ class Worker(object):
         else:
             _logger.info('Trial status: %s', status)
 
+        # Restart files are kept only for trials that may be resumed
+        if getParamAsBoolean('MCS.ResumeFromRestart') and status not in (RUN_KILLED, RUN_ABORTED):
+            try:
+                _removeRestartFiles(context)
+            except Exception as e:
+                _logger.warning('Failed to remove restart files for trial %d: %s', context.trialNum, e)
+
+        stats['wallSecs'] = time.time() - start
+        if usage:
+            selfUsage, childUsage = usage
+            endSelf, endChild = _resourceUsage()
+
+            # N.B. ru_maxrss is the peak for the life of the worker process, which may
+            # run many trials, so maxRssMB is a high-water mark that never decreases
+            # from one trial to the next. The trial's own GCAM peak is gcamMaxRssMB.
+            stats.update(cpuSecs=_cpuSecs(endSelf) - _cpuSecs(selfUsage),
+                         childCpuSecs=_cpuSecs(endChild) - _cpuSecs(childUsage),
+                         maxRssMB=endSelf.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024))
+
         self.setStatus(status)
-        result = WorkerResult(context, errorMsg)
+        result = WorkerResult(context, errorMsg, stats=stats, periods=periods)
         return result
 
 
+def _resourceUsage():
+    """
+    Return the resource use of this process and of its child processes, as a
+    pair of resource.struct_rusage, or None if the resource module isn't
+    available (i.e., on Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    return resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+
+def _cpuSecs(usage):
+    return usage.ru_utime + usage.ru_stime
+
+
 latestStartTime = None
 
+def _timeRemains():
+    """
+    Return True if there's adequate time left on this engine to start a trial.
+    On the first call, compute the latest time we should start a new trial.
+    """
+    global latestStartTime
+
+    if latestStartTime is None:
+        startTime = time.time()
+
+        wallTime  = os.getenv('MCS_WALLTIME', '2:00') # should always be set except when debugging
+        parts = [int(item) for item in wallTime.split(':')]
+        secs = parts.pop()
+        mins = parts.pop() if parts else 0
+        hrs  = parts.pop() if parts else 0
+
+        minTimeToRun = getParamAsFloat('IPP.MinTimeToRun')
+        latestStartTime = (startTime + secs + 60 * mins + 3600 * hrs) - (minTimeToRun * 60)
+        return True
+
+    return time.time() <= latestStartTime
+
+def _onEngine(argDict):
+    return not (argDict.get('runLocal', False) or argDict.get('standalone', False))
+
+def _engineId():
+    '''
+    Return the id of the ipyparallel engine running this process, or None.
+    '''
+    from IPython import get_ipython
+
+    try:
+        engineId = get_ipython().kernel.engine_id
+    except AttributeError:
+        return None
+
+    return engineId if engineId >= 0 else None
+
 def runTrial(context, argDict):
     '''
     Remotely-callable function providing an interface to the Worker
     class.
 
     :param context: (Context) information describing the run
-    :param argDict: (dict) with bool values for keys 'runLocal',
+    :param argDict: (dict) with bool values for keys 'runLocal', 'standalone',
         'noGCAM', 'noBatchQueries', and 'noPostProcessor'
     :return: (WorkerResult) run identification info and completion status
     '''
-    global latestStartTime
-
-    if not argDict.get('runLocal', False):
-        # On the first run, compute the latest time we should start a new trial.
-        # On subsequent runs, check that there's adequate time still left.
-        if latestStartTime is None:
-            startTime = time.time()
+    if _onEngine(argDict) and not _timeRemains():
+        # TBD: test this!
+        # raising UnmetDependency error causes scheduler to reassign to another engine
+        _logger.info("Insufficient time remaining on engine. Worker raising 'ipp.UnmetDependency'")
+        raise ipp.UnmetDependency()
 
-            wallTime  = os.getenv('MCS_WALLTIME', '2:00') # should always be set except when debugging
-            parts = [int(item) for item in wallTime.split(':')]
-            secs = parts.pop()
-            mins = parts.pop() if parts else 0
-            hrs  = parts.pop() if parts else 0
+    worker = Worker(context, argDict)
+    result = worker.runTrial()
+    return result
 
-            minTimeToRun = getParamAsFloat('IPP.MinTimeToRun')
-            latestStartTime = (startTime + secs + 60 * mins + 3600 * hrs) - (minTimeToRun * 60)
+def runTrials(contexts, argDict):
+    '''
+    Remotely-callable function that runs several trials sequentially, to
+    amortize the cost of submitting a task over several short trials. If
+    there is insufficient time left on the engine to start the first trial,
+    the task is reassigned to another engine. If time runs out after some
+    trials have run, the remaining trials are returned with status
+    ENG_TERMINATE so the master can resubmit them.
+
+    :param contexts: (list of Context) the runs to perform
+    :param argDict: (dict) as for runTrial()
+    :return: (list of WorkerResult) the results for each context, in order
+    '''
+    results = []
 
-        else:
-            if time.time() > latestStartTime:
-                # TBD: test this!
-                # raising UnmetDependency error causes scheduler to reassign to another engine
+    for i, context in enumerate(contexts):
+        if _onEngine(argDict) and not _timeRemains():
+            if i == 0:
                 _logger.info("Insufficient time remaining on engine. Worker raising 'ipp.UnmetDependency'")
                 raise ipp.UnmetDependency()
 
-                # context.setVars(status=ENG_TERMINATE) # tell master to terminate us
-                # time.sleep(10) # don't consume queue while waiting for termination
-                # return WorkerResult(context, 'insufficient time remaining')
+            _logger.info("Insufficient time remaining on engine for %d trials", len(contexts) - i)
+            for ctx in contexts[i:]:
+                ctx.setVars(status=ENG_TERMINATE)  # tell master to terminate us
+                results.append(WorkerResult(ctx, 'insufficient time remaining'))
+            break
 
-    worker = Worker(context, argDict)
-    result = worker.runTrial()
-    return result
+        worker = Worker(context, argDict)
+        results.append(worker.runTrial())
+
+    return results
+
+def runTrialInProcess(context, argDict, resultQueue):
+    '''
+    Target function for a process started by the master to run one trial
+    when using local worker processes (runsim --localWorkers). The result
+    is returned to the master via `resultQueue`.
+
+    :param context: (Context) information describing the run
+    :param argDict: (dict) as for runTrial()
+    :param resultQueue: (multiprocessing.Queue) where to put the WorkerResult
+    :return: none
+    '''
+    from .Database import GcamDatabase
+
+    # Don't use (or close) database connections inherited from the master process
+    GcamDatabase.afterFork()
+
+    result = runTrial(context, argDict)
+    resultQueue.put(result)
+
+def runArrayTask(taskFile, trialNum):
+    '''
+    Run one task of a SLURM job array submitted by the "slurm" execution backend.
+    The task file holds the contexts of the array's trials, keyed by trial number,
+    which is also the array index. The WorkerResult is saved to a file alongside
+    the task file, where the master looks for it.
+
+    :param taskFile: (str) pathname of the pickled task description
+    :param trialNum: (int) the trial to run
+    :return: (int) 0 if the trial succeeded, else 1, so that tasks of arrays
+        depending on this one (with "aftercorr") run only if this trial succeeded.
+    '''
+    from six.moves import cPickle as pickle
+    from .backends import arrayResultFile
+
+    with open(taskFile, 'rb') as f:
+        task = pickle.load(f)
+
+    context = task['contexts'][trialNum]
+    result = runTrial(context, task['argDict'])
+
+    resultFile = arrayResultFile(taskFile, trialNum)
+    tmpFile = resultFile + '.tmp'
+    with open(tmpFile, 'wb') as f:
+        pickle.dump(result, f, protocol=2)
+
+    os.rename(tmpFile, resultFile)     # atomic, so the master never reads a partial file
+    return 0 if result.context.status == RUN_SUCCEEDED else 1
 
 
 if __name__ == '__main__':
@@ -14,6 +14,9 @@ from .utils import copyFileOrTree, removeFileOrTree, mkdirs, symlinkOrCopyFile,
 
 _logger = getLogger(__name__)
 
+# Directory in which GCAM (v5.1 and later) writes restart files
+RESTART_DIR = 'exe/restart'
+
 def _getFilesToCopyAndLink(linkParam):
     reqFiles = getParam('GCAM.RequiredFiles')
     allFiles = set(reqFiles.split())
@@ -123,12 +126,26 @@ def createSandbox(sandbox, srcWorkspace=None, forceCreate=False, mcsMode=None):
 
     filesToCopy, filesToLink = _getFilesToCopyAndLink('GCAM.SandboxFilesToLink')
 
+    # For GCAM >= 5.1, exe/restart is linked (via the run workspace) to the one
+    # in the reference workspace, shared by all trials. Trials that may be resumed
+    # need restart files of their own, so each sandbox gets an empty directory.
+    privateRestart = mcsMode == 'trial' and getParamAsBoolean('MCS.ResumeFromRestart')
+    if privateRestart:
+        filesToCopy = [name for name in filesToCopy if name != RESTART_DIR]
+        filesToLink = [name for name in filesToLink if name != RESTART_DIR]
+
     for filename in filesToCopy:
         _workspaceLinkOrCopy(filename, srcWorkspace, sandbox, copyFiles=True)
 
     for filename in filesToLink:
         _workspaceLinkOrCopy(filename, srcWorkspace, sandbox, copyFiles=False)
 
+    if privateRestart:
+        restartDir = pathjoin(sandbox, RESTART_DIR)
+        if os.path.islink(restartDir):
+            removeFileOrTree(restartDir)    # left by a sandbox created without ResumeFromRestart
+        mkdirs(restartDir)
+
     outputDir = pathjoin(sandbox, 'output')
 
     if mcsMode:
@@ -29,7 +29,7 @@ py3_deps = [
 common_deps = [
     'future>=0.16.0',
     'lxml>=4.2.5',
-    'numpy>=1.15.2',
+    'numpy>=1.17.0',
     'pandas>=0.23.3',
     'seaborn>=0.9.0',
     'semver>=2.8.1',
@@ -0,0 +1,106 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from pygcam.config import setParam, DEFAULT_SECTION
+from mcsTestSupport import configureTempDatabase, removeTempDatabase
+
+
+class TestColumnStore(unittest.TestCase):
+    def setUp(self):
+        from pygcam.mcs.Database import getDatabase
+
+        self.tmpDir = configureTempDatabase()
+        setParam('MCS.ColumnStore', 'True', section=DEFAULT_SECTION)
+
+        self.db = db = getDatabase()
+        self.simId = db.createSim(0, 'test sim')
+        db.createExp('base')
+        db.createOutput('total-cost')
+        db.createOutput('emissions')
+
+    def tearDown(self):
+        setParam('MCS.ColumnStore', 'False', section=DEFAULT_SECTION)
+        removeTempDatabase(self.tmpDir)
+
+    def results(self, trialNum):
+        yearCols = self.db.yearCols()
+        return [dict(paramName='total-cost', value=float(trialNum), isScalar=True,
+                     regionName='global', units=None),
+                dict(paramName='emissions', value={col: trialNum * 2.0 for col in yearCols},
+                     isScalar=False, regionName='USA', units='MtC')]
+
+    def test_parameters(self):
+        from pygcam.mcs.columnStore import getColumnStore
+
+        df = pd.DataFrame(np.random.uniform(size=(10, 3)), columns=['b', 'a', 'c'])
+        getColumnStore(self.simId, create=True).saveParameters(df)
+
+        more = pd.DataFrame(np.random.uniform(size=(5, 3)), columns=['b', 'a', 'c'])
+        getColumnStore(self.simId).saveParameters(more, start=10)
+
+        result = self.db.getParameterValues2(self.simId)
+        self.assertEqual(list(result.columns), ['a', 'b', 'c'])
+        self.assertEqual(result.shape, (15, 3))
+        self.assertTrue(np.allclose(result[['b', 'a', 'c']].values, np.vstack([df.values, more.values])))
+
+    def test_results(self):
+        from pygcam.mcs.columnStore import getColumnStore
+
+        store = getColumnStore(self.simId, create=True)
+        for trialNum in (0, 2, 5):
+            store.saveResults(trialNum + 100, 'base', trialNum, self.results(trialNum))
+
+        store.clearRun('base', 2)   # e.g., trial was re-run and failed
+        store.flush()
+
+        df = self.db.getOutValues(self.simId, 'base', 'total-cost')
+        self.assertEqual(list(df.index), [0, 5])
+        self.assertEqual(list(df['total-cost']), [0.0, 5.0])
+
+        df = self.db.getOutValues(self.simId, 'base', 'total-cost', limit=1)
+        self.assertEqual(len(df), 1)
+
+        series = self.db.getTimeSeries(self.simId, 'emissions', ['base'])
+        self.assertEqual([ts.runId for ts, expName in series], [100, 105])
+        col = self.db.yearCols()[0]
+        self.assertEqual(getattr(series[1][0], col), 10.0)
+
+        # Unknown outputs fall through to the database
+        self.assertIsNone(self.db.getOutValues(self.simId, 'base', 'unknown'))
+
+    def test_arraySizes(self):
+        from pygcam.mcs.columnStore import getColumnStore, ColumnStore, RUNID_FILE
+
+        created = []
+        createArray = ColumnStore._createArray
+
+        def countingCreateArray(store, filename, shape, fill):
+            created.append(shape)
+            return createArray(store, filename, shape, fill)
+
+        ColumnStore._createArray = countingCreateArray
+        try:
+            # A store created by the master is sized for the simulation's trials
+            simId = self.db.createSim(50, 'sized sim')
+            store = getColumnStore(simId, create=True)
+            for trialNum in range(50):
+                store.saveResults(trialNum, 'base', trialNum, self.results(trialNum))
+            self.assertEqual(store._readable('x000/' + RUNID_FILE).shape, (50,))
+
+            # Otherwise, arrays are grown geometrically
+            del created[:]
+            store = getColumnStore(self.simId, create=True)
+            for trialNum in range(200):
+                store.saveResults(trialNum, 'base', trialNum, self.results(trialNum))
+        finally:
+            ColumnStore._createArray = createArray
+
+        store.flush()
+        self.assertLessEqual(len(created), 3 * 10)   # 3 arrays, each created and grown < 10 times
+        self.assertEqual(list(self.db.getOutValues(self.simId, 'base', 'total-cost').index), list(range(200)))
+
+
+if __name__ == '__main__':
+    unittest.main()
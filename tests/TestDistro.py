@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+
+class TestDistro(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.percentiles = (np.arange(1000) + 0.5) / 1000
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def test_discreteDist(self):
+        from pygcam.mcs.built_ins.discrete_plugin import DiscreteDist
+        from pygcam.mcs.error import DistributionSpecError
+
+        dist = DiscreteDist([(1, 0.2), (5, 0.5), (3, 0.3)])
+        values = dist.ppf(self.percentiles)
+        self.assertEqual([np.sum(values == value) for value in (1, 3, 5)], [200, 300, 500])
+        self.assertEqual(list(dist.cdf([0, 1, 2, 3, 5, 6])), [0, 0.2, 0.2, 0.5, 1, 1])
+
+        with self.assertRaises(DistributionSpecError):
+            dist.ppf([0.5, 1.0])
+
+    def test_discreteDistFromData(self):
+        from pygcam.mcs.built_ins.discrete_plugin import getDiscreteDistFromData
+
+        result = getDiscreteDistFromData({1: 3, 2: 1, 10: 4, 40: 2}, bins=4)
+        self.assertEqual(list(result['data']), [0.8, 0, 0, 0.2])
+        self.assertEqual((result['min'], result['binSize']), (6, 10))
+
+    def test_sequences(self):
+        from pygcam.mcs.distro import sequence, GridRV, constant
+
+        self.assertEqual(list(sequence('1,2,3').ppf(range(7))), [1, 2, 3, 1, 2, 3, 1])
+        self.assertEqual(list(constant(4).ppf(range(2))), [4, 4])
+        self.assertEqual(sorted(GridRV(0, 1, 3).ppf(range(7))), [0, 0, 0, 0.5, 0.5, 1, 1])
+
+    def test_empirical(self):
+        from pygcam.mcs.distro import EmpiricalRV
+
+        values = np.random.lognormal(size=100000)
+        path = os.path.join(self.tmpDir, 'data.csv')
+        pd.DataFrame({'value': values, 'other': 1}).to_csv(path, index=False)
+
+        # Reading in chunks produces the same distribution as reading the whole file
+        rv = EmpiricalRV(path, 'value', bins=2000, chunksize=7777)
+        self.assertEqual(rv.count, len(values))
+        self.assertTrue(np.allclose(rv.edges, EmpiricalRV(path, 'value', bins=2000).edges))
+
+        ppf = rv.ppf([0, 0.05, 0.5, 0.95, 1])
+        self.assertAlmostEqual(ppf[0], values.min())
+        self.assertAlmostEqual(ppf[-1], values.max())
+        self.assertTrue(np.allclose(ppf[1:4], np.percentile(values, [5, 50, 95]), rtol=0.01))
+        self.assertTrue(np.allclose(rv.cdf(rv.ppf([0.1, 0.7])), [0.1, 0.7]))
+
+        # A column with a single value is a constant
+        self.assertEqual(list(EmpiricalRV(path, 'other').ppf([0, 0.3, 1])), [1, 1, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
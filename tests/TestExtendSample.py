@@ -0,0 +1,97 @@
+import os
+import unittest
+
+import numpy as np
+
+from mcsTestSupport import configureTempDatabase, removeTempDatabase
+
+
+class _DataSource(object):
+    distroName = 'uniform'
+
+
+class _Parameter(object):
+    dataSrc = _DataSource()
+
+
+class _UniformRV(object):
+    """Stands in for XMLRandomVar: the uniform distribution on [0, 1)"""
+    param = _Parameter()
+
+    def ppf(self, percentiles):
+        return np.asarray(percentiles)
+
+    def cdf(self, values):
+        return np.asarray(values)
+
+
+class TestExtendSample(unittest.TestCase):
+    def strata(self, values, count):
+        return np.floor(np.asarray(values) * count).astype(int)
+
+    def test_extensionPercentiles(self):
+        from pygcam.mcs.LHS import getPercentiles, getExtensionPercentiles
+
+        # Doubling (or tripling) the sample leaves it fully stratified
+        for existing, trials in ((10, 10), (7, 14), (1, 5)):
+            original = getPercentiles(existing)
+            combined = np.concatenate([original, getExtensionPercentiles(original, trials)])
+            self.assertEqual(sorted(self.strata(combined, existing + trials)), list(range(existing + trials)))
+
+        # Otherwise, new values are in segments without existing values
+        for existing, trials in ((7, 5), (5, 17), (100, 1)):
+            original = getPercentiles(existing)
+            added = getExtensionPercentiles(original, trials)
+            total = existing + trials
+
+            self.assertEqual(len(added), trials)
+            self.assertEqual(len(set(self.strata(added, total))), trials)
+            self.assertFalse(set(self.strata(added, total)) & set(self.strata(original, total)))
+
+    def test_samplePercentiles(self):
+        from pygcam.mcs.LHS import getSamplePercentiles
+
+        values = np.array([0.3, 0.9, 0.1, 0.5])
+        self.assertEqual(list(getSamplePercentiles(_UniformRV(), values)), list(values))
+
+        # Without a cdf, values are placed at the midpoints of the strata of their ranks
+        self.assertEqual(list(getSamplePercentiles(object(), values)), [0.375, 0.875, 0.125, 0.625])
+
+    def test_lhsExtend(self):
+        from pygcam.mcs.LHS import lhs
+
+        rvs = [_UniformRV(), _UniformRV()]
+        original = lhs(rvs, 20)
+        added = lhs(rvs, 20, existing=original)
+
+        self.assertEqual(added.shape, (20, 2))
+        for col in range(2):
+            combined = np.concatenate([original[:, col], added[:, col]])
+            self.assertEqual(sorted(self.strata(combined, 40)), list(range(40)))
+
+
+class TestExtendSimulation(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = configureTempDatabase()
+
+    def tearDown(self):
+        removeTempDatabase(self.tmpDir)
+
+    def test_salibSim(self):
+        from pygcam.mcs.Database import getDatabase
+        from pygcam.mcs.context import getSimDir
+        from pygcam.mcs.error import PygcamMcsUserError
+        from pygcam.mcs.built_ins.gensim_plugin import extendSimulation
+
+        simId = getDatabase().createSim(10, 'SALib sim')
+        saDir = os.path.join(getSimDir(simId, create=True), 'data.sa')
+        os.makedirs(saDir)
+        with open(os.path.join(saDir, 'inputs.csv'), 'w') as f:
+            f.write('a,trialNum\n')
+
+        with self.assertRaises(PygcamMcsUserError):
+            extendSimulation(simId, 5, None, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
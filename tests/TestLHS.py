@@ -0,0 +1,110 @@
+import unittest
+
+import numpy as np
+from scipy import stats
+
+
+class _Parameter(object):
+    class dataSrc(object):
+        distroName = 'uniform'
+
+
+class _RV(object):
+    """Stands in for XMLRandomVar; its ppf draws from numpy's global state, like GridRV's"""
+    param = _Parameter()
+
+    def __init__(self, rv, noise=False):
+        self.rv = rv
+        self.noise = noise
+
+    def ppf(self, percentiles):
+        values = self.rv.ppf(percentiles)
+        return values + np.random.uniform(size=len(values)) if self.noise else values
+
+
+class TestLHS(unittest.TestCase):
+    def test_rankCorrCoef(self):
+        from pygcam.mcs.LHS import rankCorrCoef
+
+        m = np.random.random_sample((200, 5))
+        expected = np.array([[stats.spearmanr(m[:, i], m[:, j])[0] for j in range(5)] for i in range(5)])
+        self.assertTrue(np.allclose(rankCorrCoef(m), expected))
+
+    def test_genRankValues(self):
+        from pygcam.mcs.LHS import genRankValues, rankCorrCoef
+
+        corrMat = np.identity(4)
+        corrMat[0, 1] = corrMat[1, 0] = 0.7
+        corrMat[2, 3] = corrMat[3, 2] = -0.5
+
+        ranks = genRankValues(4, 5000, corrMat)
+        self.assertEqual(ranks.shape, (5000, 4))
+
+        for col in range(4):
+            self.assertEqual(list(np.sort(ranks[:, col])), list(range(1, 5001)))
+
+        self.assertTrue(np.allclose(rankCorrCoef(ranks), corrMat, atol=0.05))
+
+    def test_nearestCorrelation(self):
+        from pygcam.mcs.LHS import nearestCorrelation, genRankValues
+
+        corrMat = np.identity(3)
+        self.assertIs(nearestCorrelation(corrMat), corrMat)
+
+        # Pairwise correlations that are mutually inconsistent
+        corrMat = np.array([[ 1.0, 0.9, -0.9],
+                            [ 0.9, 1.0,  0.9],
+                            [-0.9, 0.9,  1.0]])
+
+        repaired = nearestCorrelation(corrMat)
+        np.linalg.cholesky(repaired)
+        self.assertTrue(np.allclose(np.diag(repaired), 1.0))
+        self.assertTrue(np.allclose(repaired, repaired.T))
+        self.assertTrue(np.all(np.sign(repaired) == np.sign(corrMat)))
+
+        self.assertEqual(genRankValues(3, 100, corrMat).shape, (100, 3))
+
+    def test_seededStreams(self):
+        from pygcam.mcs.LHS import lhs
+
+        rvs = [_RV(stats.norm()), _RV(stats.uniform(), noise=True), _RV(stats.lognorm(0.5)), _RV(stats.norm(5))]
+        corrMat = np.identity(4)
+        corrMat[0, 2] = corrMat[2, 0] = 0.5
+
+        for corr in (None, corrMat):
+            serial = lhs(rvs, 50, corrMat=corr, seed=123)
+
+            # Results depend on the seed, but not on the number of processes
+            np.random.seed(99)
+            self.assertTrue(np.array_equal(serial, lhs(rvs, 50, corrMat=corr, seed=123, processes=3)))
+            self.assertFalse(np.array_equal(serial, lhs(rvs, 50, corrMat=corr, seed=124)))
+
+        # Columns' values are independent of the other columns
+        self.assertTrue(np.array_equal(lhs(rvs, 50, seed=9)[:, :2], lhs(rvs[:2], 50, seed=9)))
+
+        # Extensions use different streams
+        self.assertFalse(np.array_equal(lhs(rvs, 50, seed=9), lhs(rvs, 50, seed=9, start=50)))
+
+    def test_lhsAmend(self):
+        import pandas as pd
+        from pygcam.mcs.LHS import lhsAmend
+
+        class _Linked(_RV):
+            def getParameter(self):
+                return self
+
+            def getName(self):
+                return 'linked'
+
+        values = []
+        for seed in (1, 1, 2):
+            df = pd.DataFrame(index=range(20))
+            lhsAmend(df, [_Linked(stats.norm())], 20, seed=seed)
+            values.append(df['linked'].values)
+
+        self.assertTrue(np.array_equal(values[0], values[1]))
+        self.assertFalse(np.array_equal(values[0], values[2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
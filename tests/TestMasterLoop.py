@@ -0,0 +1,461 @@
+import os
+import random
+import threading
+import time
+import unittest
+from argparse import Namespace
+from concurrent.futures import Future
+
+from mcsTestSupport import configureTempDatabase, removeTempDatabase
+
+
+class _Context(object):
+    """Stands in for Context, which requires a project file"""
+    def __init__(self, runId, status='succeeded', trialNum=None, scenario='base', baseline=None):
+        self.runId = runId
+        self.simId = 1
+        self.trialNum = runId if trialNum is None else trialNum
+        self.scenario = scenario
+        self.baseline = baseline
+        self.status = status
+
+    def saveRunInfo(self):
+        return self
+
+    def setVars(self, status=None):
+        self.status = status
+
+
+class _WorkerResult(object):
+    def __init__(self, context):
+        self.context = context
+        self.resultsList = []
+
+
+def _runTrialInProcess(context, argDict, resultQueue):
+    """Stands in for worker.runTrialInProcess: baseline trial 1 fails and 2 crashes"""
+    if context.scenario == 'base' and context.trialNum == 2:
+        os._exit(3)
+
+    failed = context.scenario == 'base' and context.trialNum == 1
+    context.setVars(status='failed' if failed else 'succeeded')
+    resultQueue.put(_WorkerResult(context))
+
+
+def _runSlowTrialInProcess(context, argDict, resultQueue):
+    """Stands in for worker.runTrialInProcess: baseline trial 3 hangs"""
+    time.sleep(60 if (context.scenario == 'base' and context.trialNum == 3) else 0.2)
+    context.setVars(status='succeeded')
+    resultQueue.put(_WorkerResult(context))
+
+
+def _runTrial(context, argDict):
+    """Stands in for worker.runTrial: baseline trial 1 fails"""
+    failed = context.scenario == 'base' and context.trialNum == 1
+    context.setVars(status='failed' if failed else 'succeeded')
+    return _WorkerResult(context)
+
+
+class _AsyncResult(Future):
+    """Minimal stand-in for an ipyparallel AsyncMapResult of one task"""
+    def __init__(self, msgId, engineId=0):
+        super(_AsyncResult, self).__init__()
+        self.msg_ids = [msgId]
+        self.data = [{}]
+        self.engineId = engineId
+
+    @property
+    def engine_id(self):
+        # Like AsyncMapResult metadata, a list whose value is known only once the task completes
+        return [self.engineId if self.done() else None]
+
+    def get(self, timeout=-1):
+        return self.result(timeout)
+
+    def ready(self):
+        return self.done()
+
+
+class _Client(object):
+    def __init__(self, ids=(0,)):
+        self.ids = list(ids)
+        self.busy = set(self.ids)
+        self.resubmitted = []
+        self.purged = []
+        self.shutdowns = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def resubmit(self, msgIds):
+        ar = _AsyncResult(msgIds[0] + '-resubmitted')
+        ar.set_result([_WorkerResult(_Context(int(msgIds[0])))])
+        self.resubmitted.append(ar)
+        return ar
+
+    def purge_results(self, jobs=None):
+        self.purged += jobs
+
+    def queue_status(self):
+        qstatus = {id: {u'queue': 0, u'completed': 0, u'tasks': int(id in self.busy)} for id in self.ids}
+        qstatus[u'unassigned'] = 0
+        return qstatus
+
+    def shutdown(self, targets='all', hub=False, **kwargs):
+        if hub:
+            return
+
+        if targets != 'all':
+            for target in (targets if isinstance(targets, (list, set)) else [targets]):
+                if target not in self.ids:
+                    raise KeyError(target)  # as raised by Client._build_targets, e.g., for [None]
+        self.shutdowns.append(targets)
+
+
+class _View(object):
+    """
+    Stands in for a LoadBalancedView: each task completes immediately, except that
+    the second trial of the first task finds insufficient time left on its engine.
+    """
+    def __init__(self):
+        self.tasks = []     # (contexts, after) of each task submitted
+        self.after = None
+
+    def temp_flags(self, after=None):
+        from contextlib import contextmanager
+
+        @contextmanager
+        def flags():
+            self.after = after
+            yield
+            self.after = None
+
+        return flags()
+
+    def map_async(self, func, contextLists, argDicts):
+        contexts = contextLists[0]
+        ar = _AsyncResult(str(len(self.tasks)))
+        self.tasks.append((contexts, self.after))
+
+        results = []
+        for i, context in enumerate(contexts):
+            context.setVars(status='terminate' if len(self.tasks) == 1 and i == 1 else 'succeeded')
+            results.append(_WorkerResult(context))
+
+        ar.set_result([results])
+        return ar
+
+
+class TestMasterLoop(unittest.TestCase):
+    def setUp(self):
+        from pygcam.mcs.Database import getDatabase
+
+        self.tmpDir = configureTempDatabase()
+        getDatabase()
+
+    def tearDown(self):
+        removeTempDatabase(self.tmpDir)
+
+    def test_processTrials(self):
+        from pygcam.mcs.backends import IpyparallelBackend
+        from pygcam.mcs.master import Master
+
+        args = Namespace(simId=1, scenarios=[], projectName=None, runLocal=False, localWorkers=0,
+                         dontShutdownWhenIdle=True, waitSecs=1, redoListOnly=False, statuses=None)
+        master = Master(args)
+        backend = master.backend = IpyparallelBackend(master)
+        backend.client = client = _Client()
+
+        count = 50
+        ars = [_AsyncResult(str(runId)) for runId in range(count)]
+        saved = []
+
+        backend.start = lambda: None
+        backend.checkEngines = lambda: True
+        master.submitTrials = lambda backend: backend.watchTasks(ars, [[_Context(runId)] for runId in range(count)])
+        master.saveResults = saved.extend
+
+        def complete():
+            for ar in random.sample(ars, count):
+                runId = int(ar.msg_ids[0])
+                ar.data = [{'context': _Context(runId, status='running')}]
+                status = 'killed' if runId == 7 else 'succeeded'
+                ar.set_result([_WorkerResult(_Context(runId, status=status))])
+                time.sleep(0.001)
+
+        thread = threading.Thread(target=complete)
+        thread.start()
+        master.processTrials()
+        thread.join()
+
+        self.assertEqual(sorted(r.context.runId for r in saved), list(range(count)))
+        self.assertEqual(len(client.resubmitted), 1)
+        self.assertEqual(master.loopStats['completed'], count)
+        self.assertEqual(len(client.purged), count + 1)
+        self.assertFalse(backend.pending())
+
+    def test_localWorkers(self):
+        from pygcam.mcs import worker
+        from pygcam.mcs.master import Master
+
+        args = Namespace(simId=1, scenarios=[], projectName=None, runLocal=False, localWorkers=3, waitSecs=1)
+        master, saved, statuses = self.fakeMaster(args, trials=6)
+        trials = 6
+
+        saveFunc = worker.runTrialInProcess
+        worker.runTrialInProcess = _runTrialInProcess
+        try:
+            master.processTrials()
+        finally:
+            worker.runTrialInProcess = saveFunc
+
+        order = [(r.context.scenario, r.context.trialNum) for r in saved]
+        status = {key: r.context.status for key, r in zip(order, saved)}
+
+        self.assertEqual(sorted(order), sorted((s, t) for s in ('base', 'policy') for t in range(trials)))
+        for trialNum in range(trials):
+            self.assertLess(order.index(('base', trialNum)), order.index(('policy', trialNum)))
+
+        self.assertEqual(status[('base', 1)], 'failed')
+        self.assertEqual(status[('base', 2)], 'aborted')      # crashed
+        self.assertEqual(status[('policy', 1)], 'aborted')    # baseline failed
+        self.assertEqual(status[('policy', 2)], 'aborted')
+        self.assertEqual(set(status.values()), {'succeeded', 'failed', 'aborted'})
+
+        # Policies whose baseline didn't succeed are never started
+        self.assertNotIn((trials + 1, 'running'), statuses)
+        self.assertIn((trials, 'running'), statuses)
+
+    def test_trialsPerTask(self):
+        from pygcam.config import setParam, DEFAULT_SECTION
+        from pygcam.mcs.backends import IpyparallelBackend
+
+        args = Namespace(simId=1, scenarios=[], projectName=None, runLocal=False, localWorkers=0,
+                         dontShutdownWhenIdle=True, waitSecs=1)
+        master, saved, statuses = self.fakeMaster(args, trials=5)
+
+        setParam('IPP.TrialsPerTask', '2', section=DEFAULT_SECTION)
+        try:
+            backend = master.backend = IpyparallelBackend(master)
+        finally:
+            setParam('IPP.TrialsPerTask', '1', section=DEFAULT_SECTION)
+
+        backend.client = client = _Client()
+        backend.view = view = _View()
+        backend.start = lambda: None
+        backend.checkEngines = lambda: True
+
+        master.processTrials()
+
+        chunks = [[(c.scenario, c.trialNum) for c in contexts] for contexts, after in view.tasks]
+        self.assertEqual(chunks, [[('base', 0), ('base', 1)], [('base', 2), ('base', 3)], [('base', 4)],
+                                  [('policy', 0), ('policy', 1)], [('policy', 2), ('policy', 3)], [('policy', 4)],
+                                  [('base', 1)]])     # resubmitted after engine ran out of time
+        self.assertEqual(client.shutdowns, [0])
+
+        # Each policy task waits only for the task running its own baselines
+        afters = [after.msg_ids[0] if after else None for contexts, after in view.tasks]
+        self.assertEqual(afters, [None, None, None, '0', '1', '2', None])
+
+        self.assertEqual(sorted((r.context.scenario, r.context.trialNum) for r in saved),
+                         sorted((s, t) for s in ('base', 'policy') for t in range(5)))
+        self.assertFalse(backend.pending())
+
+    def fakeMaster(self, args, trials):
+        """
+        Return a Master that runs `trials` trials of scenario "base" and of
+        scenario "policy", which depends on "base", and saves results and
+        status changes in the lists also returned.
+        """
+        from pygcam.mcs.master import Master
+
+        master = Master(args)
+        contexts = {'base':   [_Context(trialNum, trialNum=trialNum) for trialNum in range(trials)],
+                    'policy': [_Context(trialNum + trials, trialNum=trialNum, scenario='policy', baseline='base')
+                               for trialNum in range(trials)]}
+        saved = []
+        statuses = []
+
+        master.sortedScenarios = lambda: (['base', 'policy'], {'base': None, 'policy': 'base'})
+        master.scenarioContexts = contexts.get
+        master.saveResults = saved.extend
+        master.setRunStatus = lambda context, status: statuses.append((context.runId, status))
+        master.setRunStatuses = lambda pairs: statuses.extend((c.runId, s) for c, s in pairs)
+        return master, saved, statuses
+
+    def test_stragglers(self):
+        from pygcam.config import setParam, DEFAULT_SECTION
+        from pygcam.mcs import worker
+
+        setParam('MCS.StragglerFactor', '5', section=DEFAULT_SECTION)
+        setParam('MCS.StragglerMinRuns', '2', section=DEFAULT_SECTION)
+
+        args = Namespace(simId=1, scenarios=[], projectName=None, runLocal=False, localWorkers=2, waitSecs=1)
+        master, saved, statuses = self.fakeMaster(args, trials=4)
+
+        # Record run times as the real setRunStatus() and saveResults() do
+        def setRunStatus(context, status):
+            statuses.append((context.runId, status))
+            master.recordRunTime(context, status)
+
+        def saveResults(results):
+            saved.extend(results)
+            for result in results:
+                master.recordRunTime(result.context, result.context.status)
+
+        master.setRunStatus = setRunStatus
+        master.saveResults = saveResults
+
+        saveFunc = worker.runTrialInProcess
+        worker.runTrialInProcess = _runSlowTrialInProcess
+        start = time.time()
+        try:
+            master.processTrials()
+        finally:
+            worker.runTrialInProcess = saveFunc
+            setParam('MCS.StragglerFactor', '0', section=DEFAULT_SECTION)
+
+        self.assertLess(time.time() - start, 30)
+        status = {(r.context.scenario, r.context.trialNum): r.context.status for r in saved}
+        self.assertEqual(status[('base', 3)], 'unsolved')
+        self.assertEqual(status[('policy', 3)], 'aborted')
+        self.assertEqual(len(saved), 8)
+        self.assertEqual(set(status[('base', t)] for t in range(3)), {'succeeded'})
+
+    def test_killStraggler(self):
+        from pygcam.mcs.backends import IpyparallelBackend
+
+        args = Namespace(simId=1, scenarios=[], projectName=None, runLocal=False, localWorkers=0,
+                         dontShutdownWhenIdle=True, waitSecs=1)
+        master, saved, statuses = self.fakeMaster(args, trials=1)
+        backend = IpyparallelBackend(master)
+        backend.client = client = _Client(ids=[0, 1])
+
+        context = _Context(0, status='running')
+        ar = _AsyncResult('0', engineId=1)
+        backend.watchTasks([ar], [[context]])
+        self.assertEqual(ar.engine_id, [None])
+
+        # The engine running the task is unknown until the worker reports it
+        self.assertIsNone(backend.kill(context))
+
+        # No other engine is idle to rerun the trial
+        ar.data = [{'context': context, 'engine_id': 1}]
+        self.assertIsNone(backend.kill(context))
+        self.assertEqual(client.shutdowns, [])
+
+        client.busy = {1}
+        results = backend.kill(context)
+        self.assertEqual([r.context.status for r in results], ['unsolved'])
+        self.assertEqual(client.shutdowns, [1])
+        self.assertFalse(backend.pending())
+
+    def test_inProcess(self):
+        from pygcam.mcs import worker
+
+        args = Namespace(simId=1, scenarios=[], projectName=None, runLocal=True, waitSecs=1)
+        master, saved, statuses = self.fakeMaster(args, trials=3)
+
+        saveFunc = worker.runTrial
+        worker.runTrial = _runTrial
+        try:
+            master.processTrials()
+        finally:
+            worker.runTrial = saveFunc
+
+        status = {(r.context.scenario, r.context.trialNum): r.context.status for r in saved}
+        self.assertEqual(status, {('base', 0): 'succeeded', ('base', 1): 'failed', ('base', 2): 'succeeded',
+                                  ('policy', 0): 'succeeded', ('policy', 1): 'aborted', ('policy', 2): 'succeeded'})
+        self.assertEqual(len([s for runId, s in statuses if s == 'queued']), 6)
+
+    def test_convergence(self):
+        from pygcam.config import setParam, DEFAULT_SECTION
+        from pygcam.mcs import worker
+        from pygcam.mcs.convergence import ConvergenceMonitor
+
+        def runTrial(context, argDict):
+            context.setVars(status='succeeded')
+            result = _WorkerResult(context)
+            result.resultsList = [dict(paramName='x', value=1.0 + context.trialNum % 2, isScalar=True)]
+            return result
+
+        args = Namespace(simId=1, scenarios=[], projectName=None, runLocal=True, waitSecs=1)
+        master, saved, statuses = self.fakeMaster(args, trials=20)
+
+        setParam('MCS.ConvergenceMinTrials', '6', section=DEFAULT_SECTION)
+        try:
+            master.convergence = ConvergenceMonitor(['x'], ['base'], tolerance=0.1, window=3)
+        finally:
+            setParam('MCS.ConvergenceMinTrials', '100', section=DEFAULT_SECTION)
+
+        saveFunc = worker.runTrial
+        worker.runTrial = runTrial
+        try:
+            master.processTrials()
+        finally:
+            worker.runTrial = saveFunc
+
+        # Alternating values 1 and 2 converge within 10% by the 5th trial, but at least
+        # MCS.ConvergenceMinTrials (6) must succeed; the rest are cancelled.
+        self.assertEqual([(r.context.scenario, r.context.trialNum) for r in saved], [('base', t) for t in range(6)])
+        self.assertEqual(len([s for runId, s in statuses if s == 'new']), 34)
+
+    def test_slurmArrays(self):
+        from pygcam.mcs import worker
+        from pygcam.mcs.backends import SlurmArrayBackend
+
+        args = Namespace(simId=1, scenarios=[], projectName=None, runLocal=False, localWorkers=0,
+                         waitSecs=1, queue='normal', minutesPerRun=90)
+        master, saved, statuses = self.fakeMaster(args, trials=4)
+        backend = master.backend = SlurmArrayBackend(master)
+        backend.pollSecs = backend.queueSecs = 0
+        backend.queuedTasks = lambda: {}    # no tasks remain in the queue
+        submitted = []
+        exitCodes = {}
+
+        def sbatch(scriptFile, options):
+            """Stands in for SLURM: runs the array's tasks whose dependencies are met"""
+            from six.moves import cPickle as pickle
+
+            jobId = str(1000 + len(submitted))
+            submitted.append((scriptFile, options))
+            with open(scriptFile) as f:
+                script = f.read()
+
+            taskFile = script.split('"')[-2]
+            with open(taskFile, 'rb') as f:
+                trialNums = sorted(pickle.load(f)['contexts'])
+
+            dependency = options[0].split(':')[1] if options else None
+            for trialNum in trialNums:
+                if dependency is None or exitCodes[(dependency, trialNum)] == 0:
+                    exitCodes[(jobId, trialNum)] = worker.runArrayTask(taskFile, trialNum)
+
+            return jobId
+
+        backend.sbatch = sbatch
+        saveFunc = worker.runTrial
+        worker.runTrial = _runTrial
+        try:
+            master.processTrials()
+        finally:
+            worker.runTrial = saveFunc
+
+        (baseScript, baseOptions), (policyScript, policyOptions) = submitted
+        with open(baseScript) as f:
+            script = f.read()
+
+        self.assertIn('#SBATCH --array=0-3\n', script)
+        self.assertIn('#SBATCH --time=01:30:00\n', script)
+        self.assertEqual(baseOptions, [])
+        self.assertEqual(policyOptions, ['--dependency=aftercorr:1000', '--kill-on-invalid-dep=yes'])
+
+        status = {(r.context.scenario, r.context.trialNum): r.context.status for r in saved}
+        self.assertEqual(status[('base', 1)], 'failed')
+        self.assertEqual(status[('policy', 1)], 'aborted')      # never run, so no result
+        self.assertEqual(sorted(status.values()), ['aborted', 'failed'] + ['succeeded'] * 6)
+        self.assertFalse(backend.pending())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+import os
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from mcsTestSupport import configureTempDatabase, removeTempDatabase
+
+
+class _Param(object):
+    def __init__(self, name):
+        self.name = name
+
+    def getName(self):
+        return self.name
+
+
+class _RandomVar(object):
+    """Minimal stand-in for XMLRandomVar, as used by saveTrialData"""
+    def __init__(self, name, varNum):
+        self.param = _Param(name)
+        self.varNum = varNum
+
+    def getParameter(self):
+        return self.param
+
+    def getVarNum(self):
+        return self.varNum
+
+
+class _FakeCursor(object):
+    """Records the COPY statement and data passed to copy_expert"""
+    def __init__(self):
+        self.sql = self.data = None
+
+    def copy_expert(self, sql, file):
+        self.sql = sql
+        self.data = file.read()
+
+    def close(self):
+        pass
+
+
+class _FakePostgresSession(object):
+    """Stands in for a session bound to a psycopg2 engine"""
+    def __init__(self):
+        from sqlalchemy.dialects.postgresql.psycopg2 import PGDialect_psycopg2
+
+        self.dialect = PGDialect_psycopg2()
+        self.fakeCursor = _FakeCursor()
+        self.connection = self     # session.connection().connection.cursor()
+
+    def cursor(self):
+        return self.fakeCursor
+
+    def get_bind(self):
+        return self
+
+    def __call__(self):
+        return self
+
+
+def _setSeedInChild(simId, seed):
+    from pygcam.mcs.Database import GcamDatabase, getDatabase
+
+    inherited = GcamDatabase.instance
+    GcamDatabase.afterFork()
+
+    db = getDatabase()
+    assert db is not inherited and db.engine is not inherited.engine
+    db.setSimSeed(simId, seed)
+
+
+class TestMcsDatabase(unittest.TestCase):
+    def setUp(self):
+        from pygcam.mcs.Database import getDatabase
+
+        self.tmpDir = configureTempDatabase()
+        self.db = db = getDatabase()
+        self.paramNames = ['p1', 'p2', 'p3']
+        db.saveParameterNames([(name, 'test parameter') for name in self.paramNames])
+        self.simId = db.createSim(0, 'test sim')
+
+    def tearDown(self):
+        removeTempDatabase(self.tmpDir)
+
+    def test_bulkInsert(self):
+        from pygcam.mcs.schema import Sim
+
+        columns = ('simId', 'trials', 'description')
+        rows = ((simId, 10, 'sim %d' % simId) for simId in range(100, 125))
+        count = self.db.bulkInsert(Sim, columns, rows, chunkSize=7)
+
+        self.assertEqual(count, 25)
+        self.assertEqual(len(self.db.getSims()), 26)
+
+    def test_saveTrialData(self):
+        from pygcam.mcs.built_ins.gensim_plugin import saveTrialData
+        from pygcam.mcs.XMLParameterFile import XMLRandomVar
+
+        trials = 20
+        names  = self.paramNames
+        df = pd.DataFrame(np.random.uniform(size=(trials, len(names))), columns=names)
+
+        saved = XMLRandomVar.instances
+        XMLRandomVar.instances = [_RandomVar(name, varNum) for varNum, name in enumerate(names)]
+
+        try:
+            saveTrialData(df, self.simId)
+        finally:
+            XMLRandomVar.instances = saved
+
+        result = self.db.getParameterValues2(self.simId)
+        self.assertEqual(result.shape, (trials, len(names)))
+        self.assertTrue(np.allclose(result[names].values, df.values))
+        self.assertEqual(self.db.getTrialCount(self.simId), trials)
+
+    def test_simSeed(self):
+        db = self.db
+        self.assertIsNone(db.getSimSeed(self.simId))
+
+        seed = 2 ** 62 + 5      # seeds are 63-bit integers
+        simId = db.createSim(10, 'seeded sim', seed=seed)
+        self.assertEqual(db.getSimSeed(simId), seed)
+
+        db.setSimSeed(self.simId, 17)
+        self.assertEqual(db.getSimSeed(self.simId), 17)
+
+        # Databases created before the "seed" column existed are upgraded
+        with db.engine.connect() as conn:
+            conn.execute('CREATE TABLE sim_copy AS SELECT "simId", trials, description, stamp FROM sim')
+            conn.execute('DROP TABLE sim')
+            conn.execute('ALTER TABLE sim_copy RENAME TO sim')
+
+        self.assertEqual(db.upgradeSchema(), ['sim.seed'])
+        self.assertIsNone(db.getSimSeed(simId))
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires os.fork')
+    def test_afterFork(self):
+        import multiprocessing as mp
+
+        db = self.db
+        self.assertEqual(db.getTrialCount(self.simId), 0)   # leaves a connection in the pool
+
+        proc = mp.get_context('fork').Process(target=_setSeedInChild, args=(self.simId, 23))
+        proc.start()
+        proc.join()
+        self.assertEqual(proc.exitcode, 0)
+
+        # The parent's pooled connection is unaffected and sees the child's write
+        self.assertEqual(db.getSimSeed(self.simId), 23)
+
+    def test_saveResultsBatch(self):
+        from pygcam.mcs.schema import TimeSeries
+
+        db = self.db
+        db.createExp('base')
+        db.createOutput('total-cost')
+        db.createOutput('emissions')
+
+        with db.sessionScope() as session:
+            runIds = [db.createRun(self.simId, trialNum, expName='base', status='succeeded',
+                                   session=session) for trialNum in range(3)]
+            session.flush()
+            runIds = [run.runId for run in runIds]
+
+        yearCols = db.yearCols()
+
+        def results(runId, scale):
+            return [dict(paramName='total-cost', value=np.float64(runId * scale),
+                         isScalar=True, regionName='global', units=None),
+                    dict(paramName='emissions', value={col: scale for col in yearCols[:2]},
+                         isScalar=False, regionName='USA', units='MtC')]
+
+        db.saveResultsBatch({runId: results(runId, 1) for runId in runIds})
+        db.saveResultsBatch({runId: results(runId, 10) for runId in runIds})  # replaces prior rows
+
+        df = db.getOutValues(self.simId, 'base', 'total-cost')
+        self.assertEqual(list(df['total-cost']), [10.0 * runId for runId in runIds])
+
+        with db.sessionScope() as session:
+            series = session.query(TimeSeries).all()
+
+        self.assertEqual(len(series), len(runIds))
+        ts = series[0]
+        self.assertEqual(getattr(ts, yearCols[0]), 10.0)
+        self.assertIsNone(getattr(ts, yearCols[-1]))
+
+        with self.assertRaises(Exception):
+            db.saveResultsBatch({runIds[0]: [dict(paramName='undefined', value=1.0, isScalar=True,
+                                                  regionName='global', units=None)]})
+
+    def test_sqliteProfile(self):
+        from pygcam.config import setParam, DEFAULT_SECTION
+        from pygcam.mcs.Database import GcamDatabase, getDatabase
+
+        GcamDatabase.close()
+        setParam('MCS.SqliteProfile', 'concurrent', section=DEFAULT_SECTION)
+
+        try:
+            db = getDatabase()
+            self.assertEqual(db.engine.execute('PRAGMA journal_mode').scalar(), 'wal')
+            self.assertEqual(db.engine.execute('PRAGMA busy_timeout').scalar(), 30000)
+            self.assertEqual(db.engine.execute('PRAGMA foreign_keys').scalar(), 1)
+
+            commits = db.stats['commits']
+            db.createSim(0, 'another sim')
+            self.assertEqual(db.stats['retries'], 0)
+            self.assertGreater(db.stats['commits'], commits)
+        finally:
+            setParam('MCS.SqliteProfile', 'default', section=DEFAULT_SECTION)
+
+    def test_postgresCopy(self):
+        from pygcam.mcs.schema import InValue, TimeSeries
+
+        session = _FakePostgresSession()
+        self.assertTrue(self.db.useCopy(session))
+
+        rows = [dict(inputId=1, simId=1, trialNum=t, value=t * 0.5, row=0, col=2) for t in range(3)]
+        self.db.insertRows(session, InValue, rows)
+
+        cursor = session.fakeCursor
+        self.assertEqual(cursor.sql, 'COPY invalue ("inputId", "simId", "trialNum", value, row, col) FROM STDIN')
+        self.assertEqual(cursor.data, '1\t1\t0\t0.0\t0\t2\n1\t1\t1\t0.5\t0\t2\n1\t1\t2\t1.0\t0\t2\n')
+
+        # None is written as NULL, and special characters in strings are escaped
+        self.db.insertRows(session, TimeSeries, [dict(runId=1, outputId=2, regionId=3, units='a\tb\\c', y2010=None)])
+        self.assertEqual(cursor.data, '1\t2\t3\ta\\tb\\\\c\t\\N\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
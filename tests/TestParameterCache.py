@@ -0,0 +1,118 @@
+import os
+import unittest
+
+import pandas as pd
+from lxml import etree as ET
+
+from pygcam.config import setParam, DEFAULT_SECTION
+from mcsTestSupport import configureTempDatabase, removeTempDatabase
+
+
+class _Context(object):
+    def __init__(self, simId=1, groupName='mcs'):
+        self.simId = simId
+        self.groupName = groupName
+
+
+class _ParameterFile(object):
+    """Stands in for XMLParameterFile, counting loads and restores"""
+    loads = 0
+
+    def __init__(self, paths, reusable=True):
+        _ParameterFile.loads += 1
+        self.paths = paths
+        self.reusable = reusable
+        self.restores = 0
+
+    def isReusable(self):
+        return self.reusable
+
+    def getSourcePaths(self):
+        return self.paths
+
+    def restoreValues(self):
+        self.restores += 1
+
+
+class TestParameterCache(unittest.TestCase):
+    def setUp(self):
+        from pygcam.mcs import worker
+
+        self.tmpDir = configureTempDatabase()
+        self.paths = []
+        for name in ('parameters.xml', 'scenarios.xml', 'input.xml'):
+            path = os.path.join(self.tmpDir, name)
+            with open(path, 'w') as f:
+                f.write('<root/>')
+            self.paths.append(path)
+
+        setParam('GCAM.ScenarioSetupFile', self.paths[1], section=DEFAULT_SECTION)
+
+        self.reusable = True
+        self.saveFunc = worker._readParameterInfo
+        worker._readParameterInfo = lambda context, paramPath: _ParameterFile([paramPath, self.paths[2]],
+                                                                              reusable=self.reusable)
+        worker._parameterCache = None
+        _ParameterFile.loads = 0
+
+    def tearDown(self):
+        from pygcam.mcs import worker
+        from pygcam.mcs.XMLParameterFile import decache
+
+        worker._readParameterInfo = self.saveFunc
+        worker._parameterCache = None
+        decache()
+        setParam('MCS.CacheParameterFiles', 'True', section=DEFAULT_SECTION)
+        removeTempDatabase(self.tmpDir)
+
+    def getParameterFile(self, simId=1):
+        from pygcam.mcs.worker import _getParameterFile
+        return _getParameterFile(_Context(simId), self.paths[0])
+
+    def test_reuse(self):
+        first = self.getParameterFile()
+        second = self.getParameterFile()
+        self.assertIs(first, second)
+        self.assertEqual(_ParameterFile.loads, 1)
+        self.assertEqual(second.restores, 1)
+
+        # Modifying any file read invalidates the cache
+        mtime = os.path.getmtime(self.paths[2])
+        os.utime(self.paths[2], (mtime + 10, mtime + 10))
+        self.assertIsNot(self.getParameterFile(), first)
+        self.assertEqual(_ParameterFile.loads, 2)
+
+        # As does a different simulation
+        self.getParameterFile(simId=2)
+        self.assertEqual(_ParameterFile.loads, 3)
+
+    def test_noReuse(self):
+        setParam('MCS.CacheParameterFiles', 'False', section=DEFAULT_SECTION)
+        self.getParameterFile()
+        self.getParameterFile()
+        self.assertEqual(_ParameterFile.loads, 2)
+
+        setParam('MCS.CacheParameterFiles', 'True', section=DEFAULT_SECTION)
+        self.reusable = False       # e.g., a trial function is defined
+        self.getParameterFile()
+        self.getParameterFile()
+        self.assertEqual(_ParameterFile.loads, 4)
+
+    def test_restoreElements(self):
+        from pygcam.mcs.XMLParameterFile import XMLParameter
+
+        tree = ET.ElementTree(ET.fromstring('<root><x>1.0</x><x>2.5</x></root>'))
+        elt = ET.fromstring('<Parameter name="p1"><Query>//x</Query>'
+                            '<Distribution apply="multiply"><Uniform factor="0.2"/></Distribution></Parameter>')
+        param = XMLParameter(elt)
+        param.runQuery(tree)
+
+        param.updateElements(1, 0, pd.DataFrame({'p1': [2.0]}))
+        self.assertEqual([e.text for e in tree.xpath('//x')], ['2.0', '5.0'])
+
+        param.restoreElements()
+        self.assertEqual([e.text for e in tree.xpath('//x')], ['1.0', '2.5'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+import numpy as np
+from scipy import stats
+
+
+class _Parameter(object):
+    class dataSrc(object):
+        distroName = 'uniform'
+
+
+class _RV(object):
+    """Stands in for XMLRandomVar"""
+    param = _Parameter()
+
+    def __init__(self, rv):
+        self.rv = rv
+
+    def ppf(self, percentiles):
+        return self.rv.ppf(percentiles)
+
+
+class TestQMC(unittest.TestCase):
+    def test_continuation(self):
+        from pygcam.mcs.QMC import genPoints
+
+        for method in ('sobolseq', 'halton'):
+            points = genPoints(method, 3, 32, seed=17)
+            self.assertEqual(points.shape, (32, 3))
+            self.assertTrue(np.all((points >= 0) & (points < 1)))
+
+            # Extending continues the same sequence
+            first  = genPoints(method, 3, 16, seed=17)
+            second = genPoints(method, 3, 16, seed=17, start=16)
+            self.assertTrue(np.allclose(np.concatenate([first, second]), points))
+
+    def test_balance(self):
+        from pygcam.mcs.QMC import genPoints
+
+        # Each of 2**k equal intervals holds the same number of Sobol' points
+        points = genPoints('sobolseq', 4, 256, seed=1)
+        for col in range(4):
+            counts = np.bincount(np.floor(points[:, col] * 16).astype(int), minlength=16)
+            self.assertEqual(list(counts), [16] * 16)
+
+    def test_qmc(self):
+        from pygcam.mcs.QMC import qmc
+        from pygcam.mcs.LHS import rankCorrCoef
+
+        rvs = [_RV(stats.norm(10, 2)), _RV(stats.uniform(0, 5)), _RV(stats.lognorm(0.5))]
+        df = qmc(rvs, 1024, 'sobolseq', 3, columns=['a', 'b', 'c'], skip=[rvs[2]])
+
+        self.assertEqual(list(df.columns), ['a', 'b', 'c'])
+        self.assertAlmostEqual(df['a'].mean(), 10, places=2)
+        self.assertAlmostEqual(df['b'].mean(), 2.5, places=2)
+        self.assertTrue(np.all(df['c'] == 0))   # skipped
+
+        corrMat = np.identity(3)
+        corrMat[0, 1] = corrMat[1, 0] = 0.6
+        values = qmc(rvs, 1024, 'halton', 3, corrMat=corrMat)
+        self.assertTrue(np.allclose(rankCorrCoef(values), corrMat, atol=0.05))
+
+
+if __name__ == '__main__':
+    unittest.main()
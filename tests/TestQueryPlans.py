@@ -0,0 +1,59 @@
+import unittest
+
+from mcsTestSupport import (configureTempDatabase, removeTempDatabase, populateDatabase,
+                            explainQueries, fullTableScans)
+
+def readMethods(db, simId):
+    """
+    Return a list of (name, func, args) for the database read methods whose
+    query plans should not include full scans of large tables.
+    """
+    return [
+        ('getOutValues',          db.getOutValues,          (simId, 'base', 'output1')),
+        ('getOutputsWithValues',  db.getOutputsWithValues,  (simId, 'base')),
+        ('getRunsByStatus',       db.getRunsByStatus,       (simId, 'base', ['failed', 'new'])),
+        ('getRunsWithStatus',     db.getRunsWithStatus,     (simId, ['base'], ['failed'])),
+        ('getRunDurations',       db.getRunDurations,       (simId, ['base', 'policy'])),
+        ('getRunStats',           db.getRunStats,           (simId, ['base'])),
+        ('getPeriodStats',        db.getPeriodStats,        (simId, ['base'])),
+        ('getRunInfo',            db.getRunInfo,            (simId, 'base')),
+        ('getMissingTrials',      db.getMissingTrials,      (simId, 'base')),
+        ('getRun',                db.getRun,                (simId, 10, 'base')),
+        ('getTrialCount',         db.getTrialCount,         (simId,)),
+        ('scenariosWithResults',  db.scenariosWithResults,  (simId,)),
+        ('getParameterValues',    db.getParameterValues,    (simId,)),
+        ('getParameterValues2',   db.getParameterValues2,   (simId,)),
+        ('getTimeSeries',         db.getTimeSeries,         (simId, 'series', ['base'])),
+    ]
+
+
+class TestQueryPlans(unittest.TestCase):
+    def setUp(self):
+        from pygcam.mcs.Database import getDatabase
+
+        self.tmpDir = configureTempDatabase()
+        self.db = db = getDatabase()
+        populateDatabase(db, 10, scenarios=('other',))     # so simId filters are selective
+        self.simId = populateDatabase(db, 200)
+
+    def tearDown(self):
+        removeTempDatabase(self.tmpDir)
+
+    def test_noFullScans(self):
+        for name, func, args in readMethods(self.db, self.simId):
+            for sql, plan in explainQueries(self.db, func, *args):
+                scans = fullTableScans(plan)
+                self.assertFalse(scans, '%s: full table scan %s in query:\n%s' % (name, scans, sql))
+
+    def test_upgradeSchema(self):
+        db = self.db
+        db.engine.execute('DROP INDEX run_index2')
+        db.engine.execute('DROP INDEX outvalue_index1')
+        db.engine.execute('DROP TABLE runstats')
+
+        self.assertEqual(sorted(db.upgradeSchema()), ['outvalue_index1', 'run_index2', 'runstats'])
+        self.assertEqual(db.upgradeSchema(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import unittest
+
+from lxml import etree as ET
+
+from pygcam.config import getParam, setParam, DEFAULT_SECTION
+from mcsTestSupport import configureTempDatabase, removeTempDatabase
+
+
+class _Context(object):
+    def __init__(self, trialDir, scenario='base', trialNum=3):
+        self.trialDir = trialDir
+        self.scenario = scenario
+        self.trialNum = trialNum
+
+    def getTrialDir(self):
+        return self.trialDir
+
+    def getScenarioDir(self):
+        return os.path.join(self.trialDir, self.scenario)
+
+
+def _touch(path, text='<scenario/>'):
+    dirname = os.path.dirname(path)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+class TestRestartFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = configureTempDatabase()
+
+    def tearDown(self):
+        for name, value in getattr(self, 'savedParams', {}).items():
+            setParam(name, value, section=DEFAULT_SECTION)
+
+        removeTempDatabase(self.tmpDir)
+
+    def setParams(self, **params):
+        self.savedParams = getattr(self, 'savedParams', {})
+        for name, value in params.items():
+            name = name.replace('_', '.')
+            self.savedParams.setdefault(name, getParam(name))
+            setParam(name, value, section=DEFAULT_SECTION)
+
+    def test_getRestartFiles(self):
+        from pygcam.gcam import getRestartFiles
+
+        restartDir = os.path.join(self.tmpDir, 'restart')
+        for name in ('restart.3.xml', 'restart.10.xml', 'restart.4.xml', 'other.txt'):
+            _touch(os.path.join(restartDir, name))
+        _touch(os.path.join(restartDir, 'restart.11.xml'), text='')  # empty files are ignored
+
+        self.assertEqual([period for period, path in getRestartFiles(restartDir)], [3, 4, 10])
+        self.assertEqual(getRestartFiles(os.path.join(self.tmpDir, 'missing')), [])
+
+    def test_restartConfigFile(self):
+        from pygcam.gcam import _restartConfigFile
+        from pygcam.error import PygcamException
+
+        configFile = os.path.join(self.tmpDir, 'config.xml')
+        restartFile = os.path.join(self.tmpDir, 'restart.5.xml')
+        _touch(restartFile)
+        _touch(configFile, text='<Configuration><Files><Value name="xmlInputFileName">modeltime.xml</Value>'
+                                '</Files><ScenarioComponents><Value name="a">a.xml</Value></ScenarioComponents>'
+                                '</Configuration>')
+
+        path = _restartConfigFile(configFile, self.tmpDir, 5, restartFile)
+        root = ET.parse(path).getroot()
+
+        self.assertEqual(root.find('Files/Value[@name="xmlInputFileName"]').text, restartFile)
+        self.assertEqual(root.find('Ints/Value[@name="restartPeriod"]').text, '5')
+        self.assertEqual(len(root.find('ScenarioComponents')), 0)
+
+        with self.assertRaises(PygcamException):
+            _restartConfigFile(configFile, self.tmpDir, 6, os.path.join(self.tmpDir, 'restart.6.xml'))
+
+    def test_preserveAndRemove(self):
+        from pygcam.mcs.worker import _preserveRestartFiles, _removeRestartFiles, _restartDir
+
+        context = _Context(os.path.join(self.tmpDir, 'trial'))
+        self.assertEqual(_preserveRestartFiles(context), {'GCAM.RestartPeriod': -1, 'GCAM.RestartFile': ''})
+
+        # Files left in the sandbox by a killed run are moved to the trial's restart dir
+        sandboxRestart = os.path.join(context.getScenarioDir(), 'exe', 'restart')
+        _touch(os.path.join(sandboxRestart, 'restart.2.xml'))
+        _touch(os.path.join(sandboxRestart, 'restart.3.xml'))
+
+        params = _preserveRestartFiles(context)
+        self.assertEqual(params['GCAM.RestartPeriod'], 3)
+        self.assertEqual(params['GCAM.RestartFile'], os.path.join(_restartDir(context), 'restart.3.xml'))
+        self.assertEqual(os.listdir(sandboxRestart), [])
+
+        # A later attempt that was also killed adds to those kept
+        _touch(os.path.join(sandboxRestart, 'restart.4.xml'))
+        self.assertEqual(_preserveRestartFiles(context)['GCAM.RestartPeriod'], 4)
+
+        _removeRestartFiles(context)
+        self.assertFalse(os.path.exists(_restartDir(context)))
+        self.assertEqual(_preserveRestartFiles(context)['GCAM.RestartPeriod'], -1)
+
+    def test_sandboxRestartDir(self):
+        from pygcam.scenarioSetup import copyWorkspace, createSandbox
+        from pygcam.mcs.worker import _preserveRestartFiles, _removeRestartFiles
+
+        refWorkspace = os.path.join(self.tmpDir, 'ref')
+        runWorkspace = os.path.join(self.tmpDir, 'Workspace')
+        self.setParams(GCAM_RefWorkspace=refWorkspace, GCAM_VersionNumber='5.1.2',
+                       GCAM_RequiredFiles='exe/restart', MCS_WorkspaceFilesToLink='exe/restart',
+                       GCAM_SandboxFilesToLink='exe/restart', MCS_TempOutputDir='')
+
+        # As for GCAM >= 5.1, exe/restart is linked from the reference workspace
+        sharedFile = os.path.join(refWorkspace, 'exe', 'restart', 'restart.2.xml')
+        _touch(sharedFile)
+        copyWorkspace(runWorkspace, refWorkspace=refWorkspace, mcsMode=True)
+        self.assertTrue(os.path.islink(os.path.join(runWorkspace, 'exe', 'restart')))
+
+        context = _Context(os.path.join(self.tmpDir, 'trial'))
+        sandboxRestart = os.path.join(context.getScenarioDir(), 'exe', 'restart')
+
+        # Without ResumeFromRestart, the shared directory is linked, and ignored
+        self.setParams(MCS_ResumeFromRestart='False')
+        createSandbox(context.getScenarioDir(), srcWorkspace=runWorkspace, forceCreate=True, mcsMode='trial')
+        self.assertTrue(os.path.islink(sandboxRestart))
+        self.assertEqual(_preserveRestartFiles(context)['GCAM.RestartPeriod'], -1)
+        _removeRestartFiles(context)
+        self.assertTrue(os.path.exists(sharedFile))
+
+        # With it, each sandbox has its own restart directory
+        self.setParams(MCS_ResumeFromRestart='True')
+        createSandbox(context.getScenarioDir(), srcWorkspace=runWorkspace, forceCreate=True, mcsMode='trial')
+        self.assertFalse(os.path.islink(sandboxRestart))
+        self.assertEqual(os.listdir(sandboxRestart), [])
+
+        _touch(os.path.join(sandboxRestart, 'restart.3.xml'))
+        self.assertEqual(_preserveRestartFiles(context)['GCAM.RestartPeriod'], 3)
+
+        _removeRestartFiles(context)
+        self.assertEqual(_preserveRestartFiles(context)['GCAM.RestartPeriod'], -1)
+        self.assertEqual(os.listdir(os.path.dirname(sharedFile)), ['restart.2.xml'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import json
+import sys
+import unittest
+
+from mcsTestSupport import configureTempDatabase, removeTempDatabase, populateDatabase
+
+
+class TestRunStats(unittest.TestCase):
+    def setUp(self):
+        from pygcam.mcs.Database import getDatabase
+
+        self.tmpDir = configureTempDatabase()
+        self.db = getDatabase()
+        self.simId = populateDatabase(self.db, 4, outputs=1, params=1)
+
+    def tearDown(self):
+        removeTempDatabase(self.tmpDir)
+
+    def getRunIds(self):
+        from pygcam.mcs.schema import Run
+
+        with self.db.sessionScope() as session:
+            return [row[0] for row in session.query(Run.runId).filter_by(simId=self.simId).order_by(Run.runId)]
+
+    def saveStats(self, statsByRun):
+        session = self.db.Session()
+        try:
+            self.db.saveRunStatsBatch(statsByRun, session)
+            session.commit()
+        finally:
+            self.db.endSession(session)
+
+    def test_saveAndRead(self):
+        runIds = self.getRunIds()
+
+        self.saveStats({runIds[0]: {'wallSecs': 10.0, 'gcamSecs': 8.0, 'gcamBytesWritten': 2 ** 40},
+                        runIds[1]: {'wallSecs': 5.0}})
+
+        # Saving again replaces the earlier values
+        self.saveStats({runIds[1]: {'wallSecs': 6.0, 'maxRssMB': 100.0}})
+
+        df = self.db.getRunStats(self.simId, ['base'])
+        self.assertEqual(len(df), 2)
+        self.assertEqual(list(df.trialNum), [0, 1])
+        self.assertEqual(list(df.wallSecs), [10.0, 6.0])
+        self.assertEqual(df.gcamBytesWritten[0], 2 ** 40)
+        self.assertEqual(df.maxRssMB[1], 100.0)
+        self.assertTrue(df.gcamSecs.isnull()[1])
+
+        self.assertEqual(len(self.db.getRunStats(self.simId, 'policy')), 0)
+
+    def test_upgradeSchema(self):
+        self.db.engine.execute('DROP TABLE runstats')
+        self.assertIn('runstats', self.db.upgradeSchema())
+
+        self.saveStats({self.getRunIds()[0]: {'wallSecs': 1.0}})
+        self.assertEqual(len(self.db.getRunStats(self.simId)), 1)
+
+    @unittest.skipIf(sys.platform.startswith('win'), 'resource usage is not recorded on Windows')
+    def test_gcamUsage(self):
+        from pygcam.gcam import _gcamWrapper, getGcamUsage
+
+        getGcamUsage()
+        self.assertEqual(_gcamWrapper(['sh', '-c', 'echo running; dd if=/dev/zero bs=1024 count=10 2>/dev/null']), 0)
+
+        usage = getGcamUsage()
+        self.assertEqual(sorted(usage.keys()), ['bytesWritten', 'cpuSecs', 'maxRssMB', 'wallSecs'])
+        self.assertGreater(usage['wallSecs'], 0)
+        self.assertGreater(usage['maxRssMB'], 0)
+
+        # The usage is cleared once read
+        self.assertIsNone(getGcamUsage())
+
+    def test_solverProgress(self):
+        from pygcam.gcam import SolverProgress
+
+        progress = SolverProgress()
+        lines = [('Starting GCAM', 0), ('Period 0: 1975', 0), ('Period 1: 1990', 1),
+                 ('Model solved normally. Iterations period 1: 13. Total iterations: 13', 4),
+                 ('Period 2: 2005', 5), ('Model did not solve within set iteration 2', 15)]
+
+        events = [progress.parse(line, now=now) for line, now in lines]
+        self.assertEqual(events, [None, 'period', 'period', 'iterations', 'period', None])
+
+        progress.endPeriod(now=15, solved=False)
+        self.assertEqual(progress.periods,
+                         [dict(period=0, year=1975, iterations=0, seconds=1, solved=True),
+                          dict(period=1, year=1990, iterations=13, seconds=4, solved=True),
+                          dict(period=2, year=2005, iterations=0, seconds=10, solved=False)])
+
+    @unittest.skipIf(sys.platform.startswith('win'), 'the GCAM wrapper is not used on Windows')
+    def test_wrapperProgress(self):
+        import os
+        from pygcam.gcam import _gcamWrapper, _writeSolverProgress, getSolverProgress
+        from pygcam.error import GcamSolverError
+
+        script = ('echo "Period 0: 1975"; echo "Period 1: 1990"; '
+                  'echo "Model solved normally. Iterations period 1: 7. Total iterations: 7"')
+        self.assertEqual(_gcamWrapper(['sh', '-c', script]), 0)
+
+        _writeSolverProgress(self.tmpDir)
+        with open(os.path.join(self.tmpDir, 'output', 'solverProgress.json')) as f:
+            self.assertEqual([p['iterations'] for p in json.load(f)], [0, 7])
+
+        periods = getSolverProgress()
+        self.assertEqual([(p['period'], p['year'], p['solved']) for p in periods], [(0, 1975, True), (1, 1990, True)])
+        self.assertIsNone(getSolverProgress())
+
+        with self.assertRaises(GcamSolverError):
+            _gcamWrapper(['sh', '-c', 'echo "Period 0: 1975"; echo "Model did not solve"; sleep 10'])
+
+        self.assertEqual([p['solved'] for p in getSolverProgress()], [False])
+
+    def test_periodStats(self):
+        runIds = self.getRunIds()
+        periods = [dict(period=0, year=1975, iterations=0, seconds=0.5, solved=True),
+                   dict(period=1, year=1990, iterations=12, seconds=3.5, solved=False)]
+
+        session = self.db.Session()
+        try:
+            self.db.savePeriodStatsBatch({runIds[0]: periods, runIds[1]: periods}, session)
+            self.db.savePeriodStatsBatch({runIds[1]: periods[:1]}, session)    # replaces the earlier rows
+            session.commit()
+        finally:
+            self.db.endSession(session)
+
+        df = self.db.getPeriodStats(self.simId, 'base')
+        self.assertEqual(list(zip(df.trialNum, df.period)), [(0, 0), (0, 1), (1, 0)])
+        self.assertEqual(list(df.iterations), [0, 12, 0])
+        self.assertEqual(list(df.solved), [True, False, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
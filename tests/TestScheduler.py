@@ -0,0 +1,97 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from pygcam.config import setParam, DEFAULT_SECTION
+from mcsTestSupport import configureTempDatabase, removeTempDatabase
+
+
+class _Context(object):
+    def __init__(self, trialNum):
+        self.trialNum = trialNum
+
+
+class _Database(object):
+    def __init__(self, durations):
+        self.durations = durations      # list of (scenario, trialNum, seconds)
+
+    def getRunDurations(self, simId, expList):
+        return [tup for tup in self.durations if tup[0] in expList]
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = configureTempDatabase()
+        setParam('MCS.SchedulerMinTrials', '10', section=DEFAULT_SECTION)
+        setParam('MCS.TrialOrder', 'longest', section=DEFAULT_SECTION)
+
+    def tearDown(self):
+        setParam('MCS.TrialOrder', 'trial', section=DEFAULT_SECTION)
+        removeTempDatabase(self.tmpDir)
+
+    def test_makespan(self):
+        from pygcam.mcs.scheduler import makespan
+
+        self.assertEqual(makespan([(0, 1, None), (1, 1, None), (2, 4, None)], 2), 5)
+        self.assertEqual(makespan([(2, 4, None), (0, 1, None), (1, 1, None)], 2), 4)
+
+        # dependent job waits for the job it depends on
+        self.assertEqual(makespan([('b', 3, None), ('p', 1, 'b')], 4), 4)
+
+    def test_priorities(self):
+        from pygcam.mcs.scheduler import trialPriorities
+
+        estimates = {'base': {0: 10, 1: 20}, 'p1': {0: 30, 1: 1}, 'p2': {0: 5, 1: 2}}
+        exps = {'base': None, 'p1': 'base', 'p2': 'base'}
+        self.assertEqual(trialPriorities(estimates, exps), {0: 40, 1: 22})
+
+        # policies whose baseline isn't being run are chains of their own
+        del estimates['base']
+        self.assertEqual(trialPriorities(estimates, exps), {0: 30, 1: 2})
+
+    def test_estimate(self):
+        from pygcam.mcs.scheduler import DurationEstimator
+
+        rng = np.random.RandomState(0)
+        trials = 100
+        df = pd.DataFrame({'fast': rng.uniform(size=trials), 'slow': rng.uniform(size=trials)},
+                          index=pd.Index(range(trials), name='trialNum'))
+        secs = 600 + 3000 * df['slow'] + rng.normal(scale=10, size=trials)
+
+        db = _Database([('base', t, secs[t]) for t in range(50)])
+        estimator = DurationEstimator(db, 1, ['base', 'policy'])
+        estimator.trialData = df
+
+        estimates = estimator.estimate('base', list(range(trials)))
+        self.assertEqual(estimates[3], secs[3])        # known durations are used as is
+
+        unknown = list(range(50, trials))
+        corr = np.corrcoef([estimates[t] for t in unknown], secs[unknown])[0, 1]
+        self.assertGreater(corr, 0.95)
+
+        # No history for the scenario: use the mean of all runs
+        estimates = estimator.estimate('policy', [0, 1])
+        self.assertAlmostEqual(estimates[0], np.mean(secs[:50]))
+
+    def test_orderTrials(self):
+        from pygcam.mcs.scheduler import orderTrials
+
+        contexts = {'base':   [_Context(t) for t in range(4)],
+                    'policy': [_Context(t) for t in range(4)]}
+        exps = {'base': None, 'policy': 'base'}
+        db = _Database([('base', 0, 10), ('base', 1, 40), ('base', 2, 20), ('base', 3, 30),
+                        ('policy', 2, 100)])
+
+        self.assertEqual(orderTrials(db, 1, contexts, exps, workers=2), [1, 3, 2, 0])     # policy mean (100) is used for unknowns
+
+        setParam('MCS.TrialOrder', 'trial', section=DEFAULT_SECTION)
+        self.assertEqual(orderTrials(db, 1, contexts, exps, workers=2), [0, 1, 2, 3])
+
+        # With no history, trial order is unchanged
+        setParam('MCS.TrialOrder', 'longest', section=DEFAULT_SECTION)
+        self.assertEqual(orderTrials(_Database([]), 1, contexts, exps), [0, 1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+
+from mcsTestSupport import configureTempDatabase, removeTempDatabase
+
+
+class TestStatusWriter(unittest.TestCase):
+    def setUp(self):
+        from pygcam.mcs.Database import getDatabase
+
+        self.tmpDir = configureTempDatabase()
+        self.db = db = getDatabase()
+        self.simId = db.createSim(5, 'test sim')
+        db.createExp('base')
+
+        with db.sessionScope() as session:
+            runs = [db.createRun(self.simId, trialNum, expName='base', session=session) for trialNum in range(5)]
+            session.flush()
+            self.runIds = [run.runId for run in runs]
+
+    def tearDown(self):
+        removeTempDatabase(self.tmpDir)
+
+    def getRuns(self):
+        return {runId: self.db.getRunByRunId(runId) for runId in self.runIds}
+
+    def test_setRunStatuses(self):
+        db = self.db
+        runIds = self.runIds
+
+        db.setRunStatuses({runId: 'running' for runId in runIds[:3]}, chunkSize=2)
+        db.setRunStatuses({runIds[0]: 'succeeded', runIds[1]: 'failed', runIds[4]: 'failed'})
+
+        runs = self.getRuns()
+        self.assertEqual([runs[runId].status for runId in runIds],
+                         ['succeeded', 'failed', 'running', 'new', 'failed'])
+
+        self.assertIsNotNone(runs[runIds[0]].endTime)
+        self.assertEqual(runs[runIds[0]].duration, 0)
+        self.assertIsNotNone(runs[runIds[2]].startTime)
+        self.assertIsNone(runs[runIds[2]].endTime)
+        self.assertIsNone(runs[runIds[4]].endTime)     # never started
+
+    def test_coalesce(self):
+        from pygcam.mcs.master import StatusWriter
+
+        writer = StatusWriter(self.db, interval=60)
+        writer.start()
+
+        runId = self.runIds[0]
+        for status in ('queued', 'running', 'succeeded'):
+            writer.put(runId, status)
+        writer.put(self.runIds[1], 'queued')
+
+        written = writer.flush()
+        self.assertEqual({runId: change.status for runId, change in written.items()},
+                         {runId: 'succeeded', self.runIds[1]: 'queued'})
+        self.assertEqual(writer.flush(), {})
+
+        # Failed writes are restored unless superseded
+        writer.restore({runId: written[runId]._replace(status='failed'),
+                        self.runIds[2]: written[self.runIds[1]]})
+        writer.put(runId, 'running')
+        writer.stop()   # flushes remaining changes
+
+        runs = self.getRuns()
+        self.assertEqual([runs[runId].status for runId in self.runIds[:3]], ['running', 'queued', 'queued'])
+        self.assertFalse(writer.is_alive())
+
+    def test_eventTimes(self):
+        from datetime import datetime, timedelta
+        from pygcam.mcs.master import StatusWriter
+
+        writer = StatusWriter(self.db, interval=60)
+        t0 = datetime(2020, 1, 1, 12)
+        runIds = self.runIds
+
+        # Runs that start and finish between writes keep their start times
+        writer.put(runIds[0], 'queued', when=t0)
+        writer.put(runIds[0], 'running', when=t0 + timedelta(minutes=1))
+        writer.put(runIds[0], 'succeeded', when=t0 + timedelta(minutes=11))
+        writer.put(runIds[1], 'running', when=t0 + timedelta(minutes=2))
+        written = writer.flush()
+
+        writer.put(runIds[1], 'succeeded', when=t0 + timedelta(minutes=5))
+        writer.restore(written)     # as if the first write failed
+        writer.flush()
+
+        runs = self.getRuns()
+        self.assertEqual(runs[runIds[0]].startTime, t0 + timedelta(minutes=1))
+        self.assertEqual(runs[runIds[0]].endTime, t0 + timedelta(minutes=11))
+        self.assertEqual(runs[runIds[0]].duration, 10)
+        self.assertEqual(runs[runIds[1]].duration, 3)
+
+        self.assertEqual(sorted(self.db.getRunDurations(self.simId, 'base')), [('base', 0, 600.0), ('base', 1, 180.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
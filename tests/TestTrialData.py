@@ -0,0 +1,75 @@
+import os
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from mcsTestSupport import configureTempDatabase, removeTempDatabase
+
+
+class TestTrialData(unittest.TestCase):
+    def setUp(self):
+        from pygcam.mcs.context import getSimDir
+
+        self.tmpDir = configureTempDatabase()
+        self.simId = 1
+        self.simDir = getSimDir(self.simId, create=True)
+
+        self.df = pd.DataFrame(np.random.uniform(size=(20, 4)), columns=['b', 'a', 'd', 'c'])
+        self.df.index.name = 'trialNum'
+
+    def tearDown(self):
+        removeTempDatabase(self.tmpDir)
+
+    def test_readRow(self):
+        from pygcam.mcs.util import writeTrialDataFile, readTrialDataFile, readTrialDataRow
+
+        writeTrialDataFile(self.simId, self.df)
+        self.assertTrue(os.path.exists(os.path.join(self.simDir, 'trialData.npy')))
+
+        row = readTrialDataRow(self.simId, 7)
+        self.assertEqual(list(row.index), [7])
+        self.assertEqual(list(row.columns), list(self.df.columns))
+        self.assertEqual(row.loc[7, 'd'], self.df.loc[7, 'd'])
+
+        df = readTrialDataFile(self.simId)
+        self.assertTrue(np.array_equal(df.values, self.df.values))
+        self.assertEqual(list(df.index), list(self.df.index))
+
+    def test_extendedTrials(self):
+        from pygcam.mcs.util import writeTrialDataFile, readTrialDataRow
+        from pygcam.mcs.error import PygcamMcsUserError
+
+        # Trial data saved by "gensim --extend" need not start at trial 0
+        self.df.index += 5
+        writeTrialDataFile(self.simId, self.df)
+        self.assertEqual(readTrialDataRow(self.simId, 24).loc[24, 'a'], self.df.loc[24, 'a'])
+
+        for trialNum in (4, 25):
+            with self.assertRaises(PygcamMcsUserError):
+                readTrialDataRow(self.simId, trialNum)
+
+    def test_csvFallback(self):
+        from pygcam.mcs.util import readTrialDataRow
+
+        # Older sims have only the CSV file
+        self.df.to_csv(os.path.join(self.simDir, 'trialData.csv'), index_label='trialNum')
+        self.assertAlmostEqual(readTrialDataRow(self.simId, 3).loc[3, 'c'], self.df.loc[3, 'c'])
+
+    def test_staleMatrix(self):
+        from pygcam.mcs.util import writeTrialDataFile, readTrialDataRow
+
+        writeTrialDataFile(self.simId, self.df)
+
+        # A CSV file modified after the binary copy was written takes precedence
+        csvFile = os.path.join(self.simDir, 'trialData.csv')
+        self.df.loc[3, 'c'] = 99.0
+        self.df.to_csv(csvFile, index_label='trialNum')
+        mtime = os.path.getmtime(os.path.join(self.simDir, 'trialData.json')) + 10
+        os.utime(csvFile, (mtime, mtime))
+
+        self.assertEqual(readTrialDataRow(self.simId, 3).loc[3, 'c'], 99.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+'''
+Benchmark ppf throughput of pygcam's custom distributions (DiscreteDist,
+sequence, GridRV, and EmpiricalRV) on a vector of percentiles, optionally
+comparing the former DiscreteDist.ppf (a Python lookup per percentile).
+Also reports the time to build an EmpiricalRV from a large CSV file.
+
+Examples:
+    python benchDistro.py -n 100000
+    python benchDistro.py -n 1000000 -v 10000 -r 5000000 --legacy
+'''
+from __future__ import print_function
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description='''Benchmark ppf throughput of custom distributions''')
+
+    parser.add_argument('-L', '--legacy', action='store_true',
+                        help='''Also time the former DiscreteDist.ppf implementation.''')
+
+    parser.add_argument('-n', '--percentiles', type=int, default=100000,
+                        help='''Number of percentiles passed to ppf (default 100000)''')
+
+    parser.add_argument('-r', '--rows', type=int, default=1000000,
+                        help='''Number of rows in the data file read by EmpiricalRV (default 1000000)''')
+
+    parser.add_argument('-v', '--values', type=int, default=1000,
+                        help='''Number of distinct values of the DiscreteDist (default 1000)''')
+
+    return parser.parse_args()
+
+def legacyPPF(dist, percentiles, precision=100):
+    '''The former DiscreteDist lookup table and ppf'''
+    import numpy as np
+
+    fastPPF = np.zeros(precision)
+    index = 0
+    cumProb = 0
+    for i in range(precision):
+        if i / float(precision) > dist.probs[index] + cumProb:
+            cumProb += dist.probs[index]
+            index += 1
+        fastPPF[i] = dist.values[index]
+
+    return [fastPPF[int(x * precision)] for x in percentiles]
+
+def timeIt(label, count, func, *args, **kwargs):
+    start = time.time()
+    result = func(*args, **kwargs)
+    elapsed = time.time() - start
+    print('%-28s %9d in %7.3f sec: %12.0f per sec' % (label, count, elapsed, count / elapsed))
+    return result
+
+def main():
+    import numpy as np
+    import pandas as pd
+    from pygcam.mcs.built_ins.discrete_plugin import DiscreteDist
+    from pygcam.mcs.distro import sequence, GridRV, EmpiricalRV
+
+    args = parseArgs()
+    n = args.percentiles
+    percentiles = np.random.uniform(size=n)
+
+    probs = np.random.uniform(size=args.values)
+    dist = DiscreteDist(list(zip(range(args.values), probs / probs.sum())))
+    timeIt('DiscreteDist.ppf', n, dist.ppf, percentiles)
+
+    if args.legacy:
+        timeIt('DiscreteDist.ppf (legacy)', n, legacyPPF, dist, percentiles)
+
+    timeIt('sequence.ppf', n, sequence(','.join(str(i) for i in range(100))).ppf, percentiles)
+    timeIt('GridRV.ppf', n, GridRV(0, 1, 100).ppf, percentiles)
+
+    tmpDir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpDir, 'data.csv')
+        pd.DataFrame({'value': np.random.lognormal(size=args.rows)}).to_csv(path, index=False)
+
+        rv = timeIt('EmpiricalRV (build, rows)', args.rows, EmpiricalRV, path, 'value')
+        timeIt('EmpiricalRV.ppf', n, rv.ppf, percentiles)
+    finally:
+        shutil.rmtree(tmpDir)
+
+if __name__ == '__main__':
+    main()
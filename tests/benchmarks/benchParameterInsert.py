@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+'''
+Benchmark writing trial parameter values to the "invalue" table, comparing
+the former approach (one ORM InValue object per value) with the chunked
+bulk insert used by GcamDatabase.saveParameterValues. Reports rows/sec.
+
+Examples:
+    python benchParameterInsert.py -t 1000 -p 100
+    python benchParameterInsert.py -t 1000 -p 100 -u postgresql+psycopg2://mcsuser@localhost/bench
+'''
+from __future__ import print_function
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description='''Benchmark inserting parameter values''')
+
+    parser.add_argument('-c', '--chunkSize', type=int, default=None,
+                        help='''Rows per transaction for the bulk insert. Default is the
+                        value of config variable MCS.BulkInsertChunkSize.''')
+
+    parser.add_argument('-O', '--skipORM', action='store_true',
+                        help='''Skip the (slow) ORM-per-row benchmark.''')
+
+    parser.add_argument('-p', '--params', type=int, default=100,
+                        help='''Number of parameters per trial (default 100)''')
+
+    parser.add_argument('-t', '--trials', type=int, default=1000,
+                        help='''Number of trials (default 1000)''')
+
+    parser.add_argument('-u', '--url', default=None,
+                        help='''Database URL. Default is a temporary sqlite database.
+                        N.B. All tables in the database are dropped and recreated.''')
+
+    return parser.parse_args()
+
+def ormInsert(db, simId, tuples):
+    from pygcam.mcs.schema import InValue
+
+    with db.sessionScope() as session:
+        for trialNum, paramId, value, varNum in tuples:
+            session.add(InValue(inputId=paramId, simId=simId, trialNum=trialNum,
+                                value=value, row=0, col=varNum))
+
+def genTuples(paramIds, trials):
+    import numpy as np
+
+    values = np.random.uniform(size=(trials, len(paramIds)))
+    for trialNum in range(trials):
+        for varNum, (paramId, value) in enumerate(zip(paramIds, values[trialNum].tolist())):
+            yield (trialNum, paramId, value, varNum)
+
+def timeIt(label, rows, func, *args, **kwargs):
+    start = time.time()
+    func(*args, **kwargs)
+    elapsed = time.time() - start
+    print('%-6s %9d rows in %7.2f sec: %9.0f rows/sec' % (label, rows, elapsed, rows / elapsed))
+
+def main():
+    from mcsTestSupport import configureTempDatabase, removeTempDatabase
+    from pygcam.config import setParam, DEFAULT_SECTION
+    from pygcam.mcs.Database import getDatabase
+
+    args = parseArgs()
+    tmpDir = configureTempDatabase(url=args.url)
+
+    if args.chunkSize:
+        setParam('MCS.BulkInsertChunkSize', str(args.chunkSize), section=DEFAULT_SECTION)
+
+    try:
+        db = getDatabase(checkInit=False)
+        db.initDb()
+
+        names = ['param%d' % i for i in range(args.params)]
+        db.saveParameterNames([(name, 'benchmark parameter') for name in names])
+        paramIds = [db.getParamId(name) for name in names]
+        rows = args.trials * args.params
+
+        print('Database:', db.url)
+
+        if not args.skipORM:
+            simId = db.createSim(args.trials, 'ORM benchmark')
+            timeIt('ORM', rows, ormInsert, db, simId, genTuples(paramIds, args.trials))
+
+        simId = db.createSim(args.trials, 'bulk benchmark')
+        timeIt('bulk', rows, db.saveParameterValues, simId, genTuples(paramIds, args.trials),
+               count=rows)
+    finally:
+        removeTempDatabase(tmpDir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+'''
+Benchmark the convergence of the statistics tracked by runsim --convergeOn
+(the mean, and the 5th and 95th percentiles) of a nonlinear function of
+lognormal and triangular parameters, comparing the sampling methods
+"montecarlo" (LHS) and the quasi-random "sobolseq" and "halton". Reports the
+root-mean-square error of each statistic, over independently seeded
+replicates, relative to a large-sample reference value.
+
+Examples:
+    python benchQMC.py -p 10 -r 20
+    python benchQMC.py -p 50 -t 64,256,1024,4096 -r 10
+'''
+from __future__ import print_function
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PERCENTILES = (5, 95)
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description='''Benchmark convergence of QMC vs LHS''')
+
+    parser.add_argument('-p', '--params', type=int, default=10,
+                        help='''Number of parameters (default 10)''')
+
+    parser.add_argument('-r', '--replicates', type=int, default=20,
+                        help='''Number of independently seeded samples per method and size (default 20)''')
+
+    parser.add_argument('-t', '--trials', default='64,256,1024,4096',
+                        help='''Comma-delimited list of sample sizes (default 64,256,1024,4096)''')
+
+    return parser.parse_args()
+
+class DataSource(object):
+    distroName = 'benchmark'
+
+class Parameter(object):
+    dataSrc = DataSource()
+
+class RandomVar(object):
+    '''Provides the attributes of XMLRandomVar used by lhs() and qmc()'''
+    param = Parameter()
+
+    def __init__(self, rv):
+        self.rv = rv
+
+    def ppf(self, percentiles):
+        return self.rv.ppf(percentiles)
+
+def genParams(count):
+    from scipy import stats
+
+    return [RandomVar(stats.lognorm(0.3) if i % 2 else stats.triang(0.3, loc=0.5, scale=1.5))
+            for i in range(count)]
+
+def model(values):
+    '''A nonlinear "output" of the trial values, with interactions'''
+    import numpy as np
+
+    weights = 1.0 / np.arange(1, values.shape[1] + 1)
+    return np.dot(values, weights) + values[:, 0] * values[:, 1] - np.sqrt(values[:, -1])
+
+def statistics(output):
+    import numpy as np
+
+    return np.array([output.mean()] + [np.percentile(output, pct) for pct in PERCENTILES])
+
+def sample(method, params, trials, seed):
+    import numpy as np
+    from pygcam.mcs.LHS import lhs
+    from pygcam.mcs.QMC import qmc
+
+    if method == 'montecarlo':
+        np.random.seed(seed)
+        return lhs(params, trials)
+
+    return qmc(params, trials, method, seed)
+
+def main():
+    import numpy as np
+
+    args = parseArgs()
+    params = genParams(args.params)
+
+    reference = statistics(model(sample('sobolseq', params, 2 ** 20, seed=0)))
+    labels = ['mean'] + ['p%d' % pct for pct in PERCENTILES]
+
+    print('RMS error relative to %d-trial reference (%d replicates)' % (2 ** 20, args.replicates))
+    print('%-10s %7s %s' % ('method', 'trials', ' '.join('%10s' % label for label in labels)))
+
+    for trials in [int(t) for t in args.trials.split(',')]:
+        for method in ('montecarlo', 'sobolseq', 'halton'):
+            errors = np.array([statistics(model(sample(method, params, trials, seed))) - reference
+                               for seed in range(1, args.replicates + 1)])
+            rmse = np.sqrt((errors ** 2).mean(axis=0)) / np.abs(reference)
+            print('%-10s %7d %s' % (method, trials, ' '.join('%10.2e' % value for value in rmse)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+'''
+Build a synthetic MCS database (by default, 100k runs) and record the sqlite
+query plan and timing of each database read method listed in TestQueryPlans.
+Exits with status 1 if any plan includes a full scan of a table that grows
+with the number of trials.
+
+Examples:
+    python benchQueryPlans.py
+    python benchQueryPlans.py -r 20000 -o plans.json
+'''
+from __future__ import print_function
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description='''Record query plans and timings of database read methods''')
+
+    parser.add_argument('-o', '--output', default=None,
+                        help='''Write the plans and timings to this file as JSON.''')
+
+    parser.add_argument('-r', '--runs', type=int, default=100000,
+                        help='''Total number of runs, divided evenly between 2 scenarios (default 100000)''')
+
+    parser.add_argument('-R', '--repeat', type=int, default=3,
+                        help='''Number of times to call each method; the best time is reported (default 3)''')
+
+    return parser.parse_args()
+
+def main():
+    from mcsTestSupport import (configureTempDatabase, removeTempDatabase, populateDatabase,
+                                explainQueries, fullTableScans)
+    from TestQueryPlans import readMethods
+    from pygcam.mcs.Database import getDatabase
+
+    args = parseArgs()
+    tmpDir = configureTempDatabase()
+    records = []
+    failed = False
+
+    try:
+        db = getDatabase()
+
+        start = time.time()
+        populateDatabase(db, 100, scenarios=('other',))
+        simId = populateDatabase(db, args.runs // 2)
+        db.engine.execute('ANALYZE')
+        print('Built database with %d runs in %.1f sec' % (args.runs, time.time() - start))
+
+        for name, func, methodArgs in readMethods(db, simId):
+            times = []
+            for _ in range(args.repeat):
+                start = time.time()
+                func(*methodArgs)
+                times.append(time.time() - start)
+
+            plans = explainQueries(db, func, *methodArgs)
+            scans = [scan for sql, plan in plans for scan in fullTableScans(plan)]
+            failed = failed or bool(scans)
+
+            print('%-22s %9.1f ms %s' % (name, 1000 * min(times), 'FULL SCAN' if scans else ''))
+            for sql, plan in plans:
+                for line in plan:
+                    print('    ', line)
+
+            records.append({'method': name, 'msec': 1000 * min(times), 'fullScans': scans,
+                            'queries': [{'sql': sql, 'plan': plan} for sql, plan in plans]})
+    finally:
+        removeTempDatabase(tmpDir)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'runs': args.runs, 'methods': records}, f, indent=2)
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+'''
+Benchmark lock contention on the sqlite MCS database under the "default" and
+"concurrent" (WAL) values of MCS.SqliteProfile. Several processes update run
+statuses, as the master does, while others repeatedly read the run table, as
+analysis commands do. Reports elapsed time, commit latency, retries and time
+spent waiting on locks, as counted by CoreDatabase.commitWithRetry().
+
+Examples:
+    python benchSqliteProfile.py
+    python benchSqliteProfile.py -w 4 -r 2 -n 500
+'''
+from __future__ import print_function
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STATUSES = ('queued', 'running', 'succeeded')
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description='''Benchmark sqlite profiles''')
+
+    parser.add_argument('-n', '--updates', type=int, default=300,
+                        help='''Number of status updates per writer process (default 300)''')
+
+    parser.add_argument('-r', '--readers', type=int, default=2,
+                        help='''Number of reader processes (default 2)''')
+
+    parser.add_argument('-w', '--writers', type=int, default=4,
+                        help='''Number of writer processes (default 4)''')
+
+    return parser.parse_args()
+
+def _openDatabase():
+    from pygcam.mcs.Database import GcamDatabase, getDatabase
+
+    GcamDatabase.instance = None    # don't use connections inherited from the parent
+    return getDatabase(checkInit=False)
+
+def writer(runIds, updates, queue):
+    db = _openDatabase()
+    for i in range(updates):
+        db.setRunStatus(runIds[i % len(runIds)], STATUSES[i % len(STATUSES)])
+
+    queue.put(dict(db.stats))
+
+def reader(simId, stop, queue):
+    from pygcam.mcs.schema import Run
+
+    db = _openDatabase()
+    reads = 0
+    while not stop.is_set():
+        with db.sessionScope() as session:
+            session.query(Run).filter_by(simId=simId).all()
+        reads += 1
+
+    queue.put({'reads': reads})
+
+def runProfile(profile, args):
+    from pygcam.config import setParam, DEFAULT_SECTION
+    from pygcam.mcs.Database import GcamDatabase, getDatabase
+
+    GcamDatabase.close()
+    setParam('MCS.SqliteProfile', profile, section=DEFAULT_SECTION)
+
+    db = getDatabase(checkInit=False)
+    db.initDb()
+    simId = db.createSim(0, 'benchmark')
+    db.createExp('base')
+
+    with db.sessionScope() as session:
+        runs = [db.createRun(simId, trialNum, expName='base', session=session) for trialNum in range(100)]
+        session.flush()
+        runIds = [run.runId for run in runs]
+
+    GcamDatabase.close()
+
+    queue = mp.Queue()
+    stop = mp.Event()
+    readers = [mp.Process(target=reader, args=(simId, stop, queue)) for _ in range(args.readers)]
+    writers = [mp.Process(target=writer, args=(runIds[i::args.writers], args.updates, queue))
+               for i in range(args.writers)]
+
+    start = time.time()
+    for proc in readers + writers:
+        proc.start()
+
+    results = [queue.get() for _ in writers]
+    elapsed = time.time() - start
+
+    stop.set()
+    results += [queue.get() for _ in readers]
+    for proc in readers + writers:
+        proc.join()
+
+    def total(key):
+        return sum(r.get(key, 0) for r in results)
+
+    commits = total('commits')
+    print('%-10s %6.2f sec: %5d commits, %6.1f ms/commit avg, %6.1f ms max, %4d retries, %5.1f sec lock wait, %d failures, %d reads' %
+          (profile, elapsed, commits, 1000 * total('commitSecs') / (commits or 1),
+           1000 * max(r.get('maxCommitSecs', 0) for r in results),
+           total('retries'), total('lockWaitSecs'), total('failures'), total('reads')))
+
+def main():
+    from mcsTestSupport import configureTempDatabase, removeTempDatabase
+
+    args = parseArgs()
+
+    for profile in ('default', 'concurrent'):
+        tmpDir = configureTempDatabase()
+        try:
+            runProfile(profile, args)
+        finally:
+            removeTempDatabase(tmpDir)
+
+if __name__ == '__main__':
+    main()
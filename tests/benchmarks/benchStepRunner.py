@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+'''
+Measure the per-trial overhead of running project steps from an MCS worker,
+with and without MCS.RunStepsInProcess. A temporary home directory holds a
+config file and a project whose steps are no-op shell commands, so the times
+reported are those of "gt" startup and project processing only.
+
+Examples:
+    python benchStepRunner.py
+    python benchStepRunner.py -n 50
+'''
+from __future__ import print_function
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PROJECT = 'bench'
+
+ConfigText = '''[DEFAULT]
+GCAM.DefaultProject = {project}
+
+[{project}]
+GCAM.ProjectDir = {tmpDir}/project
+GCAM.ProjectXmlFile = {tmpDir}/project.xml
+GCAM.ScenarioSetupFile = {tmpDir}/scenarios.xml
+GCAM.RefWorkspace = {tmpDir}/ref
+GCAM.SandboxRoot = {tmpDir}/sandbox
+GCAM.LogLevel = ERROR
+MCS.Root = {tmpDir}/mcs
+MCS.RunWorkspace = {tmpDir}/ws
+'''
+
+ProjectText = '''<?xml version="1.0" encoding="UTF-8"?>
+<projects>
+  <project name="{project}">
+    <steps>
+      <step seq="10" name="setup">true</step>
+      <step seq="20" name="prequery">true</step>
+      <step seq="30" name="gcam">true</step>
+      <step seq="40" name="query">true</step>
+    </steps>
+  </project>
+</projects>
+'''
+
+ScenariosText = '''<?xml version="1.0" encoding="UTF-8"?>
+<scenarios name="bench" defaultGroup="group">
+  <scenarioGroup name="group" useGroupDir="0">
+    <scenario name="base" baseline="1"/>
+    <scenario name="policy"/>
+  </scenarioGroup>
+</scenarios>
+'''
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description='''Measure the per-trial overhead of running project steps''')
+
+    parser.add_argument('-n', '--trials', type=int, default=20,
+                        help='''Number of trials to run with each method (default 20)''')
+
+    return parser.parse_args()
+
+def createHome():
+    tmpDir = tempfile.mkdtemp(prefix='benchSteps-')
+    values = {'project': PROJECT, 'tmpDir': tmpDir}
+
+    for filename, text in (('.pygcam.cfg', ConfigText), ('project.xml', ProjectText),
+                           ('scenarios.xml', ScenariosText)):
+        with open(os.path.join(tmpDir, filename), 'w') as f:
+            f.write(text.format(**values))
+
+    os.environ['HOME'] = tmpDir
+    return tmpDir
+
+def main():
+    args = parseArgs()
+    tmpDir = createHome()
+
+    try:
+        from pygcam.config import getConfig, setParam, setUsingMCS, DEFAULT_SECTION
+        setUsingMCS(True)
+        getConfig()
+
+        from pygcam.mcs import worker
+        from pygcam.mcs.context import Context
+        from pygcam.tool import GcamTool
+
+        for inProcess in (False, True):
+            setParam('MCS.RunStepsInProcess', str(inProcess), section=DEFAULT_SECTION)
+            worker._toolStarted = False
+            GcamTool._instance = None       # so the first trial includes the full startup
+
+            times = []
+            for trialNum in range(args.trials + 1):
+                context = Context(projectName=PROJECT, simId=1, trialNum=trialNum, scenario='base')
+                context.getTrialDir(create=True)
+
+                start = time.time()
+                worker._runPygcamSteps('setup,prequery,gcam', context)
+                worker._runPygcamSteps('query', context)
+                times.append(time.time() - start)
+
+            # The first trial always runs the full startup, so report it separately
+            print('RunStepsInProcess=%-5s first trial %6.1f ms, subsequent trials %6.1f ms avg' %
+                  (inProcess, 1000 * times[0], 1000 * sum(times[1:]) / args.trials))
+    finally:
+        shutil.rmtree(tmpDir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+'''
+Benchmark the time taken by a worker to read its trial's parameter values,
+comparing parsing the whole trialData.csv file, as workers formerly did, with
+reading one row of the memory-mapped binary copy written by gensim.
+
+Examples:
+    python benchTrialData.py -t 5000 -p 200
+    python benchTrialData.py -t 50000 -p 1000 -r 5
+'''
+from __future__ import print_function
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description='''Benchmark reading a trial's data from CSV vs binary files''')
+
+    parser.add_argument('-p', '--params', type=int, default=200,
+                        help='''Number of parameters (default 200)''')
+
+    parser.add_argument('-r', '--reads', type=int, default=5,
+                        help='''Number of trials to read with each method (default 5)''')
+
+    parser.add_argument('-t', '--trials', type=int, default=5000,
+                        help='''Number of trials (default 5000)''')
+
+    return parser.parse_args()
+
+def timeReads(func, simId, trialNums):
+    start = time.time()
+    for trialNum in trialNums:
+        func(simId, trialNum)
+    return (time.time() - start) / len(trialNums)
+
+def main():
+    import numpy as np
+    import pandas as pd
+    from mcsTestSupport import configureTempDatabase, removeTempDatabase
+    from pygcam.mcs.context import getSimDir
+    from pygcam.mcs.util import writeTrialDataFile, readTrialDataRow, getTrialDataPath
+
+    args = parseArgs()
+    tmpDir = configureTempDatabase()
+    simId = 1
+
+    try:
+        getSimDir(simId, create=True)
+        df = pd.DataFrame(np.random.uniform(size=(args.trials, args.params)),
+                          columns=['param%d' % i for i in range(args.params)])
+
+        start = time.time()
+        writeTrialDataFile(simId, df)
+        print('Wrote %d trials x %d params in %.2f sec; CSV is %.1f MB' %
+              (args.trials, args.params, time.time() - start, os.path.getsize(getTrialDataPath(simId)) / 2.0 ** 20))
+
+        def readCsv(simId, trialNum):
+            return pd.read_table(getTrialDataPath(simId), sep=',', index_col='trialNum').loc[[trialNum]]
+
+        trialNums = np.random.randint(args.trials, size=args.reads)
+        csvSecs = timeReads(readCsv, simId, trialNums)
+        rowSecs = timeReads(readTrialDataRow, simId, trialNums)
+
+        print('Per-trial read: CSV %.4f sec, binary row %.6f sec (%.0fx faster)' % (csvSecs, rowSecs, csvSecs / rowSecs))
+
+    finally:
+        removeTempDatabase(tmpDir)
+
+if __name__ == '__main__':
+    main()
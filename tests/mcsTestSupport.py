@@ -0,0 +1,125 @@
+'''
+Support for unit tests of pygcam.mcs modules that require a configured
+(sqlite) database in a temporary directory.
+'''
+import os
+import shutil
+import tempfile
+
+from pygcam.config import readConfigFiles, setParam, setUsingMCS, DEFAULT_SECTION
+
+def configureTempDatabase(url=None):
+    """
+    Configure pygcam to use MCS with a database and sim directory in a newly
+    created temporary directory. Returns the temporary directory, which the
+    caller should pass to removeTempDatabase() when done.
+    """
+    setUsingMCS(True)
+    readConfigFiles(allowMissing=True)     # re-read to include MCS defaults
+
+    tmpDir = tempfile.mkdtemp(prefix='mcsTest-')
+    dbDir  = os.path.join(tmpDir, 'db')
+    url = url or 'sqlite:///%s/test.sqlite' % dbDir
+
+    setParam('MCS.RunDbDir', dbDir, section=DEFAULT_SECTION)
+    setParam('MCS.RunSimsDir', os.path.join(tmpDir, 'sims'), section=DEFAULT_SECTION)
+    setParam('MCS.DbURL', url, section=DEFAULT_SECTION)
+    return tmpDir
+
+def removeTempDatabase(tmpDir):
+    from pygcam.mcs.Database import GcamDatabase
+
+    GcamDatabase.close()
+    shutil.rmtree(tmpDir, ignore_errors=True)
+
+def populateDatabase(db, trials, scenarios=('base', 'policy'), outputs=3, params=10):
+    """
+    Populate the database with a synthetic simulation having the given number
+    of trials for each scenario, with scalar and timeseries results for each
+    run, and `params` parameter values per trial. Returns the simId.
+    """
+    from pygcam.mcs.schema import Run, OutValue, TimeSeries
+
+    simId = db.createSim(trials, 'synthetic sim')
+
+    paramNames = ['param%d' % i for i in range(params)]
+    db.saveParameterNames([(name, 'synthetic parameter') for name in paramNames])
+    paramIds = [db.getParamId(name) for name in paramNames]
+    db.saveParameterValues(simId, ((trialNum, paramId, 0.5, varNum)
+                                   for trialNum in range(trials)
+                                   for varNum, paramId in enumerate(paramIds)))
+
+    outputNames = ['output%d' % i for i in range(outputs)]
+    for name in outputNames + ['series']:
+        db.createOutput(name)
+
+    outputIds = db.lookupOutputIds(outputNames)
+    seriesId = db.lookupOutputIds(['series'])[0]
+    yearCol = db.yearCols()[0]
+    statuses = ('succeeded', 'succeeded', 'succeeded', 'failed')
+
+    for scenario in scenarios:
+        expId = db.createExp(scenario)
+        db.bulkInsert(Run, ('simId', 'expId', 'trialNum', 'status'),
+                      ((simId, expId, trialNum, statuses[trialNum % len(statuses)]) for trialNum in range(trials)))
+
+    with db.sessionScope() as session:
+        runIds = [row[0] for row in session.query(Run.runId).filter_by(simId=simId)]
+
+    db.bulkInsert(OutValue, ('runId', 'outputId', 'value'),
+                  ((runId, outputId, 1.0) for runId in runIds for outputId in outputIds))
+
+    db.bulkInsert(TimeSeries, ('runId', 'outputId', 'regionId', 'units', yearCol),
+                  ((runId, seriesId, 1, 'EJ', 1.0) for runId in runIds))
+    return simId
+
+# Tables that grow with the number of trials, and so must not be fully scanned
+LargeTables = ('run', 'invalue', 'outvalue', 'timeseries')
+
+def explainQueries(db, func, *args, **kwargs):
+    """
+    Call func(*args, **kwargs), capturing the SELECT statements it executes, and
+    return a list of (sql, planLines) for each statement, where planLines are
+    the "detail" strings returned by sqlite's EXPLAIN QUERY PLAN.
+    """
+    from sqlalchemy import event
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        func(*args, **kwargs)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    results = []
+    conn = db.engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        for statement, parameters in captured:
+            cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+            results.append((statement, [row[-1] for row in cursor.fetchall()]))
+    finally:
+        conn.close()
+
+    return results
+
+def fullTableScans(planLines):
+    """
+    Return the plan lines indicating a full scan of one of the LargeTables.
+    (A SCAN visits every row, even if it uses an index to do so; a SEARCH
+    uses an index to visit only matching rows.)
+    """
+    import re
+
+    scans = []
+    for line in planLines:
+        match = re.match(r'SCAN (TABLE )?(\w+)', line)
+        if match and match.group(2) in LargeTables:
+            scans.append(line)
+
+    return scans